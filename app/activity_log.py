@@ -0,0 +1,168 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from app.models import SessionLocal, ActivityLog
+from app.retention import update_rollups
+from app.events import bus
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("ACTIVITY_LOG_BATCH_SIZE", 500))
+FLUSH_INTERVAL = float(os.getenv("ACTIVITY_LOG_FLUSH_INTERVAL", 0.5))
+MAX_PENDING = int(os.getenv("ACTIVITY_LOG_MAX_PENDING", 100000))
+# a batch is retried this many times, backing off from RETRY_DELAY, before it is given up
+WRITE_ATTEMPTS = int(os.getenv("ACTIVITY_LOG_WRITE_ATTEMPTS", 6))
+RETRY_DELAY = float(os.getenv("ACTIVITY_LOG_RETRY_DELAY", 0.1))
+
+_STOP = object()
+
+
+class ActivityLogWriter:
+    """
+    Buffers activity log rows and inserts them from a background thread.
+    A batch is committed in a single transaction once it holds batch_size
+    rows or flush_interval seconds after its first row arrived.
+    """
+
+    def __init__(self, session_factory=SessionLocal, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, max_pending: int = MAX_PENDING):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # bounded so a stalled database applies back-pressure instead of growing memory
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="activity-log-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, user_id, action: str, details: str = "", timestamp: datetime = None):
+        row = {
+            "user_id": user_id,
+            "action": action,
+            "details": details,
+            "timestamp": timestamp or datetime.utcnow(),
+        }
+        if self._closed:
+            # writer already shut down (e.g. during interpreter exit): write inline
+            self._write([row])
+            return
+        if self._thread is None:
+            self.start()
+        self._queue.put(row)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Block until every row submitted before this call is committed."""
+        if self._thread is None or self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, markers = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+                if stop or markers or len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if stop:
+                # drain whatever was queued behind the stop request
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, threading.Event):
+                        markers.append(item)
+                    elif item is not _STOP:
+                        batch.append(item)
+            if batch:
+                self._write(batch)
+            for marker in markers:
+                marker.set()
+
+    def _write(self, rows):
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            db = self.session_factory()
+            try:
+                db.execute(ActivityLog.__table__.insert(), rows)
+                # hourly/daily counters move forward in the same transaction
+                update_rollups(db)
+                db.commit()
+                break
+            except Exception as e:
+                db.rollback()
+                if attempt == WRITE_ATTEMPTS:
+                    # last resort: the rows go to the log file so the audit trail survives somewhere
+                    logger.error(f"Giving up on {len(rows)} activity log rows after {attempt} attempts: {e}; rows: {rows}")
+                    metrics.inc("activity_log_rows_dropped_total", len(rows))
+                    return
+                # usually "database is locked" while another process writes
+                logger.warning(f"Error writing {len(rows)} activity log rows (attempt {attempt}), retrying: {e}")
+                time.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+            finally:
+                db.close()
+        # Core inserts bypass the session hooks, so announce the batch here
+        bus.publish("activity_logs", source="local", count=len(rows))
+        metrics.inc("activity_log_rows_total", len(rows))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> ActivityLogWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ActivityLogWriter()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def flush_activity_log(timeout: float = None) -> bool:
+    if _writer is None:
+        return True
+    return _writer.flush(timeout)
+
+
+def shutdown_activity_log():
+    if _writer is not None:
+        _writer.close()
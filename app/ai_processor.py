@@ -1,6 +1,8 @@
 import re
 from collections import Counter
 
+from app import metrics
+
 def summarize_text(text: str, max_sentences: int = 3) -> str:
     # Improved extractive summarizer: pick sentences with highest word frequency score
     sentences = re.split(r'(?<=[.!?])\s+', text.strip())
@@ -44,3 +46,14 @@ def analyze_sentiment(text: str) -> str:
         return "Negative"
     else:
         return "Neutral"
+
+
+@metrics.timed("analysis_seconds")
+def analyze_document(text: str, max_sentences: int = 4, num_keywords: int = 8) -> dict:
+    # the analysis shown in the dashboard, as plain data for the CLI and API
+    metrics.inc("analysis_chars_total", len(text))
+    return {
+        "summary": summarize_text(text, max_sentences=max_sentences),
+        "keywords": extract_keywords(text, num_keywords=num_keywords),
+        "sentiment": analyze_sentiment(text),
+    }
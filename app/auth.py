@@ -1,100 +1,77 @@
-from app.models import SessionLocal, User, ActivityLog
+from app.models import User
+from database.db import session_scope
+from app.activity_log import get_writer
+from app.mailer import enqueue_email, wake_mail_sender
+from app import metrics
 import bcrypt
-import smtplib
-from email.mime.text import MIMEText
-import os
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+@metrics.timed("auth_register_seconds")
 def register_user(username: str, password: str, email: str = None, is_admin: bool = False):
-    db = SessionLocal()
+    """
+    Returns (ok, message, email_queued). email_queued is True when a
+    verification email was put in the outbox and None when no email was given.
+    """
     try:
-        try:
+        with session_scope() as db:
             if db.query(User).filter(User.username == username).first():
-                return False, "user_exists"
+                return False, "user_exists", None
             if email and db.query(User).filter(User.email == email).first():
-                return False, "email_exists"
+                return False, "email_exists", None
             pw_hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
             user = User(username=username, hashed_password=pw_hash.decode("utf-8"), is_admin=is_admin, email=email, is_active=True, created_at=datetime.utcnow())
             db.add(user)
-            db.commit()
-            email_sent = None
+            email_queued = None
             if email:
-                email_sent = send_verification_email(email, username)
-            return True, "created", email_sent
-        except Exception as e:
-            db.rollback()
-            logger.error(f"Error registering user {username}: {e}")
-            return False, "registration_error"
-    finally:
-        db.close()
+                # committed together with the user; the mail sender delivers it in the background
+                enqueue_email(db, email, *verification_email(username))
+                email_queued = True
+    except Exception as e:
+        logger.error(f"Error registering user {username}: {e}")
+        return False, "registration_error", None
+    if email_queued:
+        wake_mail_sender()
+    return True, "created", email_queued
 
+@metrics.timed("auth_login_seconds")
 def authenticate_user(username: str, password: str):
-    db = SessionLocal()
+    user = _authenticate(username, password)
+    metrics.inc("auth_logins_total", result="success" if user else "failure")
+    return user
+
+def _authenticate(username: str, password: str):
     try:
-        try:
+        # the returned user is read after the session closes
+        with session_scope(expire_on_commit=False) as db:
             user = db.query(User).filter(User.username == username).first()
             if not user:
                 return None
             if bcrypt.checkpw(password.encode("utf-8"), user.hashed_password.encode("utf-8")):
                 user.last_login = datetime.utcnow()
-                db.commit()
-                # Load attributes to prevent lazy loading after session close
-                _ = user.is_admin
-                _ = user.username
                 return user
             return None
-        except Exception as e:
-            logger.error(f"Error authenticating user {username}: {e}")
-            return None
-    finally:
-        db.close()
+    except Exception as e:
+        logger.error(f"Error authenticating user {username}: {e}")
+        return None
 
 def list_users():
-    db = SessionLocal()
     try:
-        try:
+        with session_scope(expire_on_commit=False) as db:
             return db.query(User).order_by(User.username).all()
-        except Exception as e:
-            logger.error(f"Error listing users: {e}")
-            return []
-    finally:
-        db.close()
+    except Exception as e:
+        logger.error(f"Error listing users: {e}")
+        return []
 
 def log_activity(user_id: int, action: str, details: str = ""):
-    db = SessionLocal()
+    # rows are buffered and committed in batches by the background writer
     try:
-        try:
-            log = ActivityLog(user_id=user_id, action=action, timestamp=datetime.utcnow(), details=details)
-            db.add(log)
-            db.commit()
-        except Exception as e:
-            logger.error(f"Error logging activity for user {user_id}: {e}")
-    finally:
-        db.close()
-
-def send_verification_email(email: str, username: str):
-    # Simple email sending function
-    # Note: Requires SMTP server configuration
-    smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-    smtp_port = int(os.getenv('SMTP_PORT', 587))
-    smtp_user = os.getenv('SMTP_USER', 'your_email@gmail.com')
-    smtp_pass = os.getenv('SMTP_PASS', 'your_password')
-
-    msg = MIMEText(f"Hello {username},\n\nPlease verify your email by clicking the link: [verification link]\n\nThank you!")
-    msg['Subject'] = 'Email Verification'
-    msg['From'] = smtp_user
-    msg['To'] = email
-
-    try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(smtp_user, smtp_pass)
-        server.sendmail(smtp_user, email, msg.as_string())
-        server.quit()
-        return True
+        get_writer().submit(user_id, action, details)
     except Exception as e:
-        logger.error(f"Failed to send email to {email}: {e}")
-        return False
+        logger.error(f"Error logging activity for user {user_id}: {e}")
+
+def verification_email(username: str):
+    """Returns (subject, body) for the verification email."""
+    return "Email Verification", f"Hello {username},\n\nPlease verify your email by clicking the link: [verification link]\n\nThank you!"
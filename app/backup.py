@@ -0,0 +1,518 @@
+"""
+Backup and restore of the database and encrypted storage.
+
+    python -m app.backup create backups/full-20240601.tar
+    python -m app.backup create backups/incr-20240602.tar --base backups/full-20240601.tar
+    python -m app.backup create backups/alice.tar --user alice
+    python -m app.backup restore backups/incr-20240602.tar ./restored
+
+A backup is a single uncompressed tar written as a stream:
+
+    db/System.db.enc      Fernet-encrypted snapshot taken with SQLite's online
+    db/data/app.db.enc    backup API, so it is consistent while the app runs
+                          (the legacy data/app.db only in system backups)
+    blobs/<storage_name>  encrypted blobs referenced by the snapshot, opened
+                          and read ahead in parallel, then streamed into the
+                          tar; already Fernet tokens, stored as-is
+    fernet.key            only with --include-key
+    manifest.json         sha256 and size of every member, the base backup
+                          for incrementals, and the file records whose blobs
+                          were deleted before they could be read ("missing")
+
+The manifest is also written next to the archive (<archive>.manifest.json);
+when that side-car is lost, the copy inside the archive is used. An
+incremental backup reads its base's manifest and skips blobs the base chain
+already holds; blobs never change once written, so a name match is enough.
+Restore walks the chain from the full backup forward and checks every
+member against its manifest. Snapshots and members are encrypted, copied
+and decrypted in fixed-size segments, never held whole in memory.
+
+A --user backup holds only that user's rows (other users' data is deleted
+from the snapshot copy and vacuumed away) and their blobs.
+"""
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import tarfile
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from cryptography.fernet import InvalidToken
+
+from app import file_manager
+from app.storage_usage import UNKNOWN_TYPE
+from database.db import get_engine
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+DB_PREFIX = "db/"
+KEY_MEMBER = "fernet.key"
+MANIFEST_MEMBER = "manifest.json"
+BLOB_PREFIX = "blobs/"
+
+
+class BackupError(Exception):
+    pass
+
+
+def manifest_path(archive_path: str) -> str:
+    return archive_path + ".manifest.json"
+
+
+def load_manifest(archive_path: str) -> dict:
+    """The side-car manifest, or else the manifest.json member of the archive itself."""
+    try:
+        with open(manifest_path(archive_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+    try:
+        # an uncompressed tar: finding the member only reads headers and seeks past the data
+        with tarfile.open(archive_path, mode="r:") as tar:
+            return json.load(tar.extractfile(tar.getmember(MANIFEST_MEMBER)))
+    except (OSError, KeyError, tarfile.TarError) as e:
+        raise BackupError(f"no manifest for {archive_path}: neither {os.path.basename(manifest_path(archive_path))} "
+                          f"nor a {MANIFEST_MEMBER} inside the archive could be read ({e})")
+
+
+def _database_path() -> str:
+    url = get_engine().url
+    if not url.drivername.startswith("sqlite") or not url.database or url.database == ":memory:":
+        raise BackupError(f"only file-backed SQLite databases can be backed up, not {url}")
+    return os.path.abspath(url.database)
+
+
+def _databases(scope: str):
+    """(restore path, live path) of each database the backup covers."""
+    databases = [("System.db", _database_path())]
+    legacy = os.path.join(file_manager.DATA_DIR, "app.db")
+    if scope == "system" and os.path.exists(legacy):
+        databases.append(("data/app.db", legacy))
+    return databases
+
+
+def snapshot_database(dest_path: str, source_path: str):
+    """Copies a live database with the online backup API."""
+    src = sqlite3.connect(source_path)
+    dst = sqlite3.connect(dest_path)
+    try:
+        # one step under a single read transaction: a stepped copy starts over
+        # whenever another connection writes, so it may never finish on a busy app
+        src.backup(dst, pages=-1)
+    finally:
+        dst.close()
+        src.close()
+
+
+def _restrict_to_user(snapshot_path: str, user_id: int):
+    conn = sqlite3.connect(snapshot_path)
+    try:
+        tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+        for table in tables:
+            columns = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+            if table == "users":
+                conn.execute("DELETE FROM users WHERE id != ?", (user_id,))
+            elif "user_id" in columns:
+                conn.execute(f"DELETE FROM {table} WHERE user_id IS NOT ?", (user_id,))
+        conn.execute("DELETE FROM threat_detections WHERE file_id NOT IN (SELECT id FROM file_records)")
+        conn.execute("DELETE FROM admin_actions WHERE admin_id IS NOT ? AND target_user_id IS NOT ?", (user_id, user_id))
+        conn.execute("DELETE FROM outbox_emails")
+        conn.execute("DELETE FROM storage_usage_types")
+        conn.execute("INSERT INTO storage_usage_types (file_type, file_count, total_bytes) "
+                     "SELECT COALESCE(file_type, ?), COUNT(*), SUM(file_size) "
+                     "FROM file_records WHERE file_size IS NOT NULL GROUP BY 1", (UNKNOWN_TYPE,))
+        conn.commit()
+        # drop the freed pages so other users' rows are not recoverable from the file
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def _referenced_blobs(snapshot_path: str):
+    """{storage_name: [file record ids]} for every blob the snapshot refers to."""
+    conn = sqlite3.connect(snapshot_path)
+    try:
+        refs = {}
+        for name, file_id in conn.execute(
+                "SELECT storage_name, id FROM file_records WHERE storage_name IS NOT NULL ORDER BY storage_name, id"):
+            refs.setdefault(name, []).append(file_id)
+        return refs
+    finally:
+        conn.close()
+
+
+def _user_id(snapshot_path: str, username: str) -> int:
+    conn = sqlite3.connect(snapshot_path)
+    try:
+        row = conn.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        raise BackupError(f"no such user: {username}")
+    return row[0]
+
+
+def _open_blob(name: str):
+    """(name, open file, size), or (name, None, 0) if the blob is gone; the kernel is asked to read it ahead."""
+    try:
+        f = open(os.path.join(file_manager.STORAGE_DIR, name), "rb")
+    except FileNotFoundError:
+        return name, None, 0
+    size = os.fstat(f.fileno()).st_size
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+    return name, f, size
+
+
+class _HashingReader:
+    """Hands a file to tarfile while computing its sha256 on the way through."""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.digest.update(data)
+        return data
+
+
+def _add_member(tar, name: str, data: bytes, mtime: float):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = mtime
+    info.mode = 0o600
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _add_blob_member(tar, name: str, f, size: int, mtime: float) -> str:
+    """Streams size bytes of f into the tar; returns their sha256."""
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = mtime
+    info.mode = 0o600
+    reader = _HashingReader(f)
+    tar.addfile(info, reader)
+    return reader.digest.hexdigest()
+
+
+def _add_file_member(tar, name: str, path: str, mtime: float) -> int:
+    info = tarfile.TarInfo(name)
+    info.size = os.path.getsize(path)
+    info.mtime = mtime
+    info.mode = 0o600
+    with open(path, "rb") as f:
+        tar.addfile(info, f)
+    return info.size
+
+
+def _chunks(f, digest=None, chunk_size: int = file_manager.CHUNK_SIZE):
+    """Reads f in fixed-size segments, feeding each to digest on the way."""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        if digest is not None:
+            digest.update(chunk)
+        yield chunk
+
+
+def _encrypt_snapshot(snapshot: str, key: bytes) -> dict:
+    """Encrypts snapshot to snapshot + ".enc" in segments; returns its manifest entry."""
+    digest = hashlib.sha256()
+    with open(snapshot, "rb") as src, open(snapshot + ".enc", "wb") as dst:
+        size = file_manager.encrypt_stream(_chunks(src, digest), dst.write, key)
+    os.remove(snapshot)
+    return {"sha256": digest.hexdigest(), "size": size}
+
+
+def create_backup(archive_path: str, username: str = None, base: str = None, workers: int = 4,
+                  include_key: bool = False) -> dict:
+    """
+    Writes a backup archive and its side-car manifest; returns a summary
+    with counts, bytes and MB/s.
+    """
+    start = time.perf_counter()
+    file_manager.get_or_create_fernet()
+    scope = f"user:{username}" if username else "system"
+    base_blobs = {}
+    if base:
+        base_manifest = load_manifest(base)
+        if base_manifest["scope"] != scope:
+            raise BackupError(f"base backup scope {base_manifest['scope']} does not match {scope}")
+        base_blobs = base_manifest["blobs"]
+    os.makedirs(os.path.dirname(os.path.abspath(archive_path)), exist_ok=True)
+
+    with open(file_manager.FERNET_PATH, "rb") as f:
+        key = f.read()
+    now = time.time()
+    archive_name = os.path.basename(archive_path)
+    written_bytes = 0
+    tmp_path = archive_path + ".part"
+    # snapshots are encrypted to disk and copied into the archive a segment at a time
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshots = {}
+        for rel, live in _databases(scope):
+            snapshot = os.path.join(tmp, f"snapshot{len(snapshots)}.db")
+            snapshot_database(snapshot, live)
+            if rel == "System.db":
+                if username:
+                    _restrict_to_user(snapshot, _user_id(snapshot, username))
+                refs = _referenced_blobs(snapshot)
+            snapshots[rel] = (snapshot + ".enc", _encrypt_snapshot(snapshot, key))
+
+        manifest = {
+            "format": FORMAT_VERSION,
+            "created_at": datetime.utcnow().isoformat(),
+            "scope": scope,
+            "base": os.path.basename(base) if base else None,
+            "databases": {rel: entry for rel, (_, entry) in snapshots.items()},
+            "key_included": include_key,
+            # every blob the snapshot needs, and which archive in the chain holds it
+            "blobs": {n: base_blobs[n] for n in refs if n in base_blobs},
+        }
+        inherited = len(manifest["blobs"])
+        todo = [n for n in refs if n not in base_blobs]
+        missing = []
+        with open(tmp_path, "wb") as out, tarfile.open(fileobj=out, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+            for rel, (enc_path, _) in snapshots.items():
+                written_bytes += _add_file_member(tar, DB_PREFIX + rel + ".enc", enc_path, now)
+                os.remove(enc_path)
+            if include_key:
+                _add_member(tar, KEY_MEMBER, key, now)
+            # the pool opens the next few blobs and starts their reads; their bytes are then
+            # copied into the tar in tarfile-sized pieces, so no blob is held whole in memory
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backup-read") as pool:
+                queue = iter(todo)
+                pending = deque(pool.submit(_open_blob, n) for n in islice(queue, workers * 2))
+                try:
+                    while pending:
+                        name, f, size = pending.popleft().result()
+                        for nxt in islice(queue, 1):
+                            pending.append(pool.submit(_open_blob, nxt))
+                        if f is None:
+                            # deleted after the snapshot was taken; the snapshot's rows for it
+                            # are listed so a restore can say which files have no content
+                            missing.append({"storage_name": name, "file_ids": refs[name]})
+                            continue
+                        with f:
+                            sha256 = _add_blob_member(tar, BLOB_PREFIX + name, f, size, now)
+                        written_bytes += size
+                        manifest["blobs"][name] = {"sha256": sha256, "size": size, "archive": archive_name}
+                finally:
+                    # blobs opened ahead but never copied, e.g. after a write error
+                    for future in pending:
+                        if future.exception() is None and future.result()[1] is not None:
+                            future.result()[1].close()
+            manifest["missing"] = missing
+            _add_member(tar, MANIFEST_MEMBER, json.dumps(manifest, indent=1).encode("utf-8"), now)
+            out.flush()
+            os.fsync(out.fileno())
+    os.replace(tmp_path, archive_path)
+    with open(manifest_path(archive_path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+
+    elapsed = time.perf_counter() - start
+    added = len(todo) - len(missing)
+    summary = {"archive": archive_path, "scope": scope, "blobs": added, "inherited": inherited,
+               "missing": len(missing), "bytes": written_bytes, "seconds": elapsed,
+               "mb_per_s": written_bytes / 1e6 / elapsed if elapsed else 0.0}
+    if missing:
+        file_ids = sorted(i for m in missing for i in m["file_ids"])
+        logger.warning(f"{len(missing)} blobs referenced by the snapshot were gone by the time they were read; "
+                       f"file records {file_ids} are listed as missing in the manifest")
+    logger.info(f"Backup {archive_path}: {added} blobs, {written_bytes / 1e6:.1f} MB at {summary['mb_per_s']:.1f} MB/s")
+    return summary
+
+
+def _chain(archive_path: str):
+    """[full, incr1, ..., archive_path] using the side-car manifests in the same folder."""
+    chain = [archive_path]
+    folder = os.path.dirname(os.path.abspath(archive_path))
+    manifest = load_manifest(archive_path)
+    while manifest.get("base"):
+        path = os.path.join(folder, manifest["base"])
+        if path in chain:
+            raise BackupError(f"backup chain loops at {path}")
+        chain.insert(0, path)
+        manifest = load_manifest(path)
+    return chain
+
+
+def _write_file(path: str, chunks, verify=None) -> int:
+    """
+    Writes chunks to path via a .part file that only replaces path once
+    verify() (if given) has accepted it; returns the bytes written.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".part"
+    size = 0
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        if verify is not None:
+            verify()
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    return size
+
+
+def _restore_database(token_path: str, db_path: str, key: bytes, expected: dict, rel: str):
+    """Decrypts a spooled snapshot token into db_path in segments and checks it."""
+    digest = hashlib.sha256()
+    tmp = db_path + ".part"
+    try:
+        with open(token_path, "rb") as src, open(tmp, "wb") as dst:
+            def write(data):
+                digest.update(data)
+                dst.write(data)
+            try:
+                file_manager.decrypt_stream(_chunks(src), write, key)
+            except InvalidToken:
+                raise BackupError(f"database {rel} could not be decrypted; wrong key or damaged archive")
+            dst.flush()
+            os.fsync(dst.fileno())
+        if digest.hexdigest() != expected["sha256"]:
+            raise BackupError(f"checksum mismatch for database {rel}")
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        check = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    if check != "ok":
+        raise BackupError(f"restored database {rel} failed integrity_check: {check}")
+
+
+def restore_backup(archive_path: str, target_dir: str, key_path: str = None) -> dict:
+    """
+    Restores into target_dir (System.db, storage/ and, where included,
+    data/app.db and data/fernet.key). Every member is checked against the
+    newest manifest and each database must pass PRAGMA integrity_check; a
+    failure raises BackupError. Members are copied and decrypted a segment
+    at a time. Returns a summary with MB/s and the file records whose blobs
+    were already gone when the backup was taken.
+    """
+    start = time.perf_counter()
+    chain = _chain(archive_path)
+    final = load_manifest(archive_path)
+    wanted = final["blobs"]
+    storage_dir = os.path.join(target_dir, "storage")
+    restored, read_bytes, db_tokens, key = set(), 0, {}, None
+    try:
+        for path in chain:
+            name = os.path.basename(path)
+            with tarfile.open(path, mode="r|") as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    source = tar.extractfile(member)
+                    if member.name.startswith(BLOB_PREFIX):
+                        blob = member.name[len(BLOB_PREFIX):]
+                        expected = wanted.get(blob)
+                        # blobs superseded or dropped since an older backup are skipped
+                        if expected is None or expected["archive"] != name:
+                            continue
+                        digest = hashlib.sha256()
+
+                        def verify():
+                            if digest.hexdigest() != expected["sha256"]:
+                                raise BackupError(f"checksum mismatch for blob {blob} in {name}")
+                        read_bytes += _write_file(os.path.join(storage_dir, blob), _chunks(source, digest), verify)
+                        restored.add(blob)
+                    elif path != archive_path:
+                        continue
+                    elif member.name.startswith(DB_PREFIX) and member.name.endswith(".enc"):
+                        rel = member.name[len(DB_PREFIX):-len(".enc")]
+                        # spooled: the key member may come later in the archive
+                        token_path = os.path.join(target_dir, rel + ".enc")
+                        read_bytes += _write_file(token_path, _chunks(source))
+                        db_tokens[rel] = token_path
+                    elif member.name == KEY_MEMBER:
+                        key = source.read()
+                        read_bytes += len(key)
+        lost = set(wanted) - restored
+        if lost:
+            raise BackupError(f"{len(lost)} blobs listed in the manifest were not found in the backup chain")
+        if set(db_tokens) != set(final["databases"]):
+            raise BackupError("database snapshots in the archive do not match its manifest")
+
+        if key is not None:
+            _write_file(os.path.join(target_dir, "data", "fernet.key"), [key])
+        else:
+            with open(key_path or file_manager.FERNET_PATH, "rb") as f:
+                key = f.read()
+        for rel, token_path in db_tokens.items():
+            _restore_database(token_path, os.path.join(target_dir, rel), key.strip(), final["databases"][rel], rel)
+    finally:
+        for token_path in db_tokens.values():
+            if os.path.exists(token_path):
+                os.remove(token_path)
+
+    missing = final.get("missing", [])
+    elapsed = time.perf_counter() - start
+    summary = {"target": target_dir, "archives": len(chain), "blobs": len(restored), "bytes": read_bytes,
+               "missing_file_ids": sorted(i for m in missing for i in m["file_ids"]),
+               "seconds": elapsed, "mb_per_s": read_bytes / 1e6 / elapsed if elapsed else 0.0}
+    if missing:
+        logger.warning(f"File records {summary['missing_file_ids']} have no content: their blobs were deleted "
+                       f"while the backup was taken")
+    logger.info(f"Restored {len(restored)} blobs from {len(chain)} archive(s) at {summary['mb_per_s']:.1f} MB/s")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Back up or restore the database and encrypted storage")
+    sub = parser.add_subparsers(dest="command", required=True)
+    create = sub.add_parser("create", help="write a backup archive")
+    create.add_argument("archive")
+    create.add_argument("--user", help="back up only this user's rows and files")
+    create.add_argument("--base", help="previous backup archive; only newer blobs are stored")
+    create.add_argument("--workers", type=int, default=4, help="parallel blob readers")
+    create.add_argument("--include-key", action="store_true",
+                        help="store data/fernet.key in the archive (anyone with the archive can then decrypt it)")
+    restore = sub.add_parser("restore", help="restore an archive (and its base chain) into a directory")
+    restore.add_argument("archive")
+    restore.add_argument("target_dir")
+    restore.add_argument("--key", help="fernet.key to decrypt with if the archive does not include one")
+    args = parser.parse_args(argv)
+
+    if args.command == "create":
+        from app.models import init_db
+        init_db()
+        summary = create_backup(args.archive, username=args.user, base=args.base, workers=args.workers,
+                                include_key=args.include_key)
+        print(f"{summary['archive']}: {summary['blobs']} blobs written, {summary['inherited']} from base, "
+              f"{summary['missing']} missing, {summary['bytes'] / 1e6:.1f} MB in {summary['seconds']:.1f}s "
+              f"({summary['mb_per_s']:.1f} MB/s)")
+    else:
+        summary = restore_backup(args.archive, args.target_dir, key_path=args.key)
+        print(f"Restored {summary['blobs']} blobs from {summary['archives']} archive(s) into {summary['target']}, "
+              f"{summary['bytes'] / 1e6:.1f} MB in {summary['seconds']:.1f}s ({summary['mb_per_s']:.1f} MB/s)")
+        if summary["missing_file_ids"]:
+            print(f"File records without content (deleted during the backup): {summary['missing_file_ids']}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,256 @@
+"""
+Headless command line for batch jobs; reuses file_manager, ai_processor and
+auth and never imports PySide6.
+
+    python -m app.cli --user alice ingest ./docs --recursive --pattern "*.txt"
+    python -m app.cli --user alice analyze --out results.jsonl
+    python -m app.cli --user alice export --out files.jsonl
+    python -m app.cli --user admin import-users new_staff.csv --out report.jsonl
+
+The password is taken from $SECURE_AI_PASSWORD (see --password-env) or
+prompted for. Results are written as JSON Lines, one object per file.
+import-users delivers the verification emails it queues before exiting,
+using the SMTP_* settings described in app/mailer.py.
+"""
+import sys
+import os
+import argparse
+import fnmatch
+import getpass
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+# ensure project root is on sys.path so imports like `from app...` work when run as a script
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from app import file_manager
+from app.ai_processor import analyze_document
+from app.auth import authenticate_user, log_activity
+from app.mailer import get_sender
+from app.models import init_db, FileRecord
+from app.provisioning import import_users_file
+from database.db import configure_database, session_scope
+
+logger = logging.getLogger(__name__)
+
+DB_BATCH = 500
+
+
+def _init_worker(storage_dir: str, fernet_path: str):
+    # worker processes may be spawned rather than forked; carry over path overrides
+    file_manager.STORAGE_DIR = storage_dir
+    file_manager.FERNET_PATH = fernet_path
+
+
+def _encrypt_one(job):
+    path, filename, user_id = job
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        metadata = file_manager.describe_content(data, filename)
+        storage_name = file_manager.save_encrypted_file(str(user_id), filename, data)
+        return {"filename": filename, "storage_name": storage_name, "size": len(data),
+                "file_type": metadata["file_type"], "content_hash": metadata["content_hash"]}
+    except Exception as e:
+        return {"filename": filename, "error": str(e)}
+
+
+def _analyze_one(job):
+    record_id, filename, storage_name = job
+    try:
+        text = file_manager.load_decrypted_file(storage_name).decode("utf-8", errors="ignore")
+        return {"id": record_id, "filename": filename, **analyze_document(text)}
+    except Exception as e:
+        return {"id": record_id, "filename": filename, "error": str(e) or type(e).__name__}
+
+
+def _pool(workers: int):
+    # create the key up front so workers never race to generate it
+    file_manager.get_or_create_fernet()
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(file_manager.STORAGE_DIR, file_manager.FERNET_PATH))
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _write(out, obj):
+    out.write(json.dumps(obj, default=str) + "\n")
+
+
+def iter_input_files(directory: str, recursive: bool = False, pattern: str = "*"):
+    """Yields (path, name relative to directory) for regular files matching pattern."""
+    for root, dirs, files in os.walk(directory):
+        if not recursive:
+            dirs[:] = []
+        dirs.sort()
+        for name in sorted(files):
+            if fnmatch.fnmatch(name, pattern):
+                path = os.path.join(root, name)
+                yield path, os.path.relpath(path, directory).replace(os.sep, "/")
+
+
+def iter_user_records(user_id: int, ids=None):
+    """Yields the user's file rows in id order, reading the DB a batch at a time."""
+    last_id = 0
+    while True:
+        with session_scope() as db:
+            query = db.query(FileRecord.id, FileRecord.filename, FileRecord.storage_name, FileRecord.uploaded_at,
+                             FileRecord.file_size, FileRecord.file_type, FileRecord.content_hash) \
+                .filter(FileRecord.user_id == user_id, FileRecord.id > last_id)
+            if ids:
+                query = query.filter(FileRecord.id.in_(ids))
+            rows = query.order_by(FileRecord.id).limit(DB_BATCH).all()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1].id
+
+
+def cmd_ingest(user, args, out):
+    jobs = [(path, name, user.id) for path, name in iter_input_files(args.directory, args.recursive, args.pattern)]
+    ok = failed = 0
+    with _pool(args.workers) as pool:
+        for batch in _batches(pool.map(_encrypt_one, jobs, chunksize=4), DB_BATCH):
+            stored = [r for r in batch if "error" not in r]
+            try:
+                ids = file_manager.add_file_records(user.id, [
+                    (r["filename"], r["storage_name"],
+                     {"file_size": r["size"], "file_type": r["file_type"], "content_hash": r["content_hash"]})
+                    for r in stored]) if stored else []
+            except Exception as e:
+                # like add_user_file: don't leave unreferenced blobs behind, then go on with the next batch
+                logger.error(f"Failed to record {len(stored)} ingested files: {e}")
+                for result in stored:
+                    try:
+                        os.remove(os.path.join(file_manager.STORAGE_DIR, result.pop("storage_name")))
+                    except OSError:
+                        pass
+                    result["error"] = f"database error: {e}"
+                stored, ids = [], []
+            for result, record_id in zip(stored, ids):
+                result["id"] = record_id
+                log_activity(user.id, "file_upload", f"Uploaded file: {result['filename']}")
+            for result in batch:
+                _write(out, result)
+            ok += len(stored)
+            failed += len(batch) - len(stored)
+    print(f"ingested {ok} files, {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def cmd_analyze(user, args, out):
+    ok = failed = 0
+    with _pool(args.workers) as pool:
+        for batch in _batches(iter_user_records(user.id, args.ids), DB_BATCH):
+            jobs = [(r.id, r.filename, r.storage_name) for r in batch]
+            for result in pool.map(_analyze_one, jobs, chunksize=4):
+                _write(out, result)
+                if "error" in result:
+                    failed += 1
+                else:
+                    ok += 1
+                    log_activity(user.id, "file_process", f"Processed file: {result['filename']}")
+    print(f"analyzed {ok} files, {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def cmd_export(user, args, out):
+    count = 0
+    for r in iter_user_records(user.id, args.ids):
+        _write(out, {"id": r.id, "filename": r.filename, "storage_name": r.storage_name,
+                     "uploaded_at": r.uploaded_at.isoformat() if r.uploaded_at else None,
+                     "file_size": r.file_size, "file_type": r.file_type, "content_hash": r.content_hash})
+        count += 1
+    print(f"exported {count} records", file=sys.stderr)
+    return 0
+
+
+def cmd_import_users(user, args, out):
+    if not user.is_admin:
+        print("import-users requires an admin account", file=sys.stderr)
+        return 2
+    report = import_users_file(args.file, workers=args.workers, send_verification=not args.no_email)
+    for entry in report:
+        _write(out, entry)
+    created = sum(1 for r in report if r["status"] == "created")
+    log_activity(user.id, "bulk_import", f"Imported {created} users from {os.path.basename(args.file)} (CLI)")
+    print(f"created {created} users, {len(report) - created} rejected", file=sys.stderr)
+    if created and not args.no_email:
+        # this process exits right away, so deliver the verification mail now instead of leaving it queued
+        attempted = get_sender().drain()
+        print(f"attempted {attempted} verification emails; failures stay in the outbox and the app retries them",
+              file=sys.stderr)
+    return 1 if created < len(report) else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Secure AI App batch command line")
+    parser.add_argument("--user", required=True, help="account to act as")
+    parser.add_argument("--password-env", default="SECURE_AI_PASSWORD", help="environment variable holding the password")
+    parser.add_argument("--db", help="database URL (default: SECURE_AI_DATABASE_URL or ./System.db)")
+    parser.add_argument("--storage-dir", help="encrypted blob directory (default: storage/)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--out", default="-", help="JSONL output file, '-' for stdout")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="encrypt and record every file in a directory")
+    ingest.add_argument("directory")
+    ingest.add_argument("--recursive", action="store_true")
+    ingest.add_argument("--pattern", default="*", help="filename glob, e.g. '*.txt'")
+    ingest.set_defaults(handler=cmd_ingest)
+
+    analyze = sub.add_parser("analyze", help="summarize, extract keywords and sentiment for stored files")
+    analyze.add_argument("--ids", type=int, nargs="*", help="limit to these file ids")
+    analyze.set_defaults(handler=cmd_analyze)
+
+    export = sub.add_parser("export", help="export file metadata")
+    export.add_argument("--ids", type=int, nargs="*", help="limit to these file ids")
+    export.set_defaults(handler=cmd_export)
+
+    import_users = sub.add_parser("import-users", help="create accounts from a CSV or JSONL file (admin only)")
+    import_users.add_argument("file", help="CSV with a header row, or .jsonl; columns username, password, email, is_admin")
+    import_users.add_argument("--no-email", action="store_true", help="don't queue verification emails")
+    import_users.set_defaults(handler=cmd_import_users)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.db:
+        configure_database(args.db)
+    if args.storage_dir:
+        file_manager.STORAGE_DIR = os.path.abspath(args.storage_dir)
+    init_db()
+
+    password = os.getenv(args.password_env)
+    if password is None:
+        password = getpass.getpass(f"Password for {args.user}: ")
+    user = authenticate_user(args.user, password)
+    if not user:
+        log_activity(None, "failed_login", f"Failed CLI login attempt for {args.user}")
+        print("invalid credentials", file=sys.stderr)
+        return 2
+    log_activity(user.id, "login", "User logged in (CLI)")
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    try:
+        return args.handler(user, args, out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
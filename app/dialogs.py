@@ -0,0 +1,105 @@
+# Dialogs shown before sign-in. This module only depends on PySide6 so the
+# first window can appear before the database and crypto stack is imported.
+from PySide6.QtWidgets import (
+    QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QLineEdit, QCheckBox, QMessageBox, QDialog, QFormLayout
+)
+from PySide6.QtCore import Qt
+
+class MainChoiceDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Secure AI App - Choose Login Type")
+        self.setMinimumWidth(300)
+        self.setMinimumHeight(200)
+        layout = QVBoxLayout()
+
+        title = QLabel("Choose Login Type")
+        title.setObjectName("title_label")
+        title.setAlignment(Qt.AlignCenter)
+        layout.addWidget(title)
+
+        btn_layout = QVBoxLayout()
+        self.user_btn = QPushButton("User Login")
+        self.user_btn.setObjectName("user_login_btn")
+        self.admin_btn = QPushButton("Admin Login")
+        self.admin_btn.setObjectName("admin_login_btn")
+        btn_layout.addWidget(self.user_btn)
+        btn_layout.addWidget(self.admin_btn)
+        layout.addLayout(btn_layout)
+
+        self.setLayout(layout)
+
+class LoginDialog(QDialog):
+    def __init__(self, parent=None, is_admin=False):
+        super().__init__(parent)
+        self.is_admin = is_admin
+        title_text = "Secure AI App - Admin Sign In" if is_admin else "Secure AI App - User Sign In"
+        self.setWindowTitle(title_text)
+        self.setMinimumWidth(450)
+        self.setMinimumHeight(300)
+        layout = QVBoxLayout()
+
+        # Logo or title
+        title = QLabel(title_text)
+        title.setObjectName("title_label")
+        title.setAlignment(Qt.AlignCenter)
+        layout.addWidget(title)
+
+        form = QFormLayout()
+        self.user_edit = QLineEdit()
+        self.user_edit.setPlaceholderText("Enter username")
+        self.email_edit = QLineEdit()
+        self.email_edit.setPlaceholderText("Enter email")
+        self.pw_edit = QLineEdit()
+        self.pw_edit.setEchoMode(QLineEdit.Password)
+        self.pw_edit.setPlaceholderText("Enter password")
+        self.show_pw_check = QCheckBox("Show Password")
+        # Create a horizontal layout for password field and checkbox
+        pw_layout = QHBoxLayout()
+        pw_layout.addWidget(self.pw_edit)
+        pw_layout.addWidget(self.show_pw_check)
+        form.addRow("Username:", self.user_edit)
+        form.addRow("Email:", self.email_edit)
+        form.addRow("Password:", pw_layout)
+        layout.addLayout(form)
+
+        self.show_pw_check.stateChanged.connect(self.toggle_password_visibility)
+
+        # Remember me and forgot password
+        options_layout = QHBoxLayout()
+        self.remember_check = QCheckBox("Remember Me")
+        self.forgot_btn = QPushButton("Forgot Password?")
+        self.forgot_btn.setStyleSheet("border: none; color: blue; text-decoration: underline;")
+        options_layout.addWidget(self.remember_check)
+
+        options_layout.addStretch()
+        options_layout.addWidget(self.forgot_btn)
+        layout.addLayout(options_layout)
+
+        btn_layout = QHBoxLayout()
+        self.back_btn = QPushButton("Back")
+        self.back_btn.setObjectName("back_btn")
+        self.login_btn = QPushButton("Sign In")
+        self.login_btn.setObjectName("login_btn")
+        self.register_btn = QPushButton("Register")
+        self.register_btn.setObjectName("register_btn")
+        btn_layout.addWidget(self.back_btn)
+        btn_layout.addWidget(self.login_btn)
+        btn_layout.addWidget(self.register_btn)
+        layout.addLayout(btn_layout)
+
+        self.setLayout(layout)
+
+        # Connect forgot password
+        self.forgot_btn.clicked.connect(self.forgot_password)
+
+
+    def toggle_password_visibility(self, state):
+        if state == Qt.Checked:
+            self.pw_edit.setEchoMode(QLineEdit.Normal)
+        else:
+            self.pw_edit.setEchoMode(QLineEdit.Password)
+
+    def forgot_password(self):
+        # Simple placeholder for forgot password functionality
+        QMessageBox.information(self, "Forgot Password", "Please contact the administrator to reset your password.")
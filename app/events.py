@@ -0,0 +1,174 @@
+import logging
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event
+
+from database.db import SessionLocal, get_engine
+
+logger = logging.getLogger(__name__)
+
+# tables whose inserts are announced on the bus; the topic is the table name
+WATCHED_TABLES = ("activity_logs", "threat_detections", "file_records", "notifications", "users")
+POLL_INTERVAL = float(os.getenv("CHANGE_WATCH_INTERVAL", 0.25))
+
+
+class EventBus:
+    """
+    Minimal in-process publish/subscribe. Callbacks run on the publishing
+    thread, so they should only hand work off (e.g. emit a Qt signal).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(list)
+
+    def subscribe(self, topic: str, callback):
+        with self._lock:
+            self._subscribers[topic].append(callback)
+        return lambda: self.unsubscribe(topic, callback)
+
+    def unsubscribe(self, topic: str, callback):
+        with self._lock:
+            if callback in self._subscribers.get(topic, []):
+                self._subscribers[topic].remove(callback)
+
+    def publish(self, topic: str, **payload):
+        with self._lock:
+            callbacks = list(self._subscribers.get(topic, []))
+        for callback in callbacks:
+            try:
+                callback(topic, payload)
+            except Exception as e:
+                logger.error(f"Error in subscriber for {topic}: {e}")
+
+
+bus = EventBus()
+
+
+# ORM inserts: remember the tables touched by a flush and announce them once the commit lands
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_inserts(session, flush_context):
+    tables = session.info.setdefault("inserted_tables", set())
+    for obj in session.new:
+        table = getattr(obj, "__tablename__", None)
+        if table in WATCHED_TABLES:
+            tables.add(table)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_inserts(session):
+    for table in session.info.pop("inserted_tables", ()):
+        bus.publish(table, source="local")
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_inserts(session):
+    session.info.pop("inserted_tables", None)
+
+
+class ChangeWatcher:
+    """
+    Detects commits made through any other connection, including other
+    processes, by polling SQLite's PRAGMA data_version on a private
+    connection. Only when it moves is each watched table's state read:
+    MAX(id) for inserts and the table's newest row_changes seq for updates
+    and deletes (both index lookups). Tables whose state changed are
+    published.
+    """
+
+    def __init__(self, database_path: str, tables=WATCHED_TABLES, interval: float = POLL_INTERVAL, event_bus: EventBus = bus):
+        self.database_path = database_path
+        self.tables = tables
+        self.interval = interval
+        self.bus = event_bus
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = None
+        self._data_version = None
+        self._states = {}
+
+    def start(self):
+        if self._thread is None:
+            self._conn = sqlite3.connect(self.database_path, check_same_thread=False)
+            self._data_version = self._read_data_version()
+            self._states = self._read_states()
+            self._thread = threading.Thread(target=self._run, name="db-change-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval * 4)
+            self._thread = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def check(self):
+        """Publishes tables that changed since the last check; returns their names."""
+        version = self._read_data_version()
+        if version == self._data_version:
+            return []
+        self._data_version = version
+        states = self._read_states()
+        changed = [t for t, state in states.items() if state != self._states.get(t)]
+        for table in changed:
+            self.bus.publish(table, source="database", last_id=states[table][0])
+        self._states = states
+        return changed
+
+    def _read_data_version(self):
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _read_states(self):
+        """table -> (MAX(id), newest row_changes seq for the table)."""
+        states = {}
+        for table in self.tables:
+            try:
+                last_id = self._conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0
+            except sqlite3.OperationalError:
+                last_id = 0
+            try:
+                change_seq = self._conn.execute(
+                    "SELECT MAX(seq) FROM row_changes WHERE table_name = ?", (table,)).fetchone()[0] or 0
+            except sqlite3.OperationalError:
+                # not migrated yet
+                change_seq = 0
+            states[table] = (last_id, change_seq)
+        return states
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Change watcher error: {e}")
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def start_change_watcher():
+    """Starts one watcher for the configured database; returns None for in-memory databases."""
+    global _watcher
+    with _watcher_lock:
+        path = get_engine().url.database
+        if _watcher is not None and _watcher.database_path != path:
+            _watcher.stop()
+            _watcher = None
+        if _watcher is None and path and path != ":memory:":
+            _watcher = ChangeWatcher(path).start()
+        return _watcher
+
+
+def stop_change_watcher():
+    global _watcher
+    with _watcher_lock:
+        if _watcher is not None:
+            _watcher.stop()
+            _watcher = None
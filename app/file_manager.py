@@ -1,35 +1,258 @@
+import base64
+import codecs
+import hashlib
+import hmac
+import mimetypes
 import os
+import struct
+import time
 import uuid
-from cryptography.fernet import Fernet
+from datetime import datetime
+
+from app import metrics
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 STORAGE_DIR = os.path.join(BASE_DIR, "storage")
 FERNET_PATH = os.path.join(DATA_DIR, "fernet.key")
+# segment size for streamed encryption and decryption
+CHUNK_SIZE = 1024 * 1024
 
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(STORAGE_DIR, exist_ok=True)
+def ensure_dirs():
+    # created on first use rather than at import time
+    os.makedirs(DATA_DIR, exist_ok=True)
+    os.makedirs(STORAGE_DIR, exist_ok=True)
 
 def get_or_create_fernet():
+    # cryptography is imported on first use; it is not needed to show the login window
+    from cryptography.fernet import Fernet
     if os.path.exists(FERNET_PATH):
         key = open(FERNET_PATH, "rb").read()
     else:
         key = Fernet.generate_key()
+        os.makedirs(os.path.dirname(FERNET_PATH), exist_ok=True)
         with open(FERNET_PATH, "wb") as f:
             f.write(key)
     return Fernet(key)
 
+SNIFF_BYTES = 512
+# (prefix, MIME type); container formats are refined by extension below
+MAGIC_TYPES = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\x1f\x8b", "application/gzip"),
+    (b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (b"{\\rtf", "application/rtf"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/x-ole-storage"),
+]
+CONTAINER_TYPES = {"application/zip", "application/x-ole-storage"}
+
+
+def sniff_mime(head: bytes, filename: str = "") -> str:
+    """Guesses a MIME type from the first bytes of a file, using the name only to break ties."""
+    guessed = mimetypes.guess_type(filename or "")[0]
+    for prefix, mime in MAGIC_TYPES:
+        if head.startswith(prefix):
+            # .docx/.xlsx are zips and .doc/.xls are OLE files; keep the specific name when it agrees
+            if mime in CONTAINER_TYPES and guessed and guessed.startswith("application/"):
+                return guessed
+            return mime
+    if b"\x00" not in head:
+        try:
+            # incremental so a multi-byte character cut off at the end of the sample is not an error
+            codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        except UnicodeDecodeError:
+            pass
+        else:
+            if guessed and (guessed.startswith("text/") or guessed in ("application/json", "application/xml")):
+                return guessed
+            return "text/plain"
+    return "application/octet-stream"
+
+
+class ContentDigest:
+    """Accumulates size, sha256 and a sniffing sample as a file streams through."""
+
+    def __init__(self):
+        self._sha = hashlib.sha256()
+        self._head = b""
+        self.size = 0
+
+    def update(self, chunk: bytes):
+        self._sha.update(chunk)
+        self.size += len(chunk)
+        if len(self._head) < SNIFF_BYTES:
+            self._head += chunk[:SNIFF_BYTES - len(self._head)]
+
+    def metadata(self, filename: str = "") -> dict:
+        return {"file_size": self.size, "file_type": sniff_mime(self._head, filename),
+                "content_hash": self._sha.hexdigest()}
+
+
+def describe_content(raw_bytes: bytes, filename: str = "") -> dict:
+    digest = ContentDigest()
+    digest.update(raw_bytes)
+    return digest.metadata(filename)
+
+
+def read_file(path: str, chunk_size: int = 1024 * 1024):
+    """Reads a local file in chunks; returns (bytes, metadata) without a second pass."""
+    digest = ContentDigest()
+    parts = []
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            parts.append(chunk)
+    return b"".join(parts), digest.metadata(os.path.basename(path))
+
+
 def save_encrypted_file(owner: str, filename: str, raw_bytes: bytes):
     """
     Saves encrypted file bytes into storage and returns storage name.
     Caller should persist a FileRecord with storage_name.
     """
-    fernet = get_or_create_fernet()
-    token = fernet.encrypt(raw_bytes)
+    with metrics.timer("file_encrypt_seconds"):
+        fernet = get_or_create_fernet()
+        token = fernet.encrypt(raw_bytes)
+        storage_name = f"{uuid.uuid4().hex}.enc"
+        ensure_dirs()
+        path = os.path.join(STORAGE_DIR, storage_name)
+        with open(path, "wb") as f:
+            f.write(token)
+    metrics.inc("file_encrypt_bytes_total", len(raw_bytes))
+    return storage_name
+
+def _fernet_key_halves(key: bytes = None):
+    """(signing key, encryption key) of the storage key, or of key if given."""
+    if key is None:
+        get_or_create_fernet()
+        with open(FERNET_PATH, "rb") as f:
+            key = f.read()
+    raw = base64.urlsafe_b64decode(key.strip())
+    return raw[:16], raw[16:]
+
+def encrypt_stream(chunks, write, key: bytes = None) -> int:
+    """
+    Fernet-encrypts the concatenation of chunks segment by segment, passing
+    the token to write() as it is produced; the result is byte for byte a
+    standard Fernet token, so Fernet.decrypt and decrypt_stream both read
+    it. Returns the plaintext size.
+    """
+    from cryptography.hazmat.primitives import padding
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    signing_key, encryption_key = _fernet_key_halves(key)
+    iv = os.urandom(16)
+    encryptor = Cipher(algorithms.AES(encryption_key), modes.CBC(iv)).encryptor()
+    padder = padding.PKCS7(128).padder()
+    header = b"\x80" + struct.pack(">Q", int(time.time())) + iv
+    mac = hmac.new(signing_key, header, hashlib.sha256)
+    pending = header
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        data = encryptor.update(padder.update(chunk))
+        mac.update(data)
+        pending += data
+        # base64 in whole 3-byte groups so the pieces concatenate to one encoding
+        cut = len(pending) - len(pending) % 3
+        if cut:
+            write(base64.urlsafe_b64encode(pending[:cut]))
+            pending = pending[cut:]
+    data = encryptor.update(padder.finalize()) + encryptor.finalize()
+    mac.update(data)
+    write(base64.urlsafe_b64encode(pending + data + mac.digest()))
+    return size
+
+def decrypt_stream(chunks, write, key: bytes = None) -> int:
+    """
+    Decrypts a Fernet token given as chunks, passing plaintext to write() as
+    it is produced. The HMAC can only be checked at the end, so on
+    cryptography.fernet.InvalidToken the caller must discard what was
+    written. Returns the plaintext size.
+    """
+    size = 0
+    for plain in iter_decrypted(chunks, key):
+        size += len(plain)
+        write(plain)
+    return size
+
+def iter_decrypted(chunks, key: bytes = None):
+    """
+    Generator form of decrypt_stream: yields plaintext pieces as the token
+    chunks are consumed, so a caller can pull one piece at a time. The same
+    caveat applies: InvalidToken may only come after earlier pieces.
+    """
+    from cryptography.fernet import InvalidToken
+    from cryptography.hazmat.primitives import padding
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    signing_key, encryption_key = _fernet_key_halves(key)
+    mac = hmac.new(signing_key, digestmod=hashlib.sha256)
+    decryptor = unpadder = None
+    encoded = b""
+    held = b""
+    for chunk in chunks:
+        encoded += b"".join(chunk.split())
+        cut = len(encoded) - len(encoded) % 4
+        try:
+            data = base64.urlsafe_b64decode(encoded[:cut])
+        except ValueError:
+            raise InvalidToken
+        encoded = encoded[cut:]
+        # the last 32 bytes seen so far may be the tag, so they are held back
+        held += data
+        if decryptor is None:
+            if len(held) < 25:
+                continue
+            if held[:1] != b"\x80":
+                raise InvalidToken
+            mac.update(held[:25])
+            decryptor = Cipher(algorithms.AES(encryption_key), modes.CBC(held[9:25])).decryptor()
+            unpadder = padding.PKCS7(128).unpadder()
+            held = held[25:]
+        # only whole AES blocks go to the cipher
+        ready = max(0, len(held) - 32)
+        ready -= ready % 16
+        if ready:
+            mac.update(held[:ready])
+            plain = unpadder.update(decryptor.update(held[:ready]))
+            if plain:
+                yield plain
+            held = held[ready:]
+    if encoded or decryptor is None or len(held) < 32 or (len(held) - 32) % 16:
+        raise InvalidToken
+    mac.update(held[:-32])
+    if not hmac.compare_digest(mac.digest(), held[-32:]):
+        raise InvalidToken
+    try:
+        plain = unpadder.update(decryptor.update(held[:-32]) + decryptor.finalize()) + unpadder.finalize()
+    except ValueError:
+        raise InvalidToken
+    if plain:
+        yield plain
+
+def save_encrypted_stream(owner: str, filename: str, chunks):
+    """
+    Like save_encrypted_file, but encrypts and writes the chunks as they
+    come instead of holding the whole file and its token in memory.
+    """
     storage_name = f"{uuid.uuid4().hex}.enc"
+    ensure_dirs()
     path = os.path.join(STORAGE_DIR, storage_name)
-    with open(path, "wb") as f:
-        f.write(token)
+    try:
+        with metrics.timer("file_encrypt_seconds"), open(path, "wb") as f:
+            size = encrypt_stream(chunks, f.write)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    metrics.inc("file_encrypt_bytes_total", size)
     return storage_name
 
 def load_decrypted_file(storage_name: str):
@@ -37,5 +260,65 @@ def load_decrypted_file(storage_name: str):
     path = os.path.join(STORAGE_DIR, storage_name)
     if not os.path.exists(path):
         raise FileNotFoundError(storage_name)
-    token = open(path, "rb").read()
-    return fernet.decrypt(token)
+    with metrics.timer("file_decrypt_seconds"):
+        token = open(path, "rb").read()
+        data = fernet.decrypt(token)
+    metrics.inc("file_decrypt_bytes_total", len(data))
+    return data
+
+def add_file_records(user_id: int, files):
+    """
+    Records already-encrypted blobs for a user in one transaction.
+    files is an iterable of (filename, storage_name) or (filename,
+    storage_name, metadata) where metadata holds file_size, file_type and
+    content_hash; returns the new record ids. Storage counters move in the
+    same transaction.
+    """
+    from app.models import FileRecord
+    from app.storage_usage import apply_usage
+    from database.db import session_scope
+    with session_scope() as db:
+        now = datetime.utcnow()
+        records = [FileRecord(filename=f[0], user_id=user_id, storage_name=f[1], uploaded_at=now, **(f[2] if len(f) > 2 else {}))
+                   for f in files]
+        db.add_all(records)
+        db.flush()
+        apply_usage(db, [(user_id, r.file_type, r.file_size, +1) for r in records])
+        ids = [r.id for r in records]
+    return ids
+
+def add_user_file(user_id: int, filename: str, raw_bytes: bytes, metadata: dict = None):
+    """Encrypts raw_bytes into storage and records it for the user; returns the record id."""
+    metadata = metadata or describe_content(raw_bytes, filename)
+    storage_name = save_encrypted_file(str(user_id), filename, raw_bytes)
+    try:
+        return add_file_records(user_id, [(filename, storage_name, metadata)])[0]
+    except Exception:
+        # don't leave an unreferenced blob behind
+        os.remove(os.path.join(STORAGE_DIR, storage_name))
+        raise
+
+def delete_file_record(file_id: int, user_id: int = None):
+    """
+    Deletes a record (optionally only if user_id owns it) and its blob, and
+    takes it off the storage counters. Returns the deleted filename, or None
+    if there was no such record.
+    """
+    from app.models import FileRecord
+    from app.storage_usage import apply_usage
+    from database.db import session_scope
+    with session_scope() as db:
+        query = db.query(FileRecord).filter(FileRecord.id == file_id)
+        if user_id is not None:
+            query = query.filter(FileRecord.user_id == user_id)
+        rec = query.first()
+        if rec is None:
+            return None
+        filename, storage_name = rec.filename, rec.storage_name
+        apply_usage(db, [(rec.user_id, rec.file_type, rec.file_size, -1)])
+        db.delete(rec)
+    # the row is gone first so a failure here leaves an orphan blob, never a dangling record
+    path = os.path.join(STORAGE_DIR, storage_name)
+    if os.path.exists(path):
+        os.remove(path)
+    return filename
@@ -1,11 +1,15 @@
 import http.server
+import logging
 import socketserver
 import threading
 import socket
 import os
 import urllib.parse
 from app.file_manager import load_decrypted_file
-from app.models import SessionLocal, FileRecord
+from app.models import FileRecord
+from database.db import session_scope
+
+logger = logging.getLogger(__name__)
 
 class FileShareHandler(http.server.SimpleHTTPRequestHandler):
     def __init__(self, *args, file_data=None, filename=None, **kwargs):
@@ -25,14 +29,40 @@ class FileShareHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(b'File not found')
 
-def start_file_server(file_data, filename, port=0):
-    """Start a local HTTP server to share the file. Returns the server URL."""
+    def log_message(self, format, *args):
+        # one line per download on stderr drowns out the app's own output
+        logger.debug(f"{self.address_string()} {format % args}")
+
+_shares = {}
+_shares_lock = threading.Lock()
+
+def start_file_server(file_data, filename, port=0, host=""):
+    """
+    Start a local HTTP server to share the file on a background thread.
+    Returns the download URL; pass it to stop_sharing() to shut the server down.
+    """
     handler = lambda *args, **kwargs: FileShareHandler(*args, file_data=file_data, filename=filename, **kwargs)
-    with socketserver.TCPServer(("", port), handler) as httpd:
-        ip = get_local_ip()
-        url = f"http://{ip}:{httpd.server_address[1]}/download"
-        print(f"Sharing file at: {url}")
-        httpd.serve_forever()
+    httpd = socketserver.ThreadingTCPServer((host, port), handler)
+    httpd.daemon_threads = True
+    ip = host or get_local_ip()
+    url = f"http://{ip}:{httpd.server_address[1]}/download"
+    with _shares_lock:
+        _shares[url] = httpd
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    logger.info(f"Sharing file at: {url}")
+    return url
+
+def stop_sharing(url=None):
+    """Stop the share at url, or every share when url is None."""
+    with _shares_lock:
+        if url is None:
+            servers = list(_shares.values())
+            _shares.clear()
+        else:
+            servers = [_shares.pop(url)] if url in _shares else []
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
 
 def get_local_ip():
     """Get the local IP address."""
@@ -46,22 +76,21 @@ def get_local_ip():
         s.close()
     return ip
 
-def share_file(file_id, username):
-    """Share a file by starting a local server."""
-    db = SessionLocal()
+def share_file(file_id, user_id, host=""):
+    """
+    Share a file by starting a local server. Returns (message, error); the
+    message carries the download URL.
+    """
     try:
-        rec = db.query(FileRecord).filter(FileRecord.id == file_id, FileRecord.owner == username).first()
+        with session_scope() as db:
+            rec = db.query(FileRecord.filename, FileRecord.storage_name) \
+                .filter(FileRecord.id == file_id, FileRecord.user_id == user_id).first()
         if not rec:
             return None, "File not found"
         file_data = load_decrypted_file(rec.storage_name)
         if not file_data:
             return None, "Failed to load file"
-        # Start server in a separate thread
-        server_thread = threading.Thread(target=start_file_server, args=(file_data, rec.filename))
-        server_thread.daemon = True
-        server_thread.start()
-        return f"File '{rec.filename}' is being shared. Check console for URL.", None
+        url = start_file_server(file_data, rec.filename, host=host)
+        return f"File '{rec.filename}' is being shared at {url}", None
     except Exception as e:
         return None, str(e)
-    finally:
-        db.close()
@@ -0,0 +1,293 @@
+"""
+Outgoing mail. Callers add an OutboxEmail row inside their own transaction
+(enqueue_email) and the background MailSender delivers it later, so a slow
+or unreachable mail server never blocks the UI. The sender keeps one SMTP
+connection open across messages and retries failures with exponential
+backoff until MAX_ATTEMPTS. Each row is claimed (status "sending" with a
+lease) before it is sent, so several senders, e.g. the app and a CLI
+drain, never deliver the same message twice; a claim whose sender died is
+released when its lease runs out.
+
+Configuration: SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASS, SMTP_FROM and
+SMTP_STARTTLS (1/0). The sender only logs in when SMTP_USER and SMTP_PASS
+are both set.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+
+from sqlalchemy import or_
+
+from app.models import SessionLocal, OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.getenv("MAIL_OUTBOX_POLL_INTERVAL", 30))
+BATCH_SIZE = int(os.getenv("MAIL_OUTBOX_BATCH_SIZE", 50))
+MAX_ATTEMPTS = int(os.getenv("MAIL_OUTBOX_MAX_ATTEMPTS", 8))
+BACKOFF_BASE = float(os.getenv("MAIL_OUTBOX_BACKOFF", 30))
+BACKOFF_MAX = 6 * 3600
+# how long a claimed row is held before it counts as abandoned; well above SMTP_TIMEOUT
+LEASE_SECONDS = int(os.getenv("MAIL_OUTBOX_LEASE", 300))
+# an idle connection is closed before the server times it out
+IDLE_TIMEOUT = 60
+SMTP_TIMEOUT = 30
+
+
+def smtp_settings():
+    user = os.getenv("SMTP_USER") or None
+    return {
+        "host": os.getenv("SMTP_SERVER", "smtp.gmail.com"),
+        "port": int(os.getenv("SMTP_PORT", 587)),
+        "user": user,
+        "password": os.getenv("SMTP_PASS") or None,
+        "sender": os.getenv("SMTP_FROM") or user or "no-reply@localhost",
+        "starttls": os.getenv("SMTP_STARTTLS", "1") not in ("0", "false", "no"),
+    }
+
+
+def enqueue_email(db, recipient: str, subject: str, body: str) -> OutboxEmail:
+    """Adds a message to the outbox in db's transaction; it is sent after the caller commits."""
+    email = OutboxEmail(recipient=recipient, subject=subject, body=body, status="pending", attempts=0,
+                        next_attempt_at=datetime.utcnow(), created_at=datetime.utcnow())
+    db.add(email)
+    return email
+
+
+def backoff_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX))
+
+
+class MailSender:
+    """Delivers due outbox rows from a background thread over a reused SMTP connection."""
+
+    def __init__(self, session_factory=SessionLocal, settings: dict = None, poll_interval: float = POLL_INTERVAL,
+                 batch_size: int = BATCH_SIZE, max_attempts: int = MAX_ATTEMPTS):
+        self.session_factory = session_factory
+        self.settings = settings or smtp_settings()
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._smtp = None
+        self._last_used = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._run, name="mail-sender", daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        """Checks the outbox now instead of at the next poll."""
+        if self._thread is None:
+            self.start()
+        self._wake.set()
+
+    def close(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._disconnect()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                while self.send_due() == self.batch_size and not self._stop.is_set():
+                    pass
+            except Exception as e:
+                logger.error(f"Mail sender error: {e}")
+            if self._smtp is not None and time.monotonic() - self._last_used > IDLE_TIMEOUT:
+                self._disconnect()
+            self._wake.wait(min(self.poll_interval, IDLE_TIMEOUT))
+            self._wake.clear()
+
+    def send_due(self, now: datetime = None) -> int:
+        """Sends one batch of due messages; returns how many rows were attempted."""
+        now = now or datetime.utcnow()
+        db = self.session_factory()
+        try:
+            try:
+                # claims left behind by a sender that died mid-send go back to the queue
+                released = db.query(OutboxEmail) \
+                    .filter(OutboxEmail.status == "sending", OutboxEmail.lease_until < now) \
+                    .update({"status": "pending", "lease_until": None}, synchronize_session=False)
+                if released:
+                    logger.warning(f"Released {released} outbox emails whose lease expired")
+                ids = [row.id for row in db.query(OutboxEmail.id)
+                       .filter(OutboxEmail.status == "pending",
+                               or_(OutboxEmail.next_attempt_at.is_(None), OutboxEmail.next_attempt_at <= now))
+                       .order_by(OutboxEmail.next_attempt_at, OutboxEmail.id)
+                       .limit(self.batch_size)]
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Error reading mail outbox: {e}")
+                return 0
+            attempted = 0
+            for email_id in ids:
+                try:
+                    email = self._claim(db, email_id, now)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Error claiming email {email_id}: {e}")
+                    return attempted
+                if email is None:
+                    # another sender got there first
+                    continue
+                attempted += 1
+                reachable = self._deliver(email)
+                # record each outcome at once, so a later failure can't cause a resend
+                try:
+                    email.lease_until = None
+                    db.add(email)
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Error recording outcome of email {email.id}: {e}")
+                    return attempted
+                if not reachable:
+                    # server unreachable: leave the rest of the batch for the next round
+                    break
+            return attempted
+        finally:
+            db.close()
+
+    def _claim(self, db, email_id: int, now: datetime):
+        """Marks a pending row as being sent; returns it detached, or None if it was not pending."""
+        claimed = db.query(OutboxEmail) \
+            .filter(OutboxEmail.id == email_id, OutboxEmail.status == "pending") \
+            .update({"status": "sending", "lease_until": now + timedelta(seconds=LEASE_SECONDS)},
+                    synchronize_session=False)
+        db.commit()
+        if claimed != 1:
+            return None
+        email = db.get(OutboxEmail, email_id)
+        # detach the row and end the read so no transaction stays open during SMTP I/O
+        db.expunge(email)
+        db.commit()
+        return email
+
+    def drain(self, timeout: float = 60.0) -> int:
+        """
+        Sends due messages in the calling thread until none are left or
+        timeout passes, for short-lived processes that never start the
+        background thread. Failures stay queued with their backoff.
+        """
+        deadline = time.monotonic() + timeout
+        total = 0
+        while time.monotonic() < deadline:
+            attempted = self.send_due()
+            if not attempted:
+                break
+            total += attempted
+        self._disconnect()
+        return total
+
+    def _deliver(self, email) -> bool:
+        """Attempts one message; returns False if no connection to the server could be made."""
+        email.attempts = (email.attempts or 0) + 1
+        try:
+            self._connection()
+        except Exception as e:
+            self._failed(email, e)
+            return False
+        try:
+            self._send(email.recipient, email.subject, email.body)
+        except Exception as e:
+            # the connection may be half-broken; start fresh on the next message
+            self._disconnect()
+            self._failed(email, e)
+            return True
+        email.status = "sent"
+        email.sent_at = datetime.utcnow()
+        email.last_error = None
+        return True
+
+    def _failed(self, email, error):
+        email.last_error = str(error) or type(error).__name__
+        if email.attempts >= self.max_attempts:
+            email.status = "failed"
+            logger.error(f"Giving up on email {email.id} to {email.recipient} after {email.attempts} attempts: {error}")
+        else:
+            email.status = "pending"
+            email.next_attempt_at = datetime.utcnow() + backoff_delay(email.attempts)
+            logger.warning(f"Email {email.id} to {email.recipient} failed (attempt {email.attempts}), retrying: {error}")
+
+    def _send(self, recipient: str, subject: str, body: str):
+        import smtplib
+        msg = MIMEText(body)
+        msg['Subject'] = subject
+        msg['From'] = self.settings["sender"]
+        msg['To'] = recipient
+        smtp = self._connection()
+        try:
+            smtp.sendmail(self.settings["sender"], [recipient], msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            # server dropped an idle connection; one reconnect, then let the retry logic handle it
+            self._disconnect()
+            self._connection().sendmail(self.settings["sender"], [recipient], msg.as_string())
+        self._last_used = time.monotonic()
+
+    def _connection(self):
+        if self._smtp is None:
+            # imported here: app.auth pulls in this module and most processes never send mail
+            import smtplib
+            s = self.settings
+            smtp = smtplib.SMTP(s["host"], s["port"], timeout=SMTP_TIMEOUT)
+            try:
+                if s["starttls"]:
+                    smtp.starttls()
+                if s["user"] and s["password"]:
+                    smtp.login(s["user"], s["password"])
+            except Exception:
+                smtp.close()
+                raise
+            self._smtp = smtp
+        return self._smtp
+
+    def _disconnect(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except Exception:
+                smtp.close()
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_sender() -> MailSender:
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = MailSender()
+            atexit.register(_sender.close)
+        return _sender
+
+
+def start_mail_sender() -> MailSender:
+    sender = get_sender()
+    sender.start()
+    return sender
+
+
+def wake_mail_sender():
+    # nothing to wake until the app has started the sender
+    if _sender is not None:
+        _sender.wake()
+
+
+def shutdown_mail_sender():
+    if _sender is not None:
+        _sender.close()
@@ -1,56 +1,120 @@
 import sys
 import os
 import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 # ensure project root is on sys.path so imports like `from app...` work when run as a script
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if BASE_DIR not in sys.path:
     sys.path.insert(0, BASE_DIR)
 
-from PySide6.QtWidgets import QApplication, QMessageBox
-from app.models import init_db, SessionLocal, User
-from app.auth import register_user, authenticate_user, log_activity
-from app.ui import MainChoiceDialog, LoginDialog, Dashboard
+# PySide6, SQLAlchemy, bcrypt and cryptography are imported inside run_app and
+# initialize_backend: the choice dialog is shown first and the database stack
+# loads in the background while the user picks a login type.
+from app.startup_profile import StartupProfiler, NULL_PROFILER
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# ensure environment dirs exist
-os.makedirs(os.path.join(BASE_DIR, "data"), exist_ok=True)
-os.makedirs(os.path.join(BASE_DIR, "storage"), exist_ok=True)
-
 def ensure_default_admin():
-    db = SessionLocal()
-    try:
-        if db.query(User).count() == 0:
-            # create default admin/admin for first-run convenience
-            ok, msg, email_sent = register_user("admin", "admin1234", "admin@example.com", is_admin=True)
-            if ok:
-                print("Created default admin: admin / admin1234 (change this password)")
-            else:
-                print(f"Failed to create default admin: {msg}")
-    finally:
-        db.close()
-
-def run_app():
-    try:
+    from app.models import User
+    from app.auth import register_user
+    from database.db import session_scope
+    with session_scope() as db:
+        first_run = db.query(User).count() == 0
+    if first_run:
+        # create default admin/admin for first-run convenience
+        ok, msg, email_queued = register_user("admin", "admin1234", "admin@example.com", is_admin=True)
+        if ok:
+            print("Created default admin: admin / admin1234 (change this password)")
+        else:
+            print(f"Failed to create default admin: {msg}")
+
+def initialize_backend(profiler=NULL_PROFILER):
+    with profiler.phase("create data/storage dirs"):
+        # ensure environment dirs exist
+        os.makedirs(os.path.join(BASE_DIR, "data"), exist_ok=True)
+        os.makedirs(os.path.join(BASE_DIR, "storage"), exist_ok=True)
+    with profiler.phase("import models/auth (SQLAlchemy, bcrypt)"):
+        from app.models import init_db
+        import app.auth  # noqa: F401
+    with profiler.phase("init_db + migrations"):
         init_db()
+    with profiler.phase("ensure default admin"):
         ensure_default_admin()
-        app = QApplication(sys.argv)
+    with profiler.phase("start mail sender"):
+        from app.mailer import start_mail_sender
+        start_mail_sender()
+    with profiler.phase("import dashboard"):
+        # warm the import so opening the dashboard after sign-in does not stall
+        import app.ui  # noqa: F401
+
+def run_app(argv=None):
+    argv = list(sys.argv if argv is None else argv)
+    profiler = NULL_PROFILER
+    if "--profile-startup" in argv:
+        argv.remove("--profile-startup")
+        profiler = StartupProfiler()
+        profiler.install_import_hook()
+
+    QMessageBox = None
+    try:
+        with profiler.phase("import PySide6"):
+            from PySide6.QtWidgets import QApplication, QMessageBox
+            from PySide6.QtCore import Qt, QTimer
+        with profiler.phase("create QApplication"):
+            app = QApplication(argv)
 
         # load optional stylesheet for a more polished look
-        style_path = os.path.join(BASE_DIR, "app", "style.qss")
-        if os.path.exists(style_path):
-            try:
-                with open(style_path, "r", encoding="utf-8") as f:
-                    app.setStyleSheet(f.read())
-            except Exception as e:
-                logger.error(f"Failed to load stylesheet: {e}")
-
-        choice = MainChoiceDialog()
+        with profiler.phase("load stylesheet"):
+            style_path = os.path.join(BASE_DIR, "app", "style.qss")
+            if os.path.exists(style_path):
+                try:
+                    with open(style_path, "r", encoding="utf-8") as f:
+                        app.setStyleSheet(f.read())
+                except Exception as e:
+                    logger.error(f"Failed to load stylesheet: {e}")
+
+        with profiler.phase("build choice dialog"):
+            from app.dialogs import MainChoiceDialog, LoginDialog
+            choice = MainChoiceDialog()
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="startup")
+        backend = {}
+
+        def start_backend():
+            # runs from the event loop, i.e. once the choice dialog is on screen
+            profiler.mark("first dialog shown")
+            backend["future"] = executor.submit(initialize_backend, profiler)
+            if isinstance(profiler, StartupProfiler):
+                def report(_):
+                    profiler.uninstall_import_hook()
+                    print(profiler.report(), file=sys.stderr)
+                backend["future"].add_done_callback(report)
+
+        def wait_for_backend(parent):
+            future = backend.get("future")
+            if future is None:
+                start_backend()
+                future = backend["future"]
+            if not future.done():
+                QApplication.setOverrideCursor(Qt.WaitCursor)
+                try:
+                    future.exception()
+                finally:
+                    QApplication.restoreOverrideCursor()
+            if future.exception() is not None:
+                logger.critical(f"Startup failed: {future.exception()}")
+                QMessageBox.critical(parent, "Critical Error", f"Application failed to start: {future.exception()}")
+                return False
+            return True
 
         def attempt_login(login_dialog, is_admin_flag):
             try:
+                if not wait_for_backend(login_dialog):
+                    return
+                from app.auth import authenticate_user, log_activity
                 username = login_dialog.user_edit.text().strip()
                 pw = login_dialog.pw_edit.text().strip()
                 user = authenticate_user(username, pw)
@@ -81,16 +145,17 @@ def run_app():
                 if not username or not pw:
                     QMessageBox.warning(login_dialog, "Invalid", "enter username and password")
                     return
-                ok, msg, email_sent = register_user(username, pw, email, is_admin=is_admin_flag)
+                if not wait_for_backend(login_dialog):
+                    return
+                from app.auth import register_user, log_activity
+                ok, msg, email_queued = register_user(username, pw, email, is_admin=is_admin_flag)
                 if not ok:
                     QMessageBox.warning(login_dialog, "Error", msg)
                 else:
                     logger.info(f"New {'admin' if is_admin_flag else 'user'} {username} registered")
                     log_activity(None, "register", f"New {'admin' if is_admin_flag else 'user'} {username} registered")
-                    if email_sent is True:
-                        msg_text = f"{'Admin' if is_admin_flag else 'User'} created; verification email sent. You can now sign in"
-                    elif email_sent is False:
-                        msg_text = f"{'Admin' if is_admin_flag else 'User'} created; verification email could not be sent. You can now sign in"
+                    if email_queued:
+                        msg_text = f"{'Admin' if is_admin_flag else 'User'} created; a verification email is on its way. You can now sign in"
                     else:
                         msg_text = f"{'Admin' if is_admin_flag else 'User'} created. You can now sign in"
                     QMessageBox.information(login_dialog, "OK", msg_text)
@@ -98,6 +163,12 @@ def run_app():
                 logger.error(f"Error during registration: {e}")
                 QMessageBox.critical(login_dialog, "Error", "An error occurred during registration")
 
+        def open_dashboard(user):
+            from app.ui import Dashboard
+            win = Dashboard(user)
+            win.show()
+            app.exec()
+
         def on_user_login():
             login = LoginDialog(is_admin=False)
 
@@ -108,9 +179,7 @@ def run_app():
 
             result = login.exec()
             if hasattr(login, 'user'):
-                win = Dashboard(login.user)
-                win.show()
-                app.exec()
+                open_dashboard(login.user)
 
         def on_admin_login():
             login = LoginDialog(is_admin=True)
@@ -122,19 +191,23 @@ def run_app():
 
             result = login.exec()
             if hasattr(login, 'user'):
-                win = Dashboard(login.user)
-                win.show()
-                app.exec()
+                open_dashboard(login.user)
 
         choice.user_btn.clicked.connect(on_user_login)
         choice.admin_btn.clicked.connect(on_admin_login)
 
+        # defer database work until the dialog's event loop is running
+        QTimer.singleShot(0, start_backend)
         # show choice dialog modally
         result = choice.exec()
+        executor.shutdown(wait=True)
 
     except Exception as e:
         logger.critical(f"Application error: {e}")
-        QMessageBox.critical(None, "Critical Error", f"Application failed to start: {str(e)}")
+        if QMessageBox is not None:
+            QMessageBox.critical(None, "Critical Error", f"Application failed to start: {str(e)}")
 
 if __name__ == "__main__":
+    # bulk import hashes on a process pool; frozen Windows builds need this before anything else
+    multiprocessing.freeze_support()
     run_app()
@@ -0,0 +1,201 @@
+"""
+In-process counters and timers for the hot paths, exportable in the
+Prometheus text format.
+
+    from app import metrics
+    metrics.inc("file_encrypt_bytes_total", len(data))
+    with metrics.timer("file_encrypt_seconds"):
+        ...
+    print(metrics.render())
+
+file_manager (encrypt/decrypt), ai_processor (analysis), auth (login and
+registration) and the database (transactions, commits, statements) report here.
+Recording is a dict update under one lock, cheap enough to stay on in
+production. GET /admin/metrics on the API returns render().
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+PREFIX = "secure_ai_"
+# seconds; covers a fast SQL statement up to a bcrypt login on a slow machine
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "file_encrypt_bytes_total": "Plaintext bytes encrypted into storage",
+    "file_encrypt_seconds": "Time to encrypt and write one blob",
+    "file_decrypt_bytes_total": "Plaintext bytes decrypted from storage",
+    "file_decrypt_seconds": "Time to read and decrypt one blob",
+    "analysis_seconds": "Time to analyze one document",
+    "analysis_chars_total": "Characters of text analyzed",
+    "auth_login_seconds": "Time to check a login, bcrypt included",
+    "auth_logins_total": "Login attempts by result",
+    "auth_register_seconds": "Time to register a user, bcrypt included",
+    "activity_log_rows_total": "Activity log rows committed by the background writer",
+    "db_transactions_total": "ORM transactions begun",
+    "db_commits_total": "ORM transactions committed",
+    "db_rollbacks_total": "ORM transactions rolled back",
+    "db_statement_seconds": "Time to execute one SQL statement",
+}
+
+_lock = threading.Lock()
+_counters = {}
+_timers = {}
+
+
+def _key(name: str, labels: dict):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name: str, amount: float = 1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name: str, seconds: float, **labels):
+    key = _key(name, labels)
+    with _lock:
+        timer = _timers.get(key)
+        if timer is None:
+            # [count, sum, counts per bucket]; the +Inf bucket is the count
+            timer = _timers[key] = [0, 0.0, [0] * len(BUCKETS)]
+        timer[0] += 1
+        timer[1] += seconds
+        i = bisect.bisect_left(BUCKETS, seconds)
+        if i < len(BUCKETS):
+            timer[2][i] += 1
+
+
+@contextmanager
+def timer(name: str, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def timed(name: str, **labels):
+    """Decorator form of timer()."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def counter_value(name: str, **labels) -> float:
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def timer_stats(name: str, **labels):
+    """(count, total seconds) for one timer."""
+    with _lock:
+        timer = _timers.get(_key(name, labels))
+        return (timer[0], timer[1]) if timer else (0, 0.0)
+
+
+def snapshot() -> dict:
+    """Plain-data copy: {"counters": {(name, labels): value}, "timers": {(name, labels): (count, sum)}}."""
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "timers": {k: (t[0], t[1]) for k, t in _timers.items()},
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _timers.clear()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(pairs, extra=()):
+    pairs = tuple(pairs) + tuple(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render() -> str:
+    """The current values in the Prometheus text exposition format."""
+    with _lock:
+        counters = sorted(_counters.items())
+        timers = sorted((k, (t[0], t[1], list(t[2]))) for k, t in _timers.items())
+    lines = []
+    seen = set()
+    for (name, labels), value in counters:
+        full = PREFIX + name
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {full} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {full} counter")
+        lines.append(f"{full}{_labels(labels)} {value:g}")
+    for (name, labels), (count, total, buckets) in timers:
+        full = PREFIX + name
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {full} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {full} histogram")
+        cumulative = 0
+        for bound, n in zip(BUCKETS, buckets):
+            cumulative += n
+            lines.append(f"{full}_bucket{_labels(labels, [('le', f'{bound:g}')])} {cumulative}")
+        lines.append(f"{full}_bucket{_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{full}_sum{_labels(labels)} {total:.6f}")
+        lines.append(f"{full}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def write_snapshot(path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(render())
+
+
+def instrument_engine(engine):
+    """Times every statement run on engine (for an AsyncEngine, pass engine.sync_engine)."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["metrics_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("metrics_start", None)
+        if started is not None:
+            observe("db_statement_seconds", time.perf_counter() - started)
+
+
+def instrument_database(session_factory):
+    """
+    Counts transactions, commits and rollbacks made through session_factory and
+    times every statement on the engine it is bound to, including the ones
+    configure_database swaps in later.
+    """
+    from sqlalchemy import event
+    from database.db import on_engine
+
+    @event.listens_for(session_factory, "after_begin")
+    def _began(session, transaction, connection):
+        inc("db_transactions_total")
+
+    @event.listens_for(session_factory, "after_commit")
+    def _committed(session):
+        inc("db_commits_total")
+
+    @event.listens_for(session_factory, "after_rollback")
+    def _rolled_back(session):
+        inc("db_rollbacks_total")
+
+    on_engine(instrument_engine)
@@ -1,6 +1,7 @@
 import os
-from database.db import SessionLocal, engine, Base
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey
+from database.db import SessionLocal, Base, get_engine
+from app import metrics
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey, Index, func, literal_column
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -24,7 +25,23 @@ class FileRecord(Base):
     uploaded_at = Column(DateTime, default=datetime.utcnow)
     file_size = Column(Integer)
     file_type = Column(String)
+    # hex sha256 of the plaintext
+    content_hash = Column(String)
     user = relationship("User")
+    __table_args__ = (
+        # the dashboard lists a user's files newest first
+        Index("ix_file_records_user_id_uploaded_at", "user_id", "uploaded_at"),
+        Index("ix_file_records_user_id_filename", "user_id", "filename"),
+    )
+
+# File list sort keys. Keyset pagination compares (key, id) tuples, which are
+# NULL for rows missing a name or upload time, so NULLs get a definite place.
+# The defaults are SQL literals, not parameters, so the expression indexes
+# below match the queries.
+FILE_UPLOADED_KEY = func.coalesce(FileRecord.uploaded_at, literal_column("'1970-01-01 00:00:00.000000'"))
+FILE_NAME_KEY = func.coalesce(FileRecord.filename, literal_column("''"))
+Index("ix_file_records_user_id_uploaded_key", FileRecord.user_id, FILE_UPLOADED_KEY)
+Index("ix_file_records_user_id_name_key", FileRecord.user_id, FILE_NAME_KEY)
 
 class ActivityLog(Base):
     __tablename__ = "activity_logs"
@@ -34,6 +51,110 @@ class ActivityLog(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
     details = Column(Text)
     user = relationship("User")
+    __table_args__ = (
+        Index("ix_activity_logs_timestamp", "timestamp"),
+        Index("ix_activity_logs_user_id_timestamp", "user_id", "timestamp"),
+        # ids must never be reused after archiving deletes the newest rows: the rollup watermark relies on it
+        {"sqlite_autoincrement": True},
+    )
+
+class ThreatDetection(Base):
+    __tablename__ = "threat_detections"
+    id = Column(Integer, primary_key=True, index=True)
+    file_id = Column(Integer, ForeignKey("file_records.id"))
+    threat_type = Column(String)
+    confidence = Column(Float)
+    detected_at = Column(DateTime, default=datetime.utcnow)
+    status = Column(String)
+    __table_args__ = (Index("ix_threat_detections_status_detected_at", "status", "detected_at"),)
+
+class Notification(Base):
+    __tablename__ = "notifications"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    message = Column(Text)
+    is_read = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (Index("ix_notifications_user_id_is_read_created_at", "user_id", "is_read", "created_at"),)
+
+class AdminAction(Base):
+    __tablename__ = "admin_actions"
+    id = Column(Integer, primary_key=True, index=True)
+    admin_id = Column(Integer, ForeignKey("users.id"))
+    action = Column(String)
+    target_user_id = Column(Integer, ForeignKey("users.id"))
+    timestamp = Column(DateTime, default=datetime.utcnow)
+    details = Column(Text)
+
+class ActivityRollupHourly(Base):
+    # event counts per hour, user and action; user_id 0 stands for anonymous events
+    __tablename__ = "activity_rollups_hourly"
+    bucket = Column(DateTime, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    action = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    __table_args__ = (Index("ix_activity_rollups_hourly_user_id_bucket", "user_id", "bucket"),)
+
+class ActivityRollupDaily(Base):
+    __tablename__ = "activity_rollups_daily"
+    bucket = Column(DateTime, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    action = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    __table_args__ = (Index("ix_activity_rollups_daily_user_id_bucket", "user_id", "bucket"),)
+
+class RetentionState(Base):
+    # small key/value store for maintenance watermarks
+    __tablename__ = "retention_state"
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+class StorageUsageUser(Base):
+    # running totals over file_records with a known size; see app.storage_usage
+    __tablename__ = "storage_usage_users"
+    user_id = Column(Integer, primary_key=True)
+    file_count = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(Integer, nullable=False, default=0)
+
+class StorageUsageType(Base):
+    __tablename__ = "storage_usage_types"
+    file_type = Column(String, primary_key=True)
+    file_count = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(Integer, nullable=False, default=0)
+
+class OutboxEmail(Base):
+    # outgoing mail, written in the caller's transaction and delivered by app.mailer
+    __tablename__ = "outbox_emails"
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, sending, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    # while status is "sending": when the claiming sender's hold runs out and the row is retried
+    lease_until = Column(DateTime)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+    __table_args__ = (Index("ix_outbox_emails_status_next_attempt_at", "status", "next_attempt_at"),)
+
+class RowChange(Base):
+    # ids of users and threat_detections rows that were updated or deleted, appended by
+    # triggers (database/migrations.py) so readers re-check only those rows
+    __tablename__ = "row_changes"
+    seq = Column(Integer, primary_key=True)
+    table_name = Column(String, nullable=False)
+    row_id = Column(Integer, nullable=False)
+    __table_args__ = (
+        Index("ix_row_changes_table_name_seq", "table_name", "seq"),
+        # readers keep the last seq they saw, so it must never go backwards
+        {"sqlite_autoincrement": True},
+    )
+
+metrics.instrument_database(SessionLocal)
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    # creates missing tables, then brings existing databases up to the current version
+    from database.migrations import upgrade
+    upgrade(get_engine())
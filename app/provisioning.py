@@ -0,0 +1,194 @@
+"""
+Bulk user provisioning from CSV or JSON Lines.
+
+CSV files need a header row with username and password columns; email and
+is_admin are optional. JSONL files hold one object per line with the same
+keys. import_users checks uniqueness with a few IN queries instead of two
+lookups per user, hashes passwords on a process pool, and inserts every
+accepted row (plus its verification email) in a single transaction that
+checks uniqueness again first, since the hashing can take minutes. The
+result is one report entry per input row.
+"""
+import csv
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import bcrypt
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.models import User
+from app.auth import verification_email
+from app.mailer import enqueue_email, wake_mail_sender
+from database.db import session_scope
+
+logger = logging.getLogger(__name__)
+
+# keeps IN (...) lists well under SQLite's bound-parameter limit
+LOOKUP_CHUNK = 500
+# below this many passwords a process pool costs more than it saves
+POOL_THRESHOLD = 8
+# tries at the insert when a concurrent writer creates some of the same users
+WRITE_ATTEMPTS = 3
+
+TRUE_VALUES = {"1", "true", "yes", "y", "admin"}
+
+
+def _hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+
+def _as_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in TRUE_VALUES
+
+
+def read_user_rows(path: str):
+    """Yields (line_number, row dict) from a .csv or .jsonl/.ndjson file."""
+    if path.lower().endswith((".jsonl", ".ndjson")):
+        with open(path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    row = {"_error": f"invalid_json: {e}"}
+                yield number, row if isinstance(row, dict) else {"_error": "invalid_json: not an object"}
+    else:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                # header is line 1
+                yield reader.line_num, {k.strip().lower(): v for k, v in row.items() if k}
+
+
+def _existing(db, column, values):
+    found = set()
+    values = list(values)
+    for i in range(0, len(values), LOOKUP_CHUNK):
+        found.update(v for (v,) in db.query(column).filter(column.in_(values[i:i + LOOKUP_CHUNK])))
+    return found
+
+
+def _insert_free(db, hashed, send_verification: bool):
+    """
+    Inserts the (entry, user, password hash) rows whose username and email
+    are still free, in db's transaction; the rest get user_exists or
+    email_exists. Returns [(entry, user)] for the inserted rows.
+    """
+    taken_usernames = _existing(db, User.username, [user["username"] for _, user, _ in hashed])
+    taken_emails = _existing(db, User.email, [user["email"] for _, user, _ in hashed if user["email"]])
+    free = []
+    for entry, user, pw_hash in hashed:
+        if user["username"] in taken_usernames:
+            entry["error"] = "user_exists"
+        elif user["email"] and user["email"] in taken_emails:
+            entry["error"] = "email_exists"
+        else:
+            entry["error"] = None
+            free.append((entry, user, pw_hash))
+    if free:
+        now = datetime.utcnow()
+        db.execute(User.__table__.insert(), [
+            {"username": user["username"], "email": user["email"], "hashed_password": pw_hash,
+             "is_admin": user["is_admin"], "is_active": True, "created_at": now}
+            for _, user, pw_hash in free
+        ])
+        if send_verification:
+            for _, user, _ in free:
+                if user["email"]:
+                    enqueue_email(db, user["email"], *verification_email(user["username"]))
+    return [(entry, user) for entry, user, _ in free]
+
+
+def import_users(rows, workers: int = None, send_verification: bool = True):
+    """
+    rows is an iterable of (line_number, dict). Returns a list of
+    {"line", "username", "status": "created"|"error", "error"} in input order.
+    Either every accepted row is committed or, if the insert fails, none are.
+    """
+    report, accepted = [], []
+    seen_usernames, seen_emails = set(), set()
+    for number, row in rows:
+        username = str(row.get("username") or "").strip()
+        email = str(row.get("email") or "").strip() or None
+        password = str(row.get("password") or "")
+        entry = {"line": number, "username": username, "status": "error", "error": None}
+        report.append(entry)
+        if row.get("_error"):
+            entry["error"] = row["_error"]
+        elif not username:
+            entry["error"] = "missing_username"
+        elif not password:
+            entry["error"] = "missing_password"
+        elif username in seen_usernames:
+            entry["error"] = "duplicate_username_in_file"
+        elif email and email in seen_emails:
+            entry["error"] = "duplicate_email_in_file"
+        else:
+            seen_usernames.add(username)
+            if email:
+                seen_emails.add(email)
+            accepted.append((entry, {"username": username, "email": email, "password": password,
+                                     "is_admin": _as_bool(row.get("is_admin"))}))
+
+    # the session spans the uniqueness check and the write, each in its own transaction
+    with session_scope() as db:
+        taken_usernames = _existing(db, User.username, seen_usernames)
+        taken_emails = _existing(db, User.email, seen_emails)
+        pending = []
+        for entry, user in accepted:
+            if user["username"] in taken_usernames:
+                entry["error"] = "user_exists"
+            elif user["email"] and user["email"] in taken_emails:
+                entry["error"] = "email_exists"
+            else:
+                pending.append((entry, user))
+        # end the read transaction: a WAL snapshot held across the slow hashing
+        # could not be upgraded to a write if another writer commits meanwhile
+        db.rollback()
+
+        passwords = [user["password"] for _, user in pending]
+        if len(passwords) >= POOL_THRESHOLD:
+            # spawned, not forked: this runs on a QRunnable thread in the app, and forking a
+            # multi-threaded process can deadlock the child on locks held by other threads
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                hashes = list(pool.map(_hash_password, passwords, chunksize=4))
+        else:
+            hashes = [_hash_password(p) for p in passwords]
+
+        hashed = [(entry, user, pw_hash) for (entry, user), pw_hash in zip(pending, hashes)]
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                pending = _insert_free(db, hashed, send_verification)
+                db.commit()
+                break
+            except (IntegrityError, OperationalError) as e:
+                db.rollback()
+                if attempt < WRITE_ATTEMPTS:
+                    # another writer got in first (unique constraint or stale snapshot); check again
+                    logger.warning(f"User import attempt {attempt} lost a race, retrying: {e}")
+                    continue
+                failure = e
+            except Exception as e:
+                db.rollback()
+                failure = e
+            logger.error(f"Error importing {len(hashed)} users: {failure}")
+            for entry, _, _ in hashed:
+                entry["error"] = "registration_error"
+            return report
+
+    for entry, _ in pending:
+        entry["status"] = "created"
+    if send_verification and any(user["email"] for _, user in pending):
+        wake_mail_sender()
+    logger.info(f"Imported {len(pending)} of {len(report)} users")
+    return report
+
+
+def import_users_file(path: str, workers: int = None, send_verification: bool = True):
+    return import_users(read_user_rows(path), workers=workers, send_verification=send_verification)
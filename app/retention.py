@@ -0,0 +1,211 @@
+import argparse
+import gzip
+import json
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models import SessionLocal, ActivityLog, ActivityRollupHourly, ActivityRollupDaily, RetentionState
+from app.file_manager import DATA_DIR, get_or_create_fernet
+from database.db import session_scope
+
+logger = logging.getLogger(__name__)
+
+RETENTION_DAYS = int(os.getenv("ACTIVITY_LOG_RETENTION_DAYS", 90))
+ARCHIVE_DIR = os.getenv("ACTIVITY_LOG_ARCHIVE_DIR", os.path.join(DATA_DIR, "archive", "activity_logs"))
+ROLLUP_WATERMARK = "activity_rollup_last_id"
+ROLLUP_CHUNK = 50000
+
+_log = ActivityLog.__table__
+
+
+def _hour(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _day(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _upsert_counts(db, model, counts):
+    if not counts:
+        return
+    table = model.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["bucket", "user_id", "action"],
+        set_={"count": table.c.count + stmt.excluded["count"]},
+    )
+    db.execute(stmt, [
+        {"bucket": bucket, "user_id": user_id, "action": action, "count": n}
+        for (bucket, user_id, action), n in counts.items()
+    ])
+
+
+def update_rollups(db) -> int:
+    """
+    Folds activity_logs rows newer than the rollup watermark into the hourly
+    and daily rollup tables and advances the watermark. Runs inside the
+    caller's transaction; the caller commits.
+    """
+    state = db.get(RetentionState, ROLLUP_WATERMARK)
+    if state is None:
+        state = RetentionState(name=ROLLUP_WATERMARK, value=0)
+        db.add(state)
+    last_id = state.value
+    folded = 0
+    while True:
+        rows = db.execute(
+            select(_log.c.id, _log.c.timestamp, _log.c.user_id, _log.c.action)
+            .where(_log.c.id > last_id)
+            .order_by(_log.c.id)
+            .limit(ROLLUP_CHUNK)
+        ).all()
+        if not rows:
+            break
+        hourly, daily = Counter(), Counter()
+        for row in rows:
+            if row.timestamp is None:
+                continue
+            key = (row.user_id or 0, row.action or "")
+            hourly[(_hour(row.timestamp),) + key] += 1
+            daily[(_day(row.timestamp),) + key] += 1
+        _upsert_counts(db, ActivityRollupHourly, hourly)
+        _upsert_counts(db, ActivityRollupDaily, daily)
+        last_id = rows[-1].id
+        folded += len(rows)
+    state.value = last_id
+    db.flush()
+    return folded
+
+
+def activity_summary(start: datetime = None, end: datetime = None, granularity: str = "daily", user_id: int = None):
+    """Returns (bucket, user_id, action, count) rows from the rollup tables."""
+    model = ActivityRollupHourly if granularity == "hourly" else ActivityRollupDaily
+    try:
+        with session_scope() as db:
+            query = db.query(model.bucket, model.user_id, model.action, model.count)
+            if start is not None:
+                query = query.filter(model.bucket >= start)
+            if end is not None:
+                query = query.filter(model.bucket < end)
+            if user_id is not None:
+                query = query.filter(model.user_id == user_id)
+            return query.order_by(model.bucket).all()
+    except Exception as e:
+        logger.error(f"Error loading activity summary: {e}")
+        return []
+
+
+def _segment_path(archive_dir, day: datetime, first_id: int, last_id: int):
+    folder = os.path.join(archive_dir, day.strftime("%Y"), day.strftime("%m"))
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"activity-{day:%Y%m%d}-{first_id}-{last_id}.jsonl.gz.enc")
+
+
+def _write_segment(path, rows):
+    lines = "".join(
+        json.dumps({
+            "id": r.id,
+            "user_id": r.user_id,
+            "action": r.action,
+            "timestamp": r.timestamp.isoformat(),
+            "details": r.details,
+        }) + "\n"
+        for r in rows
+    )
+    token = get_or_create_fernet().encrypt(gzip.compress(lines.encode("utf-8")))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(token)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_archive_segment(path):
+    """Yields the archived log rows of one segment as dicts."""
+    with open(path, "rb") as f:
+        data = gzip.decompress(get_or_create_fernet().decrypt(f.read()))
+    for line in data.decode("utf-8").splitlines():
+        row = json.loads(line)
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+        yield row
+
+
+def list_archive_segments(archive_dir: str = ARCHIVE_DIR):
+    segments = []
+    for root, _, files in os.walk(archive_dir):
+        segments.extend(os.path.join(root, f) for f in files if f.endswith(".jsonl.gz.enc"))
+    return sorted(segments)
+
+
+def archive_old_logs(max_age_days: int = RETENTION_DAYS, archive_dir: str = ARCHIVE_DIR,
+                     session_factory=SessionLocal, batch_size: int = 5000, now: datetime = None) -> int:
+    """
+    Moves activity_logs rows older than max_age_days into compressed,
+    encrypted per-day segment files, batch by batch. Segments are written
+    before the rows are deleted, so an interrupted run never loses rows.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=max_age_days)
+    archived = 0
+    while True:
+        db = session_factory()
+        written = []
+        try:
+            try:
+                # rows must be counted in the rollups before they leave the table
+                update_rollups(db)
+                rows = db.execute(
+                    select(_log)
+                    .where(_log.c.timestamp < cutoff)
+                    .order_by(_log.c.timestamp, _log.c.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    db.commit()
+                    break
+                by_day = {}
+                for row in rows:
+                    by_day.setdefault(_day(row.timestamp), []).append(row)
+                for day, day_rows in by_day.items():
+                    path = _segment_path(archive_dir, day, day_rows[0].id, day_rows[-1].id)
+                    _write_segment(path, day_rows)
+                    written.append(path)
+                ids = [row.id for row in rows]
+                for i in range(0, len(ids), 500):
+                    db.execute(delete(_log).where(_log.c.id.in_(ids[i:i + 500])))
+                db.commit()
+                archived += len(rows)
+            except Exception as e:
+                db.rollback()
+                for path in written:
+                    if os.path.exists(path):
+                        os.remove(path)
+                logger.error(f"Error archiving activity logs: {e}")
+                raise
+        finally:
+            db.close()
+    if archived:
+        logger.info(f"Archived {archived} activity log rows older than {cutoff:%Y-%m-%d}")
+    return archived
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive old activity logs and refresh rollups")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS, help="keep this many days of raw logs")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    args = parser.parse_args(argv)
+    from app.models import init_db
+    init_db()
+    count = archive_old_logs(args.days, args.archive_dir)
+    print(f"Archived {count} rows to {args.archive_dir}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,329 @@
+"""
+Storage scrubber: checks that storage/ and file_records agree and that every
+blob is still intact.
+
+    python -m app.scrubber                      # report only, resumes an interrupted run
+    python -m app.scrubber --orphans quarantine --rate-mb 50
+
+Two phases, each checkpointed after every batch so a nightly run over
+millions of blobs can stop and resume:
+
+1. blobs: storage/ is listed once with os.scandir and walked in name
+   order a batch at a time, starting after the checkpoint cursor. Each batch is joined
+   against file_records with IN queries. Blobs without a record older than
+   the grace period are orphans. Blobs with a record have their Fernet
+   HMAC checked on a thread pool under a shared bytes/s limit; the HMAC
+   covers the whole token, so no AES decryption is needed.
+2. records: file_records is walked by id and every storage_name is
+   stat'ed to find records whose blob is gone.
+
+Findings are appended to a JSON Lines report; the summary is returned and
+printed.
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app import file_manager
+from app.models import SessionLocal, FileRecord
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+LOOKUP_CHUNK = 500
+READ_CHUNK = 1024 * 1024  # multiple of 4 so each piece base64-decodes on its own
+GRACE_HOURS = 24
+ORPHAN_ACTIONS = ("report", "quarantine", "delete")
+HMAC_SIZE = 32
+# version byte, timestamp, IV
+HEADER_SIZE = 1 + 8 + 16
+
+
+class RateLimiter:
+    """Token bucket shared by the verifier threads; rate is bytes per second."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._allowance = rate
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: int):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+                self._last = now
+                if self._allowance >= min(n, self.rate):
+                    self._allowance -= n
+                    return
+                wait = (min(n, self.rate) - self._allowance) / self.rate
+            time.sleep(wait)
+
+
+def signing_key(fernet_path: str = None) -> bytes:
+    """The HMAC half of the Fernet key (the first 16 bytes)."""
+    with open(fernet_path or file_manager.FERNET_PATH, "rb") as f:
+        return base64.urlsafe_b64decode(f.read().strip())[:16]
+
+
+def verify_blob(path: str, key: bytes, limiter: RateLimiter = None, chunk_size: int = READ_CHUNK):
+    """
+    Checks a stored Fernet token's version byte, layout and HMAC-SHA256 tag
+    while streaming the file. Returns (bytes read, None) if intact or
+    (bytes read, reason) if not.
+    """
+    mac = hmac.new(key, digestmod=hashlib.sha256)
+    tail = b""
+    decoded = 0
+    read = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            read += len(chunk)
+            if limiter is not None:
+                limiter.acquire(len(chunk))
+            try:
+                data = base64.urlsafe_b64decode(chunk.strip())
+            except ValueError:
+                return read, "not base64"
+            if decoded == 0 and data[:1] != b"\x80":
+                return read, "bad version byte"
+            decoded += len(data)
+            # hold back the last 32 bytes: they are the tag, not signed data
+            data = tail + data
+            mac.update(data[:-HMAC_SIZE])
+            tail = data[-HMAC_SIZE:]
+    if decoded < HEADER_SIZE + 16 + HMAC_SIZE or (decoded - HEADER_SIZE - HMAC_SIZE) % 16:
+        return read, "truncated token"
+    if not hmac.compare_digest(mac.digest(), tail):
+        return read, "HMAC mismatch"
+    return read, None
+
+
+def blob_batches(storage_dir: str, after: str, batch_size: int):
+    """
+    Yields the *.enc names greater than after in name order, batch_size at
+    a time. storage/ is listed once and the names sorted, rather than
+    scanned again for every batch.
+    """
+    with os.scandir(storage_dir) as entries:
+        names = sorted(entry.name for entry in entries
+                       if entry.name > after and entry.name.endswith(".enc") and entry.is_file(follow_symlinks=False))
+    for i in range(0, len(names), batch_size):
+        yield names[i:i + batch_size]
+
+
+class Scrubber:
+    def __init__(self, storage_dir: str = None, state_path: str = None, report_path: str = None,
+                 workers: int = 4, rate: float = None, batch_size: int = BATCH_SIZE, grace_hours: float = GRACE_HOURS,
+                 orphans: str = "report", quarantine_dir: str = None, session_factory=SessionLocal):
+        if orphans not in ORPHAN_ACTIONS:
+            raise ValueError(f"orphans must be one of {ORPHAN_ACTIONS}")
+        self.storage_dir = storage_dir or file_manager.STORAGE_DIR
+        self.state_path = state_path or os.path.join(file_manager.DATA_DIR, "scrub_state.json")
+        self.report_path = report_path or os.path.join(file_manager.DATA_DIR, "scrub_report.jsonl")
+        self.quarantine_dir = quarantine_dir or os.path.join(file_manager.DATA_DIR, "quarantine")
+        self.workers = workers
+        self.limiter = RateLimiter(rate) if rate else None
+        self.batch_size = batch_size
+        self.grace_seconds = grace_hours * 3600
+        self.orphans = orphans
+        self.session_factory = session_factory
+
+    def run(self, restart: bool = False) -> dict:
+        state = None if restart else self._load_state()
+        if state is None or state["phase"] == "done":
+            state = {"phase": "blobs", "cursor": "", "started_at": datetime.utcnow().isoformat(),
+                     "stats": dict.fromkeys(("blobs", "bytes_read", "corrupt", "orphans", "orphans_reclaimed",
+                                             "records", "missing_blobs"), 0)}
+            if os.path.exists(self.report_path):
+                os.remove(self.report_path)
+        key = signing_key()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scrubber") as pool:
+            if state["phase"] == "blobs":
+                os.makedirs(self.storage_dir, exist_ok=True)
+                for names in blob_batches(self.storage_dir, state["cursor"], self.batch_size):
+                    self._check_blobs(names, key, pool, state["stats"])
+                    state["cursor"] = names[-1]
+                    self._save_state(state)
+                state.update(phase="records", cursor=0)
+                self._save_state(state)
+            if state["phase"] == "records":
+                while True:
+                    rows = self._records_after(state["cursor"])
+                    if not rows:
+                        break
+                    self._check_records(rows, pool, state["stats"])
+                    state["cursor"] = rows[-1].id
+                    self._save_state(state)
+                state.update(phase="done", finished_at=datetime.utcnow().isoformat())
+                self._save_state(state)
+        stats = state["stats"]
+        elapsed = time.perf_counter() - start
+        logger.info(f"Scrub finished: {stats} in {elapsed:.1f}s "
+                    f"({stats['bytes_read'] / 1e6 / elapsed if elapsed else 0:.1f} MB/s this session)")
+        return stats
+
+    def _records_by_name(self, names):
+        found = {}
+        db = self.session_factory()
+        try:
+            for i in range(0, len(names), LOOKUP_CHUNK):
+                rows = db.query(FileRecord.storage_name, FileRecord.id, FileRecord.user_id) \
+                    .filter(FileRecord.storage_name.in_(names[i:i + LOOKUP_CHUNK])).all()
+                found.update((r.storage_name, r) for r in rows)
+        finally:
+            db.close()
+        return found
+
+    def _records_after(self, last_id: int):
+        db = self.session_factory()
+        try:
+            return db.query(FileRecord.id, FileRecord.user_id, FileRecord.storage_name) \
+                .filter(FileRecord.id > last_id).order_by(FileRecord.id).limit(self.batch_size).all()
+        finally:
+            db.close()
+
+    def _check_blobs(self, names, key, pool, stats):
+        records = self._records_by_name(names)
+        now = time.time()
+        findings = []
+        orphans = []
+        for name in names:
+            if name in records:
+                continue
+            try:
+                age = now - os.stat(os.path.join(self.storage_dir, name)).st_mtime
+            except FileNotFoundError:
+                continue
+            # a blob is written before its record is committed; give uploads time to finish
+            if age >= self.grace_seconds:
+                orphans.append(name)
+        if orphans:
+            # re-check right before acting in case a record appeared meanwhile
+            still_orphaned = set(orphans) - set(self._records_by_name(orphans))
+            for name in orphans:
+                if name in still_orphaned:
+                    findings.append({"kind": "orphan", "storage_name": name, "action": self._reclaim(name)})
+                    stats["orphans"] += 1
+                    if self.orphans != "report":
+                        stats["orphans_reclaimed"] += 1
+
+        referenced = [name for name in names if name in records]
+        results = pool.map(lambda name: self._verify(os.path.join(self.storage_dir, name), key), referenced)
+        for name, (read, problem) in zip(referenced, results):
+            stats["blobs"] += 1
+            stats["bytes_read"] += read
+            if problem:
+                stats["corrupt"] += 1
+                rec = records[name]
+                findings.append({"kind": "corrupt", "storage_name": name, "file_id": rec.id,
+                                 "user_id": rec.user_id, "detail": problem})
+        self._report(findings)
+
+    def _verify(self, path, key):
+        try:
+            return verify_blob(path, key, self.limiter)
+        except FileNotFoundError:
+            # deleted since the listing; the record pass will notice if its row is still there
+            return 0, None
+        except OSError as e:
+            return 0, f"read error: {e}"
+
+    def _reclaim(self, name):
+        path = os.path.join(self.storage_dir, name)
+        try:
+            if self.orphans == "delete":
+                os.remove(path)
+                return "deleted"
+            if self.orphans == "quarantine":
+                folder = os.path.join(self.quarantine_dir, datetime.utcnow().strftime("%Y%m%d"))
+                os.makedirs(folder, exist_ok=True)
+                shutil.move(path, os.path.join(folder, name))
+                return "quarantined"
+        except OSError as e:
+            logger.error(f"Could not reclaim orphan blob {name}: {e}")
+            return f"failed: {e}"
+        return "reported"
+
+    def _blob_present(self, row):
+        # a NULL or empty name would join to the storage directory itself, which exists
+        return bool(row.storage_name) and os.path.isfile(os.path.join(self.storage_dir, row.storage_name))
+
+    def _check_records(self, rows, pool, stats):
+        exists = pool.map(self._blob_present, rows)
+        findings = []
+        for row, present in zip(rows, exists):
+            stats["records"] += 1
+            if not present:
+                stats["missing_blobs"] += 1
+                finding = {"kind": "missing_blob", "storage_name": row.storage_name, "file_id": row.id,
+                           "user_id": row.user_id}
+                if not row.storage_name:
+                    finding["detail"] = "record has no storage_name"
+                findings.append(finding)
+        self._report(findings)
+
+    def _report(self, findings):
+        if not findings:
+            return
+        os.makedirs(os.path.dirname(self.report_path), exist_ok=True)
+        with open(self.report_path, "a", encoding="utf-8") as f:
+            for finding in findings:
+                f.write(json.dumps(finding) + "\n")
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save_state(self, state):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        # atomic, so an interrupted run never leaves a half-written checkpoint
+        os.replace(tmp, self.state_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify stored blobs and reconcile storage/ with file_records")
+    parser.add_argument("--orphans", choices=ORPHAN_ACTIONS, default="report",
+                        help="what to do with blobs that have no record")
+    parser.add_argument("--grace-hours", type=float, default=GRACE_HOURS, help="ignore orphans younger than this")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate-mb", type=float, help="limit verification reads to this many MB/s")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--report", help="JSONL findings file (default: data/scrub_report.jsonl)")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    args = parser.parse_args(argv)
+    from app.models import init_db
+    init_db()
+    scrubber = Scrubber(report_path=args.report, workers=args.workers,
+                        rate=args.rate_mb * 1024 * 1024 if args.rate_mb else None,
+                        batch_size=args.batch_size, grace_hours=args.grace_hours, orphans=args.orphans)
+    stats = scrubber.run(restart=args.restart)
+    print(", ".join(f"{k} {v}" for k, v in stats.items()))
+    print(f"Findings: {scrubber.report_path}")
+    return 1 if stats["corrupt"] or stats["missing_blobs"] or stats["orphans"] else 0
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import builtins
+import importlib.util
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    """
+    Collects wall-clock time per named startup phase and per imported module
+    (cumulative and self time, like `python -X importtime`). Enabled by
+    `python app/main.py --profile-startup`.
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.phases = []
+        self.imports = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._original_import = None
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.phases.append((name, start - self.t0, end - start, threading.current_thread().name))
+
+    def mark(self, name: str):
+        now = time.perf_counter()
+        with self._lock:
+            self.phases.append((name, now - self.t0, 0.0, threading.current_thread().name))
+
+    def install_import_hook(self):
+        if self._original_import is not None:
+            return
+        self._original_import = original = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            try:
+                full = importlib.util.resolve_name("." * level + name, (globals or {}).get("__package__")) if level else name
+            except (ImportError, ValueError):
+                full = name
+            if full in sys.modules:
+                return original(name, globals, locals, fromlist, level)
+            stack = getattr(self._local, "stack", None)
+            if stack is None:
+                stack = self._local.stack = []
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self._lock:
+                    cumulative, own = self.imports.get(full, (0.0, 0.0))
+                    self.imports[full] = (cumulative + elapsed, own + elapsed - children)
+
+        builtins.__import__ = timed_import
+
+    def uninstall_import_hook(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def report(self, top: int = 25) -> str:
+        lines = ["Startup phases (start offset, duration):"]
+        for name, offset, duration, thread in sorted(self.phases, key=lambda p: p[1]):
+            where = "" if thread == "MainThread" else f"  [{thread}]"
+            lines.append(f"  {offset * 1000:9.1f} ms  {duration * 1000:9.1f} ms  {name}{where}")
+        if self.imports:
+            lines.append(f"Slowest imports (top {top} by cumulative time):")
+            lines.append(f"  {'cumulative':>12}  {'self':>10}  module")
+            ranked = sorted(self.imports.items(), key=lambda kv: kv[1][0], reverse=True)[:top]
+            for module, (cumulative, own) in ranked:
+                lines.append(f"  {cumulative * 1000:9.1f} ms  {own * 1000:7.1f} ms  {module}")
+        return "\n".join(lines)
+
+
+class _NullProfiler:
+    @contextmanager
+    def phase(self, name: str):
+        yield
+
+    def mark(self, name: str):
+        pass
+
+
+NULL_PROFILER = _NullProfiler()
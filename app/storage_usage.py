@@ -0,0 +1,189 @@
+"""
+Per-user and per-type storage counters.
+
+storage_usage_users and storage_usage_types hold running file counts and
+byte totals over every file_records row whose file_size is known. Writers
+adjust them in the same transaction as the insert or delete (see
+file_manager.add_file_records and delete_file_record), so usage_report reads
+one row per user and per type instead of scanning file_records.
+
+Records uploaded before sizes were recorded are picked up by
+
+    python -m app.storage_usage backfill
+
+which decrypts each such blob once, fills in size, type and hash, and adds
+it to the counters.
+"""
+import argparse
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models import SessionLocal, User, FileRecord, StorageUsageUser, StorageUsageType
+from app import file_manager
+from database.db import session_scope
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_TYPE = "application/octet-stream"
+BACKFILL_BATCH = 200
+
+
+def usage_statements(changes):
+    """
+    changes is an iterable of (user_id, file_type, file_size, sign) with sign
+    +1 for an added record and -1 for a removed one. Returns the upserts that
+    apply them, for the caller to execute in its own transaction (sync or async).
+    """
+    users = defaultdict(lambda: [0, 0])
+    types = defaultdict(lambda: [0, 0])
+    for user_id, file_type, file_size, sign in changes:
+        if file_size is None:
+            # not counted until the backfill has measured it
+            continue
+        for bucket in (users[user_id or 0], types[file_type or UNKNOWN_TYPE]):
+            bucket[0] += sign
+            bucket[1] += sign * file_size
+    statements = []
+    for model, key, totals in ((StorageUsageUser, "user_id", users), (StorageUsageType, "file_type", types)):
+        if not totals:
+            continue
+        table = model.__table__
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[key],
+            set_={"file_count": table.c.file_count + stmt.excluded.file_count,
+                  "total_bytes": table.c.total_bytes + stmt.excluded.total_bytes},
+        )
+        statements.append((stmt, [{key: k, "file_count": n, "total_bytes": b} for k, (n, b) in totals.items()]))
+    return statements
+
+
+def apply_usage(db, changes):
+    for stmt, params in usage_statements(changes):
+        db.execute(stmt, params)
+
+
+def rebuild_usage(conn):
+    """Recomputes both counter tables from file_records (a full scan; used by the migration)."""
+    conn.execute(StorageUsageUser.__table__.delete())
+    conn.execute(StorageUsageType.__table__.delete())
+    known = FileRecord.file_size.is_not(None)
+    conn.execute(StorageUsageUser.__table__.insert().from_select(
+        ["user_id", "file_count", "total_bytes"],
+        select(func.coalesce(FileRecord.user_id, 0), func.count(), func.sum(FileRecord.file_size))
+        .where(known).group_by(func.coalesce(FileRecord.user_id, 0))))
+    conn.execute(StorageUsageType.__table__.insert().from_select(
+        ["file_type", "file_count", "total_bytes"],
+        select(func.coalesce(FileRecord.file_type, UNKNOWN_TYPE), func.count(), func.sum(FileRecord.file_size))
+        .where(known).group_by(func.coalesce(FileRecord.file_type, UNKNOWN_TYPE))))
+
+
+def usage_report():
+    """Returns {"users": [...], "types": [...]} straight from the counter tables."""
+    with session_scope() as db:
+        users = db.query(StorageUsageUser.user_id, User.username, StorageUsageUser.file_count, StorageUsageUser.total_bytes) \
+            .outerjoin(User, User.id == StorageUsageUser.user_id) \
+            .order_by(StorageUsageUser.total_bytes.desc()).all()
+        types = db.query(StorageUsageType.file_type, StorageUsageType.file_count, StorageUsageType.total_bytes) \
+            .order_by(StorageUsageType.total_bytes.desc()).all()
+        return {
+            "users": [dict(r._mapping) for r in users if r.file_count],
+            "types": [dict(r._mapping) for r in types if r.file_count],
+        }
+
+
+def _measure(row):
+    try:
+        data = file_manager.load_decrypted_file(row.storage_name)
+    except FileNotFoundError:
+        return row, None, "missing"
+    except Exception as e:
+        return row, None, str(e) or type(e).__name__
+    return row, file_manager.describe_content(data, row.filename), None
+
+
+def backfill_file_metadata(batch_size: int = BACKFILL_BATCH, workers: int = 4, session_factory=SessionLocal):
+    """
+    Fills file_size, file_type and content_hash for records missing any of
+    them, a batch at a time, and folds the newly measured sizes into the
+    counters. Returns {"updated", "missing", "failed"}.
+    """
+    stats = {"updated": 0, "missing": 0, "failed": 0}
+    incomplete = (FileRecord.file_size.is_(None)) | (FileRecord.file_type.is_(None)) | (FileRecord.content_hash.is_(None))
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            db = session_factory()
+            try:
+                rows = db.query(FileRecord.id, FileRecord.user_id, FileRecord.filename, FileRecord.storage_name,
+                                FileRecord.file_size, FileRecord.file_type) \
+                    .filter(FileRecord.id > last_id, incomplete) \
+                    .order_by(FileRecord.id).limit(batch_size).all()
+            finally:
+                db.close()
+            if not rows:
+                return stats
+            last_id = rows[-1].id
+            # decrypt outside any transaction; only the short update below holds the write lock
+            measured = list(pool.map(_measure, rows))
+            db = session_factory()
+            try:
+                try:
+                    changes = []
+                    for row, meta, error in measured:
+                        if error is not None:
+                            stats["missing" if error == "missing" else "failed"] += 1
+                            if error != "missing":
+                                logger.warning(f"Could not measure file {row.id}: {error}")
+                            continue
+                        # only if the row is unchanged since it was read (e.g. not deleted meanwhile)
+                        result = db.execute(
+                            update(FileRecord)
+                            .where(FileRecord.id == row.id,
+                                   FileRecord.file_size.is_not_distinct_from(row.file_size),
+                                   FileRecord.file_type.is_not_distinct_from(row.file_type))
+                            .values(**meta)
+                        )
+                        if result.rowcount:
+                            changes.append((row.user_id, row.file_type, row.file_size, -1))
+                            changes.append((row.user_id, meta["file_type"], meta["file_size"], +1))
+                            stats["updated"] += 1
+                    apply_usage(db, changes)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+            finally:
+                db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="File metadata backfill and storage usage report")
+    sub = parser.add_subparsers(dest="command", required=True)
+    backfill = sub.add_parser("backfill", help="measure records uploaded without size/type/hash")
+    backfill.add_argument("--batch-size", type=int, default=BACKFILL_BATCH)
+    backfill.add_argument("--workers", type=int, default=4)
+    sub.add_parser("report", help="print per-user and per-type usage")
+    args = parser.parse_args(argv)
+    from app.models import init_db
+    init_db()
+    if args.command == "backfill":
+        stats = backfill_file_metadata(args.batch_size, args.workers)
+        print(f"Updated {stats['updated']} records ({stats['missing']} blobs missing, {stats['failed']} failed)")
+        return
+    report = usage_report()
+    print("Per user:")
+    for r in report["users"]:
+        print(f"  {r['username'] or r['user_id']:<24} {r['file_count']:>8} files {r['total_bytes']:>16,} bytes")
+    print("Per type:")
+    for r in report["types"]:
+        print(f"  {r['file_type']:<40} {r['file_count']:>8} files {r['total_bytes']:>16,} bytes")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
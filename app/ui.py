@@ -1,117 +1,50 @@
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QLineEdit, QTextEdit, QFileDialog,
-    QListWidget, QCheckBox, QMessageBox, QDialog, QFormLayout, QProgressBar, QProgressBar
+    QListWidget, QListView, QComboBox, QCheckBox, QMessageBox, QDialog, QFormLayout, QProgressBar
 )
-from PySide6.QtCore import Qt, QPropertyAnimation
+from PySide6.QtCore import Qt, QPropertyAnimation, QTimer, QSize, QObject, Signal, QRunnable, QThreadPool
 from PySide6.QtGui import QIcon
 from app.auth import authenticate_user, register_user, list_users, log_activity
-from app.models import SessionLocal, FileRecord
-from app.file_manager import save_encrypted_file, load_decrypted_file
-from app.ai_processor import summarize_text, extract_keywords, analyze_sentiment
+from app.activity_log import flush_activity_log
+from app.events import bus, start_change_watcher, stop_change_watcher
+from app.models import FileRecord
+from app.file_manager import add_user_file, load_decrypted_file, read_file, delete_file_record
+from app.ai_processor import analyze_document
 from app.file_sharing import share_file
+from app.provisioning import import_users_file
+from app.dialogs import MainChoiceDialog, LoginDialog
+from app.ui_models import (
+    ASSETS_DIR, FileListModel, FileIdRole, ActivityFeedModel, UserListModel, ThreatListModel, ICON_SIZE
+)
+from database.db import session_scope
 import os
 
-ASSETS_DIR = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), "src", "assets")
-
-class MainChoiceDialog(QDialog):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setWindowTitle("Secure AI App - Choose Login Type")
-        self.setMinimumWidth(300)
-        self.setMinimumHeight(200)
-        layout = QVBoxLayout()
-
-        title = QLabel("Choose Login Type")
-        title.setObjectName("title_label")
-        title.setAlignment(Qt.AlignCenter)
-        layout.addWidget(title)
-
-        btn_layout = QVBoxLayout()
-        self.user_btn = QPushButton("User Login")
-        self.user_btn.setObjectName("user_login_btn")
-        self.admin_btn = QPushButton("Admin Login")
-        self.admin_btn.setObjectName("admin_login_btn")
-        btn_layout.addWidget(self.user_btn)
-        btn_layout.addWidget(self.admin_btn)
-        layout.addLayout(btn_layout)
-
-        self.setLayout(layout)
-
-class LoginDialog(QDialog):
-    def __init__(self, parent=None, is_admin=False):
-        super().__init__(parent)
-        self.is_admin = is_admin
-        title_text = "Secure AI App - Admin Sign In" if is_admin else "Secure AI App - User Sign In"
-        self.setWindowTitle(title_text)
-        self.setMinimumWidth(450)
-        self.setMinimumHeight(300)
-        layout = QVBoxLayout()
-
-        # Logo or title
-        title = QLabel(title_text)
-        title.setObjectName("title_label")
-        title.setAlignment(Qt.AlignCenter)
-        layout.addWidget(title)
-
-        form = QFormLayout()
-        self.user_edit = QLineEdit()
-        self.user_edit.setPlaceholderText("Enter username")
-        self.email_edit = QLineEdit()
-        self.email_edit.setPlaceholderText("Enter email")
-        self.pw_edit = QLineEdit()
-        self.pw_edit.setEchoMode(QLineEdit.Password)
-        self.pw_edit.setPlaceholderText("Enter password")
-        self.show_pw_check = QCheckBox("Show Password")
-        # Create a horizontal layout for password field and checkbox
-        pw_layout = QHBoxLayout()
-        pw_layout.addWidget(self.pw_edit)
-        pw_layout.addWidget(self.show_pw_check)
-        form.addRow("Username:", self.user_edit)
-        form.addRow("Email:", self.email_edit)
-        form.addRow("Password:", pw_layout)
-        layout.addLayout(form)
-
-        self.show_pw_check.stateChanged.connect(self.toggle_password_visibility)
-
-        # Remember me and forgot password
-        options_layout = QHBoxLayout()
-        self.remember_check = QCheckBox("Remember Me")
-        self.forgot_btn = QPushButton("Forgot Password?")
-        self.forgot_btn.setStyleSheet("border: none; color: blue; text-decoration: underline;")
-        options_layout.addWidget(self.remember_check)
-
-        options_layout.addStretch()
-        options_layout.addWidget(self.forgot_btn)
-        layout.addLayout(options_layout)
-
-        btn_layout = QHBoxLayout()
-        self.back_btn = QPushButton("Back")
-        self.back_btn.setObjectName("back_btn")
-        self.login_btn = QPushButton("Sign In")
-        self.login_btn.setObjectName("login_btn")
-        self.register_btn = QPushButton("Register")
-        self.register_btn.setObjectName("register_btn")
-        btn_layout.addWidget(self.back_btn)
-        btn_layout.addWidget(self.login_btn)
-        btn_layout.addWidget(self.register_btn)
-        layout.addLayout(btn_layout)
-
-        self.setLayout(layout)
+class ChangeBridge(QObject):
+    # re-emits bus events (raised on any thread) as a queued Qt signal on the GUI thread
+    changed = Signal(str)
 
-        # Connect forgot password
-        self.forgot_btn.clicked.connect(self.forgot_password)
+class ImportJob(QRunnable):
+    """Runs a user import on the thread pool; the outcome comes back as a queued signal."""
 
+    class Signals(QObject):
+        finished = Signal(object)
+        failed = Signal(str)
 
-    def toggle_password_visibility(self, state):
-        if state == Qt.Checked:
-            self.pw_edit.setEchoMode(QLineEdit.Normal)
-        else:
-            self.pw_edit.setEchoMode(QLineEdit.Password)
+    def __init__(self, path):
+        super().__init__()
+        # the Dashboard keeps the job alive until a signal arrives
+        self.setAutoDelete(False)
+        self.path = path
+        self.signals = ImportJob.Signals()
 
-    def forgot_password(self):
-        # Simple placeholder for forgot password functionality
-        QMessageBox.information(self, "Forgot Password", "Please contact the administrator to reset your password.")
+    def run(self):
+        try:
+            report = import_users_file(self.path)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.finished.emit(report)
 
 class AdminDialog(QDialog):
     def __init__(self, parent=None):
@@ -151,7 +84,7 @@ class AdminDialog(QDialog):
         if not username or not pw:
             QMessageBox.warning(self, "Invalid", "username and password required")
             return
-        ok, msg = register_user(username, pw, email, is_admin)
+        ok, msg, _ = register_user(username, pw, email, is_admin)
         if not ok:
             QMessageBox.warning(self, "Error", msg)
             return
@@ -205,8 +138,22 @@ class Dashboard(QWidget):
         if os.path.exists(app_icon):
             self.setWindowIcon(QIcon(app_icon))
 
-        self.files_list = QListWidget()
+        # files are paged in from the DB as the list scrolls
+        self.file_model = FileListModel(self.user.id, parent=self)
+        self.files_list = QListView()
+        self.files_list.setUniformItemSizes(True)
+        self.files_list.setModel(self.file_model)
+        self.file_filter = QLineEdit()
+        self.file_filter.setPlaceholderText("Filter by name")
+        self.file_sort = QComboBox()
+        self.file_sort.addItem("Newest first", "newest")
+        self.file_sort.addItem("Oldest first", "oldest")
+        self.file_sort.addItem("Name", "name")
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(self.file_filter)
+        filter_layout.addWidget(self.file_sort)
         left.addWidget(QLabel("Your files"))
+        left.addLayout(filter_layout)
         left.addWidget(self.files_list)
         left.addWidget(self.upload_btn)
         left.addWidget(self.process_btn)
@@ -248,12 +195,22 @@ class Dashboard(QWidget):
 
         self.upload_btn.clicked.connect(self.upload_file)
         self.process_btn.clicked.connect(self.process_selected)
+        # wait for typing to pause before re-querying
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(250)
+        self.filter_timer.timeout.connect(lambda: self.file_model.set_filter(self.file_filter.text()))
+        self.file_filter.textChanged.connect(self.filter_timer.start)
+        self.file_sort.currentIndexChanged.connect(lambda: self.file_model.set_sort(self.file_sort.currentData()))
         self.refresh_files()
 
     def setup_admin_dashboard(self, left, right):
         # User Management Section
         left.addWidget(QLabel("User Management"))
-        self.users_list = QListWidget()
+        self.user_model = UserListModel(parent=self)
+        self.users_list = QListView()
+        self.users_list.setUniformItemSizes(True)
+        self.users_list.setModel(self.user_model)
         left.addWidget(self.users_list)
 
         create_layout = QHBoxLayout()
@@ -273,18 +230,24 @@ class Dashboard(QWidget):
         create_layout.addWidget(self.create_btn)
         left.addLayout(create_layout)
         self.create_btn.clicked.connect(self.create_user)
+        self.import_btn = QPushButton("Import Users…")
+        left.addWidget(self.import_btn)
+        self.import_btn.clicked.connect(self.import_users)
 
-        # Activity Logs Section
+        # Activity Logs Section: newest first, only new rows are queried on refresh
         right.addWidget(QLabel("Activity Logs"))
-        from PySide6.QtWidgets import QWidget, QGridLayout, QVBoxLayout, QLabel
-        self.activity_widget = QWidget()
-        self.activity_layout = QGridLayout()
-        self.activity_widget.setLayout(self.activity_layout)
-        right.addWidget(self.activity_widget)
+        self.activity_model = ActivityFeedModel(parent=self)
+        self.activity_view = QListView()
+        self.activity_view.setUniformItemSizes(True)
+        self.activity_view.setIconSize(QSize(ICON_SIZE, ICON_SIZE))
+        self.activity_view.setModel(self.activity_model)
+        right.addWidget(self.activity_view)
 
         # Threat Alerts Section
         right.addWidget(QLabel("Threat Alerts"))
-        self.threat_list = QListWidget()
+        self.threat_model = ThreatListModel(parent=self)
+        self.threat_list = QListView()
+        self.threat_list.setModel(self.threat_model)
         right.addWidget(self.threat_list)
 
         # Refresh button
@@ -292,105 +255,90 @@ class Dashboard(QWidget):
         right.addWidget(refresh_btn)
         refresh_btn.clicked.connect(self.refresh_admin_data)
 
+        # panes update when the event bus reports inserts; bursts are coalesced into one poll
+        self.pending_changes = set()
+        self.change_timer = QTimer(self)
+        self.change_timer.setSingleShot(True)
+        self.change_timer.setInterval(150)
+        self.change_timer.timeout.connect(self.apply_data_changes)
+        self.change_bridge = ChangeBridge(self)
+        self.change_bridge.changed.connect(self.on_data_changed)
+        self.unsubscribers = [
+            bus.subscribe(topic, lambda topic, payload: self.change_bridge.changed.emit(topic))
+            for topic in ("users", "activity_logs", "threat_detections")
+        ]
+        # picks up commits from other processes (CLI, API server) as well
+        start_change_watcher()
+
         self.refresh_admin_data()
 
     def refresh_files(self):
-        self.files_list.clear()
-        db = SessionLocal()
-        try:
-            rows = db.query(FileRecord).filter(FileRecord.owner == self.user.username).all()
-            for r in rows:
-                self.files_list.addItem(f"{r.id}: {r.filename} ({r.storage_name})")
-        finally:
-            db.close()
+        self.file_model.refresh()
+
+    def selected_file_id(self):
+        index = self.files_list.currentIndex()
+        return index.data(FileIdRole) if index.isValid() else None
 
     def upload_file(self):
         path, _ = QFileDialog.getOpenFileName(self, "Choose file to upload")
         if not path:
             return
-        with open(path, "rb") as f:
-            data = f.read()
-        storage = save_encrypted_file(self.user.username, os.path.basename(path), data)
-        db = SessionLocal()
-        try:
-            rec = FileRecord(filename=os.path.basename(path), owner=self.user.username, storage_name=storage)
-            db.add(rec); db.commit()
-            log_activity(self.user.id, "file_upload", f"Uploaded file: {rec.filename}")
-        finally:
-            db.close()
+        # size, type and hash are taken while the file is read
+        data, metadata = read_file(path)
+        filename = os.path.basename(path)
+        add_user_file(self.user.id, filename, data, metadata)
+        log_activity(self.user.id, "file_upload", f"Uploaded file: {filename}")
         self.refresh_files()
         QMessageBox.information(self, "Saved", "File uploaded and encrypted.")
 
     def process_selected(self):
-        sel = self.files_list.currentItem()
-        if not sel:
+        fid = self.selected_file_id()
+        if fid is None:
             QMessageBox.warning(self, "Select one", "please select a file")
             return
-        # parse id from display
-        txt = sel.text()
-        fid = int(txt.split(":")[0])
-        db = SessionLocal()
+        with session_scope() as db:
+            rec = db.query(FileRecord.filename, FileRecord.storage_name).filter(FileRecord.id == fid).first()
+        if not rec:
+            QMessageBox.warning(self, "Missing", "Record not found")
+            return
+        raw = load_decrypted_file(rec.storage_name)
         try:
-            rec = db.query(FileRecord).filter(FileRecord.id == fid).first()
-            if not rec:
-                QMessageBox.warning(self, "Missing", "Record not found")
-                return
-            raw = load_decrypted_file(rec.storage_name)
-            try:
-                text = raw.decode("utf-8", errors="ignore")
-            except Exception:
-                text = ""
-            summary = summarize_text(text, max_sentences=4)
-            keywords = extract_keywords(text, num_keywords=8)
-            sentiment = analyze_sentiment(text)
-            output = f"Summary:\n{summary or '(no text extracted)'}\n\nKeywords:\n{', '.join(keywords)}\n\nSentiment: {sentiment}"
-            self.output_view.setPlainText(output)
-            log_activity(self.user.id, "file_process", f"Processed file: {rec.filename}")
-        finally:
-            db.close()
+            text = raw.decode("utf-8", errors="ignore")
+        except Exception:
+            text = ""
+        result = analyze_document(text)
+        output = f"Summary:\n{result['summary'] or '(no text extracted)'}\n\nKeywords:\n{', '.join(result['keywords'])}\n\nSentiment: {result['sentiment']}"
+        self.output_view.setPlainText(output)
+        log_activity(self.user.id, "file_process", f"Processed file: {rec.filename}")
 
     def open_admin(self):
         dlg = AdminDialog(self)
         dlg.exec()
 
     def delete_selected_file(self):
-        sel = self.files_list.currentItem()
-        if not sel:
+        fid = self.selected_file_id()
+        if fid is None:
             QMessageBox.warning(self, "Select one", "please select a file to delete")
             return
-        txt = sel.text()
-        fid = int(txt.split(":")[0])
-        db = SessionLocal()
         try:
-            rec = db.query(FileRecord).filter(FileRecord.id == fid).first()
-            if not rec:
+            # removes the row, its blob and its share of the storage counters
+            filename = delete_file_record(fid, self.user.id)
+            if filename is None:
                 QMessageBox.warning(self, "Missing", "Record not found")
                 return
-            # Delete file from storage
-            import os
-            storage_path = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), "storage", rec.storage_name)
-            if os.path.exists(storage_path):
-                os.remove(storage_path)
-            # Delete record from DB
-            db.delete(rec)
-            db.commit()
-            log_activity(self.user.id, "file_delete", f"Deleted file: {rec.filename}")
-            self.refresh_files()
-            QMessageBox.information(self, "Deleted", f"File '{rec.filename}' deleted.")
+            log_activity(self.user.id, "file_delete", f"Deleted file: {filename}")
+            self.file_model.remove_file(fid)
+            QMessageBox.information(self, "Deleted", f"File '{filename}' deleted.")
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Failed to delete file: {str(e)}")
-        finally:
-            db.close()
 
     def share_selected_file(self):
-        sel = self.files_list.currentItem()
-        if not sel:
+        fid = self.selected_file_id()
+        if fid is None:
             QMessageBox.warning(self, "Select one", "please select a file to share")
             return
-        txt = sel.text()
-        fid = int(txt.split(":")[0])
         try:
-            msg, error = share_file(fid, self.user.username)
+            msg, error = share_file(fid, self.user.id)
             if error:
                 QMessageBox.warning(self, "Error", error)
             else:
@@ -400,82 +348,32 @@ class Dashboard(QWidget):
             QMessageBox.warning(self, "Error", f"Failed to share file: {str(e)}")
 
     def refresh_admin_data(self):
-        # Refresh users list
-        self.users_list.clear()
-        for u in list_users():
-            self.users_list.addItem(f"{u.username} {'(admin)' if u.is_admin else ''}")
-
-        # Refresh activity logs
-        # Clear previous widgets in grid layout
-        while self.activity_layout.count():
-            item = self.activity_layout.takeAt(0)
-            widget = item.widget()
-            if widget:
-                widget.deleteLater()
-
-        db = SessionLocal()
-        try:
-            from server.models import ActivityLog
-            logs = db.query(ActivityLog).order_by(ActivityLog.timestamp.desc()).limit(20).all()
-
-            # Map action types to icons (use placeholder icons or paths)
-            icon_map = {
-                "file_upload": "upload.svg",
-                "file_process": "process.svg",
-                "file_delete": "delete.svg",
-                "file_share": "share.svg",
-                # Add more mappings as needed
-            }
-
-            row = 0
-            col = 0
-            max_cols = 3  # Number of columns in grid
-
-            for log in logs:
-                action = log.action
-                icon_file = icon_map.get(action, "default.svg")
-                icon_path = os.path.join(ASSETS_DIR, icon_file)
-                icon_label = QLabel()
-                if os.path.exists(icon_path):
-                    icon_label.setPixmap(QIcon(icon_path).pixmap(48, 48))
-                else:
-                    icon_label.setText("Icon")
-
-                text_label = QLabel(f"{log.timestamp.strftime('%Y-%m-%d %H:%M:%S')}\nUser: {log.user_id}\nAction: {action}")
-                text_label.setWordWrap(True)
-
-                vbox = QVBoxLayout()
-                vbox.addWidget(icon_label, alignment=Qt.AlignCenter)
-                vbox.addWidget(text_label, alignment=Qt.AlignCenter)
-
-                container = QWidget()
-                container.setLayout(vbox)
-                container.setStyleSheet("border: 1px solid #ccc; border-radius: 5px; padding: 5px;")
-
-                self.activity_layout.addWidget(container, row, col)
-                col += 1
-                if col >= max_cols:
-                    col = 0
-                    row += 1
-
-        except Exception as e:
-            error_label = QLabel(f"Error loading logs: {str(e)}")
-            self.activity_layout.addWidget(error_label, 0, 0)
-        finally:
-            db.close()
-
-        # Refresh threat alerts
-        self.threat_list.clear()
-        db = SessionLocal()
-        try:
-            from server.models import ThreatDetection
-            threats = db.query(ThreatDetection).filter(ThreatDetection.status == 'active').order_by(ThreatDetection.detected_at.desc()).limit(10).all()
-            for threat in threats:
-                self.threat_list.addItem(f"{threat.detected_at}: File {threat.file_id} - {threat.threat_type} ({threat.confidence}%)")
-        except Exception as e:
-            self.threat_list.addItem(f"Error loading threats: {str(e)}")
-        finally:
-            db.close()
+        # ask the writer to commit buffered rows now without waiting for it; its commit
+        # publishes "activity_logs", which polls the feed again through apply_data_changes
+        flush_activity_log(timeout=0)
+        self.user_model.poll()
+        self.activity_model.poll()
+        self.threat_model.poll()
+
+    def on_data_changed(self, topic):
+        self.pending_changes.add(topic)
+        if not self.change_timer.isActive():
+            self.change_timer.start()
+
+    def apply_data_changes(self):
+        topics, self.pending_changes = self.pending_changes, set()
+        if "users" in topics:
+            self.user_model.poll()
+        if "activity_logs" in topics:
+            self.activity_model.poll()
+        if "threat_detections" in topics:
+            self.threat_model.poll()
+
+    def closeEvent(self, event):
+        for unsubscribe in getattr(self, "unsubscribers", []):
+            unsubscribe()
+        stop_change_watcher()
+        super().closeEvent(event)
 
     def create_user(self):
         username = self.new_user.text().strip()
@@ -485,10 +383,42 @@ class Dashboard(QWidget):
         if not username or not pw:
             QMessageBox.warning(self, "Invalid", "username and password required")
             return
-        ok, msg = register_user(username, pw, email, is_admin)
+        ok, msg, _ = register_user(username, pw, email, is_admin)
         if not ok:
             QMessageBox.warning(self, "Error", msg)
             return
         self.new_user.clear(); self.new_email.clear(); self.new_pw.clear(); self.admin_check.setChecked(False)
-        self.refresh_admin_data()
         QMessageBox.information(self, "OK", "User created")
+
+    def import_users(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import users", "", "User lists (*.csv *.jsonl *.ndjson);;All files (*)")
+        if not path:
+            return
+        # hashing a large file takes minutes; keep the window responsive meanwhile
+        self.import_job = ImportJob(path)
+        self.import_job.signals.finished.connect(self.on_import_finished)
+        self.import_job.signals.failed.connect(self.on_import_failed)
+        self.import_btn.setEnabled(False)
+        self.import_btn.setText("Importing…")
+        QThreadPool.globalInstance().start(self.import_job)
+
+    def end_import(self):
+        path, self.import_job = self.import_job.path, None
+        self.import_btn.setEnabled(True)
+        self.import_btn.setText("Import Users…")
+        return path
+
+    def on_import_failed(self, message):
+        self.end_import()
+        QMessageBox.critical(self, "Error", f"Failed to import users: {message}")
+
+    def on_import_finished(self, report):
+        path = self.end_import()
+        created = sum(1 for r in report if r["status"] == "created")
+        errors = [r for r in report if r["status"] != "created"]
+        log_activity(self.user.id, "bulk_import", f"Imported {created} users from {os.path.basename(path)} ({len(errors)} rejected)")
+        box = QMessageBox(QMessageBox.Information if not errors else QMessageBox.Warning, "Import users",
+                          f"Created {created} users, {len(errors)} rows rejected.", parent=self)
+        if errors:
+            box.setDetailedText("\n".join(f"line {r['line']}: {r['username'] or '?'} — {r['error']}" for r in errors))
+        box.exec()
@@ -0,0 +1,351 @@
+import os
+import bisect
+import logging
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex
+from PySide6.QtGui import QIcon
+from sqlalchemy import select, func, tuple_
+
+from app.models import SessionLocal, FileRecord, ActivityLog, User, ThreatDetection, RowChange, FILE_UPLOADED_KEY, FILE_NAME_KEY
+
+logger = logging.getLogger(__name__)
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+FileIdRole = Qt.UserRole + 1
+RecordIdRole = Qt.UserRole + 2
+
+# action -> icon base name in ASSETS_DIR ("<name>_high.svg" is preferred over "<name>.svg")
+ACTION_ICONS = {
+    "file_upload": "upload",
+    "file_process": "process",
+    "file_delete": "delete",
+    "file_share": "share",
+}
+ICON_SIZE = 32
+# shown for legacy rows whose filename is NULL
+UNNAMED_FILE = "(unnamed)"
+
+_pixmap_cache = {}
+
+
+def action_pixmap(action: str):
+    """Rasterizes each action's SVG once per process; misses are cached as well."""
+    if action in _pixmap_cache:
+        return _pixmap_cache[action]
+    pixmap = None
+    name = ACTION_ICONS.get(action, "default")
+    for candidate in (f"{name}_high.svg", f"{name}.svg"):
+        path = os.path.join(ASSETS_DIR, candidate)
+        if os.path.exists(path):
+            pixmap = QIcon(path).pixmap(ICON_SIZE, ICON_SIZE)
+            break
+    _pixmap_cache[action] = pixmap
+    return pixmap
+
+
+# sort key -> (expression, descending); every sort is backed by an index on (user_id, expression)
+FILE_SORTS = {
+    "newest": (FILE_UPLOADED_KEY, True),
+    "oldest": (FILE_UPLOADED_KEY, False),
+    "name": (FILE_NAME_KEY, False),
+}
+
+
+class FileListModel(QAbstractListModel):
+    """
+    Lazily loaded list of one user's files. Rows are fetched a page at a
+    time with keyset pagination as the view scrolls (canFetchMore/fetchMore),
+    so opening the dashboard costs one indexed query regardless of how many
+    files the user has. The file id is exposed under FileIdRole.
+    """
+
+    PAGE_SIZE = 200
+
+    def __init__(self, user_id: int, session_factory=SessionLocal, page_size: int = PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self.user_id = user_id
+        self.session_factory = session_factory
+        self.page_size = page_size
+        self.sort_key = "newest"
+        self.filter_text = ""
+        self._rows = []
+        self._exhausted = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        row = self._rows[index.row()]
+        name = row.filename or UNNAMED_FILE
+        if role == Qt.DisplayRole:
+            when = row.uploaded_at.strftime("%Y-%m-%d %H:%M") if row.uploaded_at else ""
+            return f"{name}  ({when})" if when else name
+        if role == FileIdRole:
+            return row.id
+        if role == Qt.ToolTipRole:
+            size = f"{row.file_size:,} bytes" if row.file_size is not None else "size unknown"
+            return f"{name}\n{size}" + (f", {row.file_type}" if row.file_type else "")
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        page = self._fetch_page()
+        if len(page) < self.page_size:
+            self._exhausted = True
+        if page:
+            start = len(self._rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(page) - 1)
+            self._rows.extend(page)
+            self.endInsertRows()
+
+    def _fetch_page(self):
+        column, descending = FILE_SORTS[self.sort_key]
+        stmt = select(FileRecord.id, FileRecord.filename, FileRecord.uploaded_at, FileRecord.file_size, FileRecord.file_type,
+                      column.label("sort_key")) \
+            .where(FileRecord.user_id == self.user_id)
+        if self.filter_text:
+            stmt = stmt.where(FileRecord.filename.contains(self.filter_text, autoescape=True))
+        if self._rows:
+            # continue after the last loaded row instead of using OFFSET
+            last = self._rows[-1]
+            last_key = tuple_(last.sort_key, last.id)
+            key = tuple_(column, FileRecord.id)
+            stmt = stmt.where(key < last_key if descending else key > last_key)
+        if descending:
+            stmt = stmt.order_by(column.desc(), FileRecord.id.desc())
+        else:
+            stmt = stmt.order_by(column.asc(), FileRecord.id.asc())
+        db = self.session_factory()
+        try:
+            return db.execute(stmt.limit(self.page_size)).all()
+        finally:
+            db.close()
+
+    def file_id(self, row: int):
+        return self._rows[row].id if 0 <= row < len(self._rows) else None
+
+    def set_sort(self, sort_key: str):
+        if sort_key != self.sort_key:
+            self.sort_key = sort_key
+            self.refresh()
+
+    def set_filter(self, text: str):
+        text = text.strip()
+        if text != self.filter_text:
+            self.filter_text = text
+            self.refresh()
+
+    def refresh(self):
+        self.beginResetModel()
+        self._rows = []
+        self._exhausted = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def remove_file(self, file_id: int):
+        for i, row in enumerate(self._rows):
+            if row.id == file_id:
+                self.beginRemoveRows(QModelIndex(), i, i)
+                del self._rows[i]
+                self.endRemoveRows()
+                return
+
+
+class IncrementalListModel(QAbstractListModel):
+    """
+    Base for admin panes that only ever query rows they have not seen yet.
+    poll() fetches rows with an id above the highest id loaded so far and
+    inserts them at the top; the list is capped at max_rows.
+    """
+
+    def __init__(self, session_factory=SessionLocal, max_rows: int = 200, parent=None):
+        super().__init__(parent)
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.last_id = 0
+        self._rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            return self.display(row)
+        if role == Qt.DecorationRole:
+            return self.decoration(row)
+        if role == RecordIdRole:
+            return row.id
+        return None
+
+    def display(self, row):
+        # subclasses format their own columns; this is only a readable fallback
+        return "  ".join(str(value) for value in row if value is not None)
+
+    def decoration(self, row):
+        return None
+
+    def fetch_new(self, db, after_id: int, limit: int):
+        """Returns up to limit rows with id > after_id, newest first. The base pane has no source."""
+        return []
+
+    def reconcile(self, db):
+        """Hook for dropping rows that no longer belong in the pane."""
+
+    def poll(self) -> int:
+        db = self.session_factory()
+        try:
+            try:
+                self.reconcile(db)
+                rows = self.fetch_new(db, self.last_id, self.max_rows)
+            except Exception as e:
+                logger.error(f"Error refreshing {type(self).__name__}: {e}")
+                return 0
+        finally:
+            db.close()
+        if rows:
+            self.last_id = max(self.last_id, max(r.id for r in rows))
+            self.insert_rows(rows)
+            self._trim()
+        return len(rows)
+
+    def insert_rows(self, rows):
+        self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+        self._rows[:0] = rows
+        self.endInsertRows()
+
+    def remove_ids(self, ids):
+        for i in reversed(range(len(self._rows))):
+            if self._rows[i].id in ids:
+                self.beginRemoveRows(QModelIndex(), i, i)
+                del self._rows[i]
+                self.endRemoveRows()
+
+    def _trim(self):
+        if len(self._rows) > self.max_rows:
+            self.beginRemoveRows(QModelIndex(), self.max_rows, len(self._rows) - 1)
+            del self._rows[self.max_rows:]
+            self.endRemoveRows()
+
+
+class ActivityFeedModel(IncrementalListModel):
+    def fetch_new(self, db, after_id, limit):
+        return db.execute(
+            select(ActivityLog.id, ActivityLog.timestamp, ActivityLog.user_id, ActivityLog.action, User.username)
+            .outerjoin(User, User.id == ActivityLog.user_id)
+            .where(ActivityLog.id > after_id)
+            .order_by(ActivityLog.id.desc())
+            .limit(limit)
+        ).all()
+
+    def display(self, row):
+        when = row.timestamp.strftime("%Y-%m-%d %H:%M:%S") if row.timestamp else ""
+        who = row.username or (f"user {row.user_id}" if row.user_id else "anonymous")
+        return f"{when}  {who}  {row.action}"
+
+    def decoration(self, row):
+        return action_pixmap(row.action)
+
+
+class UserListModel(IncrementalListModel):
+    def __init__(self, session_factory=SessionLocal, max_rows: int = 100000, parent=None):
+        super().__init__(session_factory, max_rows, parent)
+        # last row_changes seq seen; only users changed after it are re-read
+        self.change_seq = 0
+
+    def fetch_new(self, db, after_id, limit):
+        return db.execute(
+            select(User.id, User.username, User.is_admin)
+            .where(User.id > after_id)
+            .order_by(User.id.desc())
+            .limit(limit)
+        ).all()
+
+    def reconcile(self, db):
+        # deleted users leave the pane; renamed users and is_admin changes are re-inserted in place
+        latest, oldest = db.execute(select(
+            select(func.max(RowChange.seq)).scalar_subquery(),
+            select(func.min(RowChange.seq)).scalar_subquery(),
+        )).one()
+        since, self.change_seq = self.change_seq, latest or 0
+        if not self._rows or not latest or latest <= since:
+            return
+        query = select(User.id, User.username, User.is_admin).where(User.id <= self.last_id)
+        if oldest <= since + 1:
+            ids = set(db.execute(
+                select(RowChange.row_id).where(RowChange.table_name == "users", RowChange.seq > since)
+            ).scalars())
+            ids &= {row.id for row in self._rows}
+            if not ids:
+                return
+            query = query.where(User.id.in_(ids))
+        else:
+            # the log was pruned past our position; compare every shown user
+            ids = {row.id for row in self._rows}
+        current = {r.id: r for r in db.execute(query).all()}
+        shown = [row for row in self._rows if row.id in ids]
+        gone = {row.id for row in shown if row.id not in current}
+        changed = [current[row.id] for row in shown if row.id in current and tuple(current[row.id]) != tuple(row)]
+        if gone or changed:
+            self.remove_ids(gone | {row.id for row in changed})
+        if changed:
+            self.insert_rows(changed)
+
+    def insert_rows(self, rows):
+        # keep the pane alphabetical like the old full reload
+        keys = [r.username or "" for r in self._rows]
+        for row in sorted(rows, key=lambda r: r.username or ""):
+            i = bisect.bisect(keys, row.username or "")
+            self.beginInsertRows(QModelIndex(), i, i)
+            keys.insert(i, row.username or "")
+            self._rows.insert(i, row)
+            self.endInsertRows()
+
+    def display(self, row):
+        return f"{row.username} {'(admin)' if row.is_admin else ''}"
+
+
+class ThreatListModel(IncrementalListModel):
+    def __init__(self, session_factory=SessionLocal, max_rows: int = 50, parent=None):
+        super().__init__(session_factory, max_rows, parent)
+
+    def fetch_new(self, db, after_id, limit):
+        return db.execute(
+            select(ThreatDetection.id, ThreatDetection.detected_at, ThreatDetection.file_id,
+                   ThreatDetection.threat_type, ThreatDetection.confidence)
+            .where(ThreatDetection.status == "active", ThreatDetection.id > after_id)
+            .order_by(ThreatDetection.id.desc())
+            .limit(limit)
+        ).all()
+
+    def poll(self) -> int:
+        # a threat can be resolved or reopened whatever its id, so the active set is
+        # re-read by status on each poll (i.e. when threat_detections changes)
+        db = self.session_factory()
+        try:
+            try:
+                rows = self.fetch_new(db, 0, self.max_rows)
+            except Exception as e:
+                logger.error(f"Error refreshing {type(self).__name__}: {e}")
+                return 0
+        finally:
+            db.close()
+        shown = {row.id for row in self._rows}
+        added = sum(1 for row in rows if row.id not in shown)
+        if [tuple(row) for row in rows] != [tuple(row) for row in self._rows]:
+            self.beginResetModel()
+            self._rows = list(rows)
+            self.endResetModel()
+        self.last_id = max([self.last_id] + [row.id for row in rows])
+        return added
+
+    def display(self, row):
+        return f"{row.detected_at}: File {row.file_id} - {row.threat_type} ({row.confidence}%)"
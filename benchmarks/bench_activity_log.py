@@ -0,0 +1,73 @@
+"""
+Compares activity log throughput of one session+commit per event (the old
+log_activity behaviour) with the batched background writer.
+
+    python benchmarks/bench_activity_log.py --events 5000
+"""
+import sys
+import os
+import argparse
+import tempfile
+import time
+from datetime import datetime
+# ensure project root is on sys.path so imports like `from app...` work when run as a script
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, ActivityLog
+from app.activity_log import ActivityLogWriter
+
+
+def make_session_factory(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def bench_per_event(session_factory, events):
+    start = time.perf_counter()
+    for i in range(events):
+        db = session_factory()
+        try:
+            db.add(ActivityLog(user_id=1, action="bench", timestamp=datetime.utcnow(), details=f"event {i}"))
+            db.commit()
+        finally:
+            db.close()
+    return time.perf_counter() - start
+
+
+def bench_batched(session_factory, events):
+    writer = ActivityLogWriter(session_factory=session_factory)
+    start = time.perf_counter()
+    for i in range(events):
+        writer.submit(1, "bench", f"event {i}")
+    writer.close()
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for name, fn in (("per-event commit", bench_per_event), ("batched writer", bench_batched)):
+            engine, factory = make_session_factory(os.path.join(tmp, f"{fn.__name__}.db"))
+            elapsed = fn(factory, args.events)
+            db = factory()
+            try:
+                written = db.query(ActivityLog).count()
+            finally:
+                db.close()
+            engine.dispose()
+            results[name] = args.events / elapsed
+            print(f"{name:>18}: {args.events} events in {elapsed:.3f}s -> {results[name]:,.0f} events/s ({written} rows)")
+        print(f"{'speedup':>18}: {results['batched writer'] / results['per-event commit']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
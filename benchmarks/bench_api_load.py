@@ -0,0 +1,162 @@
+"""
+Load test for the local HTTP API (server/api.py). Starts the API on
+127.0.0.1 against a throwaway database and storage directory, then runs N
+concurrent virtual users over keep-alive connections, each looping
+list -> upload -> download, and reports requests/s and latency percentiles
+per endpoint. Nothing leaves the machine.
+
+    python benchmarks/bench_api_load.py --users 20 --seconds 10 --size 16384
+"""
+import sys
+import os
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+# ensure project root is on sys.path so imports like `from app...` work when run as a script
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from app import file_manager
+from app.auth import register_user
+from app.models import init_db
+from database.db import configure_database
+from server.api import ApiService
+from server.httpd import HTTPServer
+
+
+class Client:
+    """Minimal keep-alive HTTP/1.1 client on asyncio streams."""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+        self.token = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+
+    async def request(self, method, path, body=b""):
+        head = f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Length: {len(body)}\r\n"
+        if self.token:
+            head += f"Authorization: Bearer {self.token}\r\n"
+        self.writer.write(head.encode() + b"\r\n" + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "content-length" in headers:
+            data = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            parts = []
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                parts.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            data = b"".join(parts)
+        return status, data
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def login(port, username, password):
+    client = Client(port)
+    await client.connect()
+    status, data = await client.request("POST", "/auth/login", json.dumps({"username": username, "password": password}).encode())
+    client.token = json.loads(data)["token"]
+    return client
+
+
+async def virtual_user(client, payload, deadline, latencies, errors):
+    n = 0
+    try:
+        while time.perf_counter() < deadline:
+            n += 1
+            for name, method, path, body in (
+                ("list", "GET", "/files?limit=50", b""),
+                ("upload", "POST", f"/files?filename=load-{n}.txt", payload),
+            ):
+                start = time.perf_counter()
+                status, data = await client.request(method, path, body)
+                latencies[name].append(time.perf_counter() - start)
+                if status >= 400:
+                    errors[name] += 1
+            if status == 201:
+                file_id = json.loads(data)["id"]
+                start = time.perf_counter()
+                status, data = await client.request("GET", f"/files/{file_id}")
+                latencies["download"].append(time.perf_counter() - start)
+                if status != 200 or len(data) != len(payload):
+                    errors["download"] += 1
+    finally:
+        await client.close()
+
+
+def start_server():
+    loop = asyncio.new_event_loop()
+    service = ApiService()
+    server = HTTPServer(service.router)
+    port = loop.run_until_complete(server.start("127.0.0.1", 0))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return port
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--size", type=int, default=16 * 1024, help="upload size in bytes")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_database(f"sqlite:///{os.path.join(tmp, 'load.db')}")
+        file_manager.STORAGE_DIR = os.path.join(tmp, "storage")
+        file_manager.FERNET_PATH = os.path.join(tmp, "fernet.key")
+        init_db()
+        for i in range(args.users):
+            register_user(f"load{i}", "pw12345")
+        port = start_server()
+
+        latencies, errors = defaultdict(list), defaultdict(int)
+        payload = os.urandom(args.size)
+
+        async def run():
+            # bcrypt logins are deliberately slow; keep them out of the measured window
+            clients = await asyncio.gather(*(login(port, f"load{i}", "pw12345") for i in range(args.users)))
+            start = time.perf_counter()
+            await asyncio.gather(*(virtual_user(client, payload, start + args.seconds, latencies, errors)
+                                   for client in clients))
+            return time.perf_counter() - start
+
+        elapsed = asyncio.run(run())
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"{args.users} users, {elapsed:.1f}s, {total} requests, {total / elapsed:,.0f} req/s")
+    for name, values in latencies.items():
+        print(f"  {name:>8}: {len(values):6d} reqs  {len(values) / elapsed:8,.0f}/s  "
+              f"p50 {statistics.median(values) * 1000:7.1f} ms  p99 {percentile(values, 0.99) * 1000:7.1f} ms  "
+              f"errors {errors[name]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Runs one writer thread and several reader threads against the same SQLite
+file, once with a plain engine (rollback journal, the old database/db.py
+setup) and once with create_db_engine (WAL profile), and reports how long
+readers wait while the writer is busy.
+
+    python benchmarks/bench_sqlite_concurrency.py --seconds 3 --readers 4
+"""
+import sys
+import os
+import argparse
+import tempfile
+import threading
+import time
+from datetime import datetime
+# ensure project root is on sys.path so imports like `from app...` work when run as a script
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from database.db import create_db_engine
+from app.models import Base, ActivityLog
+
+
+def run(engine, seconds, readers, rows_per_commit, payload):
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    stop = threading.Event()
+    latencies, errors, writes = [], [0], [0]
+    lock = threading.Lock()
+
+    def writer():
+        while not stop.is_set():
+            db = factory()
+            try:
+                db.execute(ActivityLog.__table__.insert(), [
+                    {"user_id": 1, "action": "bench", "timestamp": datetime.utcnow(), "details": "x" * payload}
+                    for _ in range(rows_per_commit)
+                ])
+                db.commit()
+                writes[0] += rows_per_commit
+            except Exception:
+                db.rollback()
+                errors[0] += 1
+            finally:
+                db.close()
+
+    def reader():
+        local = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            db = factory()
+            try:
+                db.execute(text("SELECT id, action, timestamp FROM activity_logs ORDER BY id DESC LIMIT 20")).all()
+                local.append(time.perf_counter() - start)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+            finally:
+                db.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    engine.dispose()
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else float("nan")
+    return {
+        "reads/s": len(latencies) / seconds,
+        "p50 ms": p(0.50),
+        "p99 ms": p(0.99),
+        "max ms": p(1.0),
+        "rows written/s": writes[0] / seconds,
+        "errors": errors[0],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--rows-per-commit", type=int, default=2000)
+    parser.add_argument("--payload", type=int, default=4000, help="bytes of details per row")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain_url = f"sqlite:///{os.path.join(tmp, 'plain.db')}"
+        tuned_url = f"sqlite:///{os.path.join(tmp, 'tuned.db')}"
+        results = {
+            "plain engine": run(create_engine(plain_url, connect_args={"check_same_thread": False}),
+                                args.seconds, args.readers, args.rows_per_commit, args.payload),
+            "create_db_engine": run(create_db_engine(tuned_url), args.seconds, args.readers, args.rows_per_commit, args.payload),
+        }
+    for name, stats in results.items():
+        print(f"{name:>16}: " + ", ".join(f"{k} {v:,.1f}" if isinstance(v, float) else f"{k} {v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Benchmark and load suite with regression thresholds. Runs against a
+throwaway database, storage directory and key, simulating N concurrent
+users that each loop login -> upload -> process -> share -> delete through
+the same functions the desktop app calls. Shares are served on 127.0.0.1 and
+downloaded locally; nothing leaves the machine.
+
+    python benchmarks/bench_suite.py --update-baseline   # record this machine's numbers
+    python benchmarks/bench_suite.py                     # compare with baseline.json
+    python benchmarks/bench_suite.py --users 16 --iterations 10 --metrics-out metrics.prom
+
+Throughput figures (encryption MB/s, log rows/s, workflows/s) come from
+app/metrics.py; latencies are the p95 of each step as seen by a user. The
+exit status is 1 when any figure is worse than its baseline by more than
+the tolerance stored in the baseline file.
+
+The figures are absolute and only mean something on the machine that
+recorded them, so baseline.json is not kept in the repository: record it
+once per machine (or CI runner) from a known-good build, and again after
+hardware changes.
+"""
+import sys
+import os
+import argparse
+import json
+import random
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+# ensure project root is on sys.path so imports like `from app...` work when run as a script
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from app import file_manager, metrics
+from app.activity_log import ActivityLogWriter, flush_activity_log
+from app.ai_processor import analyze_document
+from app.auth import register_user, authenticate_user, log_activity
+from app.file_manager import add_user_file, load_decrypted_file, delete_file_record
+from app.file_sharing import share_file, stop_sharing
+from app.models import init_db, User, FileRecord
+from database.db import configure_database, get_engine, session_scope
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_TOLERANCE = 0.5
+PARAMS = {"users": 8, "iterations": 5, "size": 64 * 1024, "log_events": 5000}
+STEPS = ("login", "upload", "process", "share", "delete")
+WORDS = ("report", "quarterly", "revenue", "good", "poor", "encryption", "storage", "analysis", "the", "and",
+         "excellent", "customer", "terrible", "growth", "secure", "document", "summary", "risk", "team", "plan")
+
+
+def make_document(size: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    parts, length = [], 0
+    while length < size:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14))).capitalize() + ". "
+        parts.append(sentence)
+        length += len(sentence)
+    return "".join(parts).encode("utf-8")[:size]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def virtual_user(user_id: int, username: str, password: str, iterations: int, size: int, latencies, errors):
+    def step(name, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        except Exception:
+            errors[name] += 1
+            return None
+        finally:
+            latencies[name].append(time.perf_counter() - start)
+
+    def login():
+        if authenticate_user(username, password) is None:
+            raise RuntimeError("login failed")
+        return True
+
+    for n in range(iterations):
+        if step("login", login) is None:
+            continue
+        log_activity(user_id, "login", "User logged in")
+        filename = f"bench-{n}.txt"
+        file_id = step("upload", add_user_file, user_id, filename, make_document(size, user_id * 1000 + n))
+        if file_id is None:
+            continue
+        log_activity(user_id, "file_upload", f"Uploaded file: {filename}")
+
+        def process():
+            with session_scope() as db:
+                storage_name = db.get(FileRecord, file_id).storage_name
+            return analyze_document(load_decrypted_file(storage_name).decode("utf-8", errors="ignore"))
+        step("process", process)
+
+        def share():
+            msg, error = share_file(file_id, user_id, host="127.0.0.1")
+            if error:
+                raise RuntimeError(error)
+            url = msg.rsplit(" ", 1)[-1]
+            try:
+                with urllib.request.urlopen(url, timeout=10) as response:
+                    if len(response.read()) != size:
+                        raise RuntimeError("short download")
+            finally:
+                stop_sharing(url)
+        step("share", share)
+        log_activity(user_id, "file_share", f"Shared file with ID: {file_id}")
+
+        step("delete", delete_file_record, file_id, user_id)
+        log_activity(user_id, "file_delete", f"Deleted file: {filename}")
+
+
+def bench_log_inserts(events: int) -> float:
+    """Rows/s committed by a dedicated activity log writer."""
+    writer = ActivityLogWriter()
+    start = time.perf_counter()
+    for i in range(events):
+        writer.submit(1, "bench", f"event {i}")
+    writer.close()
+    return events / (time.perf_counter() - start)
+
+
+def run_suite(users: int = 8, iterations: int = 5, size: int = 64 * 1024, log_events: int = 5000) -> dict:
+    """
+    Runs the load in a temporary database and storage directory and returns
+    {"results": {metric: value}, "errors": {step: count}, "metrics": prometheus text}.
+    """
+    saved = (file_manager.STORAGE_DIR, file_manager.DATA_DIR, file_manager.FERNET_PATH)
+    previous_url = get_engine().url.render_as_string(hide_password=False)
+    with tempfile.TemporaryDirectory() as tmp:
+        file_manager.STORAGE_DIR = os.path.join(tmp, "storage")
+        file_manager.DATA_DIR = os.path.join(tmp, "data")
+        file_manager.FERNET_PATH = os.path.join(tmp, "data", "fernet.key")
+        configure_database(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        try:
+            init_db()
+            accounts = [(f"bench{i}", f"pw-bench-{i}") for i in range(users)]
+            # registration hashes with bcrypt too; it is setup, not part of the load
+            for username, password in accounts:
+                register_user(username, password)
+            with session_scope() as db:
+                ids = dict(db.query(User.username, User.id).all())
+
+            metrics.reset()
+            latencies, errors = defaultdict(list), defaultdict(int)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=users, thread_name_prefix="bench-user") as pool:
+                for future in [pool.submit(virtual_user, ids[u], u, p, iterations, size, latencies, errors)
+                               for u, p in accounts]:
+                    future.result()
+            elapsed = time.perf_counter() - start
+            flush_activity_log(timeout=10)
+            log_rows_s = bench_log_inserts(log_events)
+        finally:
+            stop_sharing()
+            flush_activity_log(timeout=10)
+            configure_database(previous_url)
+            file_manager.STORAGE_DIR, file_manager.DATA_DIR, file_manager.FERNET_PATH = saved
+
+    def rate(counter, timer):
+        count, seconds = metrics.timer_stats(timer)
+        return metrics.counter_value(counter) / 1e6 / seconds if seconds else 0.0
+
+    results = {
+        "workflows_per_s": len(latencies["delete"]) / elapsed,
+        "encrypt_mb_s": rate("file_encrypt_bytes_total", "file_encrypt_seconds"),
+        "decrypt_mb_s": rate("file_decrypt_bytes_total", "file_decrypt_seconds"),
+        "log_insert_rows_s": log_rows_s,
+    }
+    count, seconds = metrics.timer_stats("analysis_seconds")
+    results["analysis_ms_mean"] = seconds / count * 1000 if count else 0.0
+    for name in STEPS:
+        results[f"{name}_ms_p95"] = percentile(latencies[name], 0.95) * 1000
+    return {"results": results, "errors": dict(errors), "metrics": metrics.render()}
+
+
+def higher_is_better(name: str) -> bool:
+    return not name.endswith(("_ms_p95", "_ms_mean"))
+
+
+def compare(results: dict, baseline: dict):
+    """Returns one message per metric that is worse than baseline by more than its tolerance."""
+    regressions = []
+    default = baseline.get("tolerance", DEFAULT_TOLERANCE)
+    for name, entry in baseline["metrics"].items():
+        if name not in results:
+            continue
+        value, expected = results[name], entry["value"]
+        tolerance = entry.get("tolerance", default)
+        if higher_is_better(name):
+            limit = expected * (1 - tolerance)
+            failed = value < limit
+        else:
+            limit = expected * (1 + tolerance)
+            failed = value > limit
+        if failed:
+            regressions.append(f"{name}: {value:,.2f} vs baseline {expected:,.2f} (limit {limit:,.2f})")
+    return regressions
+
+
+def load_baseline(path: str):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, help=f"concurrent virtual users (default: baseline's or {PARAMS['users']})")
+    parser.add_argument("--iterations", type=int, help="workflows per user")
+    parser.add_argument("--size", type=int, help="document size in bytes")
+    parser.add_argument("--log-events", type=int, help="rows for the activity log insert benchmark")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, help="override the baseline's tolerance (0.5 = 50%% worse)")
+    parser.add_argument("--metrics-out", help="write the Prometheus metrics snapshot here")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    # numbers are only comparable under the load the baseline was recorded with
+    params = dict(PARAMS, **(baseline or {}).get("params", {}))
+    for name in PARAMS:
+        if getattr(args, name) is not None:
+            params[name] = getattr(args, name)
+
+    run = run_suite(**params)
+    results = run["results"]
+    print(f"{params['users']} users x {params['iterations']} workflows, {params['size']:,} byte documents")
+    for name, value in results.items():
+        print(f"  {name:>20}: {value:12,.2f}")
+    if run["errors"]:
+        print(f"  errors: {run['errors']}")
+    if args.metrics_out:
+        with open(args.metrics_out, "w", encoding="utf-8") as f:
+            f.write(run["metrics"])
+
+    if args.update_baseline:
+        tolerance = args.tolerance if args.tolerance is not None else DEFAULT_TOLERANCE
+        baseline = {"tolerance": tolerance, "params": params,
+                    "metrics": {name: {"value": round(value, 3)} for name, value in results.items()}}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; record one for this machine with --update-baseline "
+              f"on a known-good build")
+        return 0
+    if args.tolerance is not None:
+        baseline["tolerance"] = args.tolerance
+    regressions = compare(results, baseline)
+    if run["errors"]:
+        regressions.append(f"workflow errors: {run['errors']}")
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print("No regressions against the baseline")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,105 @@
-from sqlalchemy import create_engine
+import os
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool, StaticPool
 
-DATABASE_URL = "sqlite:///./System.db"
+DATABASE_URL = os.getenv("SECURE_AI_DATABASE_URL", "sqlite:///./System.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# single writer, and synchronous=NORMAL is durable under WAL except for the
+# last transactions on power loss.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -20000,
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+}
+
+
+def _is_memory_url(url: str) -> bool:
+    return url.split("?")[0] in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+
+def create_db_engine(url: str = DATABASE_URL, pragmas: dict = None, echo: bool = False, **kwargs):
+    """Creates an engine; SQLite URLs get the pragmas above and a pool suited to SQLite."""
+    if not url.startswith("sqlite"):
+        return create_engine(url, echo=echo, **kwargs)
+
+    settings = dict(SQLITE_PRAGMAS, **(pragmas or {}))
+    connect_args = kwargs.pop("connect_args", {})
+    connect_args.setdefault("check_same_thread", False)
+    connect_args.setdefault("timeout", settings["busy_timeout"] / 1000)
+    if _is_memory_url(url):
+        # one shared connection, otherwise every checkout sees an empty database
+        settings.pop("journal_mode")
+        kwargs.setdefault("poolclass", StaticPool)
+    else:
+        kwargs.setdefault("poolclass", QueuePool)
+        kwargs.setdefault("pool_size", 5)
+        kwargs.setdefault("max_overflow", 10)
+    engine = create_engine(url, echo=echo, connect_args=connect_args, **kwargs)
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in settings.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return engine
+
+
+# the current engine is whatever SessionLocal is bound to; use get_engine() rather than
+# keeping a reference, since configure_database swaps it
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=create_db_engine())
 Base = declarative_base()
+
+
+# callables run on every engine SessionLocal is bound to; see on_engine
+_engine_hooks = []
+
+
+def get_engine():
+    return SessionLocal.kw["bind"]
+
+
+def on_engine(hook):
+    """Calls hook(engine) for the current engine and for each one configure_database creates."""
+    _engine_hooks.append(hook)
+    hook(get_engine())
+    return hook
+
+
+def configure_database(url: str, **kwargs):
+    """Points SessionLocal (and everything built on it) at another database."""
+    old = get_engine()
+    engine = create_db_engine(url, **kwargs)
+    for hook in _engine_hooks:
+        hook(engine)
+    SessionLocal.configure(bind=engine)
+    old.dispose()
+    return engine
+
+
+@contextmanager
+def session_scope(**kwargs):
+    """
+    One unit of work: a fresh session (kwargs go to SessionLocal) that
+    commits on success, rolls back on error and is always closed. Sessions
+    are never shared, so each thread gets its own. Pass
+    expire_on_commit=False to use loaded objects after the block.
+    """
+    db = SessionLocal(**kwargs)
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
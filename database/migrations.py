@@ -0,0 +1,165 @@
+"""
+Versioned schema migrations for the SQLite database.
+
+The schema version is kept in SQLite's `PRAGMA user_version` and bumped after
+each step. Steps must be idempotent: SQLite DDL is not reliably transactional
+through the driver, so an interrupted step is simply re-run, and a fresh
+database gets every table from create_all in step 1 before running the later
+steps against tables that are already current.
+"""
+import logging
+from sqlalchemy import text
+
+from database.db import Base
+
+logger = logging.getLogger(__name__)
+
+
+def _create_tables(conn):
+    Base.metadata.create_all(bind=conn)
+
+
+def _hot_path_indexes(conn):
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_file_records_user_id_uploaded_at ON file_records (user_id, uploaded_at)",
+        "CREATE INDEX IF NOT EXISTS ix_activity_logs_timestamp ON activity_logs (timestamp)",
+        "CREATE INDEX IF NOT EXISTS ix_activity_logs_user_id_timestamp ON activity_logs (user_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS ix_threat_detections_status_detected_at ON threat_detections (status, detected_at)",
+        "CREATE INDEX IF NOT EXISTS ix_notifications_user_id_is_read_created_at ON notifications (user_id, is_read, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_activity_rollups_hourly_user_id_bucket ON activity_rollups_hourly (user_id, bucket)",
+        "CREATE INDEX IF NOT EXISTS ix_activity_rollups_daily_user_id_bucket ON activity_rollups_daily (user_id, bucket)",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def _file_list_pagination(conn):
+    # rows without a name or upload time keep their NULLs; the sort keys of step 6 place them
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_file_records_user_id_filename ON file_records (user_id, filename)"))
+
+
+def _email_outbox(conn):
+    Base.metadata.tables["outbox_emails"].create(bind=conn, checkfirst=True)
+
+
+def _file_metadata_and_usage(conn):
+    from app.storage_usage import rebuild_usage
+    add_column(conn, "file_records", "content_hash", "VARCHAR")
+    for name in ("storage_usage_users", "storage_usage_types"):
+        Base.metadata.tables[name].create(bind=conn, checkfirst=True)
+    # seed the counters from records that already have a size; the rest wait for the backfill
+    rebuild_usage(conn)
+
+
+def _file_list_null_safe_keys(conn):
+    # expression indexes for the coalesce()d sort keys in app.models; the expressions must match exactly
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_file_records_user_id_uploaded_key ON file_records "
+                      "(user_id, coalesce(uploaded_at, '1970-01-01 00:00:00.000000'))"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_file_records_user_id_name_key ON file_records "
+                      "(user_id, coalesce(filename, ''))"))
+
+
+def _activity_log_autoincrement(conn):
+    # without AUTOINCREMENT SQLite hands out ids again once the highest rows are archived,
+    # and the rollup watermark (retention_state) would skip the new rows
+    sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type='table' AND name='activity_logs'")).scalar()
+    if "AUTOINCREMENT" not in sql.upper():
+        old_columns = column_names(conn, "activity_logs")
+        for row in conn.execute(text("PRAGMA index_list(activity_logs)")).all():
+            if row[3] == "c":
+                conn.execute(text(f'DROP INDEX "{row[1]}"'))
+        conn.execute(text("ALTER TABLE activity_logs RENAME TO activity_logs_old"))
+        table = Base.metadata.tables["activity_logs"]
+        table.create(bind=conn)
+        columns = ", ".join(c.name for c in table.columns if c.name in old_columns)
+        conn.execute(text(f"INSERT INTO activity_logs ({columns}) SELECT {columns} FROM activity_logs_old"))
+        conn.execute(text("DROP TABLE activity_logs_old"))
+    # new ids start above both the surviving rows and everything already rolled up
+    high = conn.execute(text(
+        "SELECT max(coalesce((SELECT max(id) FROM activity_logs), 0), "
+        "coalesce((SELECT value FROM retention_state WHERE name = 'activity_rollup_last_id'), 0))")).scalar()
+    if not conn.execute(text("UPDATE sqlite_sequence SET seq = max(seq, :high) WHERE name = 'activity_logs'"),
+                        {"high": high}).rowcount:
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('activity_logs', :high)"), {"high": high})
+
+
+# columns whose updates are logged to row_changes (deletes always are); only what the dashboard shows
+CHANGE_TRACKED_COLUMNS = {
+    "users": ("username", "is_admin", "is_active"),
+    "threat_detections": ("status",),
+}
+# the log keeps this many entries; readers that fall further behind re-check everything
+ROW_CHANGES_KEPT = 10000
+
+
+def _row_change_log(conn):
+    Base.metadata.tables["row_changes"].create(bind=conn, checkfirst=True)
+    for table, columns in CHANGE_TRACKED_COLUMNS.items():
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_updated AFTER UPDATE OF {', '.join(columns)} ON {table} "
+            f"BEGIN INSERT INTO row_changes (table_name, row_id) VALUES ('{table}', NEW.id); END"))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_deleted AFTER DELETE ON {table} "
+            f"BEGIN INSERT INTO row_changes (table_name, row_id) VALUES ('{table}', OLD.id); END"))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS trg_row_changes_prune AFTER INSERT ON row_changes "
+        f"BEGIN DELETE FROM row_changes WHERE seq <= NEW.seq - {ROW_CHANGES_KEPT}; END"))
+
+
+def _outbox_leases(conn):
+    add_column(conn, "outbox_emails", "lease_until", "DATETIME")
+
+
+# (version, description, function(connection)); append new steps, never reorder
+MIGRATIONS = [
+    (1, "create missing tables", _create_tables),
+    (2, "indexes for hot query paths", _hot_path_indexes),
+    (3, "file list pagination", _file_list_pagination),
+    (4, "email outbox", _email_outbox),
+    (5, "file metadata and storage usage counters", _file_metadata_and_usage),
+    (6, "NULL-safe file list sort keys", _file_list_null_safe_keys),
+    (7, "never reuse activity log ids", _activity_log_autoincrement),
+    (8, "row change log for users and threats", _row_change_log),
+    (9, "outbox claim leases", _outbox_leases),
+]
+
+
+def column_names(conn, table: str):
+    return {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+
+
+def add_column(conn, table: str, column: str, ddl: str):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists."""
+    if column not in column_names(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def current_version(engine) -> int:
+    with engine.connect() as conn:
+        return conn.execute(text("PRAGMA user_version")).scalar()
+
+
+def upgrade(engine, target: int = None) -> int:
+    """Applies pending migrations up to target (default: latest); returns the new version."""
+    target = MIGRATIONS[-1][0] if target is None else target
+    version = current_version(engine)
+    for number, description, migrate in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        logger.info(f"Applying migration {number}: {description}")
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(text(f"PRAGMA user_version = {number}"))
+        version = number
+    return version
+
+
+if __name__ == "__main__":
+    import sys
+    import os
+    # ensure project root is on sys.path so `import app...` works when run as a script
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    import app.models  # noqa: F401  registers the tables on Base
+    from database.db import get_engine
+    print(f"Database at schema version {upgrade(get_engine())}")
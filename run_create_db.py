@@ -1,11 +1,10 @@
-from sqlalchemy import create_engine
-from database.db import DATABASE_URL
+from database.db import DATABASE_URL, create_db_engine
 from server.models import Base
 
 def create_database():
     # Replace aiosqlite with sqlite for synchronous
     sync_url = DATABASE_URL.replace("aiosqlite", "sqlite")
-    engine = create_engine(sync_url, echo=True)
+    engine = create_db_engine(sync_url, echo=True)
     Base.metadata.create_all(bind=engine)
     print("Database created successfully.")
 
@@ -0,0 +1,425 @@
+"""
+Local HTTP API for the desktop app's data: authentication, streaming upload
+and download of encrypted files, analysis and admin queries.
+
+    python -m server.api --host 127.0.0.1 --port 8765
+
+Database access goes through async SQLAlchemy (aiosqlite); bcrypt and
+Fernet run on a thread pool and document analysis on a process pool so the
+event loop only ever waits on I/O. Clients authenticate with
+POST /auth/login and send the returned token as "Authorization: Bearer ...".
+"""
+import sys
+import os
+import argparse
+import asyncio
+import logging
+import secrets
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+# ensure project root is on sys.path so imports like `from app...` work when run as a script
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+import bcrypt
+from sqlalchemy import select, delete
+
+from app import file_manager, metrics
+from app.ai_processor import analyze_document
+from app.auth import log_activity
+from app.mailer import start_mail_sender
+from app.models import init_db, User, FileRecord, ActivityLog, ThreatDetection, StorageUsageUser, StorageUsageType
+from app.retention import activity_summary
+from app.scrubber import signing_key, verify_blob
+from app.storage_usage import usage_statements
+from database.db import configure_database
+from server.db import create_async_db_engine, make_async_session_factory
+from server.httpd import HTTPServer, HTTPError, Router, Response, json_response
+
+logger = logging.getLogger(__name__)
+
+TOKEN_TTL = int(os.getenv("SECURE_AI_API_TOKEN_TTL", 12 * 3600))
+MAX_UPLOAD_BYTES = int(os.getenv("SECURE_AI_API_MAX_UPLOAD", 100 * 1024 * 1024))
+PAGE_LIMIT = 500
+DOWNLOAD_CHUNK = 64 * 1024
+
+
+def _init_worker(storage_dir: str, fernet_path: str):
+    # worker processes may be spawned rather than forked; carry over path overrides
+    file_manager.STORAGE_DIR = storage_dir
+    file_manager.FERNET_PATH = fernet_path
+
+
+def _analyze_stored(storage_name: str):
+    text = file_manager.load_decrypted_file(storage_name).decode("utf-8", errors="ignore")
+    return analyze_document(text)
+
+
+def _verify_stored(path: str):
+    """HMAC check of a stored token without decrypting it; returns None or the reason it failed."""
+    return verify_blob(path, signing_key())[1]
+
+
+def _check_password(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+def _save_spooled(user_id: int, filename: str, spool):
+    spool.seek(0)
+    chunks = iter(lambda: spool.read(file_manager.CHUNK_SIZE), b"")
+    return file_manager.save_encrypted_stream(str(user_id), filename, chunks)
+
+
+def _remove_blob(storage_name: str):
+    path = os.path.join(file_manager.STORAGE_DIR, storage_name)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _limit(request, default: int = 100) -> int:
+    try:
+        return max(1, min(int(request.query.get("limit", default)), PAGE_LIMIT))
+    except ValueError:
+        raise HTTPError(400, "limit must be an integer")
+
+
+def _int_param(request, name: str, default: int = None):
+    value = request.query.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPError(400, f"{name} must be an integer")
+
+
+def _file_json(r):
+    return {"id": r.id, "filename": r.filename, "uploaded_at": r.uploaded_at.isoformat() if r.uploaded_at else None,
+            "file_size": r.file_size, "file_type": r.file_type, "content_hash": r.content_hash}
+
+
+class ApiService:
+    """Holds the async engine, session tokens and executors behind the routes."""
+
+    def __init__(self, database_url: str = None, crypto_workers: int = 4, analysis_workers: int = None):
+        self.engine = create_async_db_engine(database_url)
+        metrics.instrument_engine(self.engine.sync_engine)
+        self.Session = make_async_session_factory(self.engine)
+        self.tokens = {}
+        self.crypto_pool = ThreadPoolExecutor(max_workers=crypto_workers, thread_name_prefix="api-crypto")
+        self.analysis_workers = analysis_workers
+        self.analysis_pool = None
+        self.router = Router()
+        self._add_routes()
+
+    def _add_routes(self):
+        r = self.router
+        r.add("POST", "/auth/login", self.login)
+        r.add("POST", "/auth/logout", self.logout)
+        r.add("GET", "/files", self.list_files)
+        r.add("POST", "/files", self.upload_file)
+        r.add("GET", "/files/{file_id}", self.download_file)
+        r.add("DELETE", "/files/{file_id}", self.delete_file)
+        r.add("POST", "/files/{file_id}/analyze", self.analyze_file)
+        r.add("GET", "/admin/users", self.admin_users)
+        r.add("GET", "/admin/logs", self.admin_logs)
+        r.add("GET", "/admin/threats", self.admin_threats)
+        r.add("GET", "/admin/activity-summary", self.admin_activity_summary)
+        r.add("GET", "/admin/storage-usage", self.admin_storage_usage)
+        r.add("GET", "/admin/metrics", self.admin_metrics)
+
+    async def run_crypto(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.crypto_pool, fn, *args)
+
+    async def run_analysis(self, fn, *args):
+        if self.analysis_pool is None:
+            # created lazily so the key exists before workers start and idle servers stay light
+            file_manager.get_or_create_fernet()
+            self.analysis_pool = ProcessPoolExecutor(max_workers=self.analysis_workers, initializer=_init_worker,
+                                                     initargs=(file_manager.STORAGE_DIR, file_manager.FERNET_PATH))
+        return await asyncio.get_running_loop().run_in_executor(self.analysis_pool, fn, *args)
+
+    async def close(self):
+        self.crypto_pool.shutdown(wait=True)
+        if self.analysis_pool is not None:
+            self.analysis_pool.shutdown(wait=True)
+        await self.engine.dispose()
+
+    # -- auth --
+
+    def current_user(self, request, admin: bool = False):
+        header = request.headers.get("authorization", "")
+        token = header[7:].strip() if header.lower().startswith("bearer ") else ""
+        session = self.tokens.get(token)
+        if session is None or session["expires"] < time.monotonic():
+            self.tokens.pop(token, None)
+            raise HTTPError(401, "missing or expired token")
+        if admin and not session["is_admin"]:
+            raise HTTPError(403, "admin only")
+        return session
+
+    def _purge_expired_tokens(self):
+        now = time.monotonic()
+        self.tokens = {t: s for t, s in self.tokens.items() if s["expires"] >= now}
+
+    async def login(self, request):
+        body = await request.json()
+        username, password = body.get("username", ""), body.get("password", "")
+        async with self.Session() as db:
+            user = (await db.execute(select(User).where(User.username == username))).scalar_one_or_none()
+            ok = user is not None and user.is_active is not False and \
+                await self.run_crypto(_check_password, password, user.hashed_password)
+            if not ok:
+                log_activity(None, "failed_login", f"Failed API login attempt for {username}")
+                raise HTTPError(401, "invalid credentials")
+            user.last_login = datetime.utcnow()
+            await db.commit()
+        token = secrets.token_urlsafe(32)
+        self._purge_expired_tokens()
+        self.tokens[token] = {"user_id": user.id, "username": user.username, "is_admin": bool(user.is_admin),
+                              "expires": time.monotonic() + TOKEN_TTL}
+        log_activity(user.id, "login", "User logged in (API)")
+        return json_response({"token": token, "expires_in": TOKEN_TTL, "is_admin": bool(user.is_admin)})
+
+    async def logout(self, request):
+        session = self.current_user(request)
+        self.tokens = {t: s for t, s in self.tokens.items() if s is not session}
+        log_activity(session["user_id"], "logout", "User logged out (API)")
+        return Response(204)
+
+    # -- files --
+
+    async def _owned_record(self, db, request, session):
+        try:
+            file_id = int(request.params["file_id"])
+        except ValueError:
+            raise HTTPError(404)
+        record = (await db.execute(
+            select(FileRecord).where(FileRecord.id == file_id, FileRecord.user_id == session["user_id"])
+        )).scalar_one_or_none()
+        if record is None:
+            raise HTTPError(404, "file not found")
+        return record
+
+    async def list_files(self, request):
+        session = self.current_user(request)
+        after_id = _int_param(request, "after_id", 0)
+        limit = _limit(request)
+        async with self.Session() as db:
+            rows = (await db.execute(
+                select(FileRecord.id, FileRecord.filename, FileRecord.uploaded_at, FileRecord.file_size, FileRecord.file_type,
+                       FileRecord.content_hash)
+                .where(FileRecord.user_id == session["user_id"], FileRecord.id > after_id)
+                .order_by(FileRecord.id).limit(limit)
+            )).all()
+        next_after = rows[-1].id if len(rows) == limit else None
+        return json_response({"files": [_file_json(r) for r in rows], "next_after_id": next_after})
+
+    async def upload_file(self, request):
+        session = self.current_user(request)
+        filename = os.path.basename(request.query.get("filename", "").replace("\\", "/"))
+        if not filename:
+            raise HTTPError(400, "filename query parameter is required")
+        if "content-length" not in request.headers and "transfer-encoding" not in request.headers:
+            raise HTTPError(411)
+        # small uploads stay in memory, large ones spill to disk while the body streams in
+        # size, type and hash are computed as the body streams in
+        digest = file_manager.ContentDigest()
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as spool:
+            async for chunk in request.stream():
+                digest.update(chunk)
+                if digest.size > MAX_UPLOAD_BYTES:
+                    raise HTTPError(413, f"upload exceeds {MAX_UPLOAD_BYTES} bytes")
+                # a spilled spool writes to disk, so keep it off the event loop
+                await asyncio.to_thread(spool.write, chunk)
+            storage_name = await self.run_crypto(_save_spooled, session["user_id"], filename, spool)
+        metadata = digest.metadata(filename)
+        try:
+            async with self.Session() as db:
+                record = FileRecord(filename=filename, user_id=session["user_id"], storage_name=storage_name,
+                                    uploaded_at=datetime.utcnow(), **metadata)
+                db.add(record)
+                for stmt, params in usage_statements([(session["user_id"], record.file_type, record.file_size, +1)]):
+                    await db.execute(stmt, params)
+                await db.commit()
+        except Exception:
+            # don't leave an unreferenced blob behind
+            await asyncio.to_thread(_remove_blob, storage_name)
+            raise
+        log_activity(session["user_id"], "file_upload", f"Uploaded file: {filename}")
+        return json_response(_file_json(record), 201)
+
+    async def download_file(self, request):
+        session = self.current_user(request)
+        async with self.Session() as db:
+            record = await self._owned_record(db, request, session)
+        path = os.path.join(file_manager.STORAGE_DIR, record.storage_name)
+        # decrypt_stream only checks the tag at the end, after the 200 and the first bytes are
+        # sent, so the whole token is authenticated first in one cheap pass over the ciphertext
+        try:
+            problem = await self.run_crypto(_verify_stored, path)
+        except FileNotFoundError:
+            raise HTTPError(404, "stored blob is missing")
+        if problem:
+            logger.error(f"Refusing download of {record.storage_name}: {problem}")
+            raise HTTPError(500, "stored file failed its integrity check")
+
+        async def body():
+            # plaintext is pulled a piece at a time on the crypto pool, so at most one
+            # DOWNLOAD_CHUNK of ciphertext and its plaintext are held per download
+            with open(path, "rb") as f:
+                pieces = file_manager.iter_decrypted(iter(lambda: f.read(DOWNLOAD_CHUNK), b""))
+                while True:
+                    piece = await self.run_crypto(next, pieces, None)
+                    if piece is None:
+                        break
+                    yield piece
+
+        log_activity(session["user_id"], "file_download", f"Downloaded file: {record.filename}")
+        safe_name = record.filename.replace('"', "")
+        return Response(200, headers={"Content-Type": "application/octet-stream",
+                                      "Content-Disposition": f'attachment; filename="{safe_name}"'}, stream=body())
+
+    async def delete_file(self, request):
+        session = self.current_user(request)
+        async with self.Session() as db:
+            record = await self._owned_record(db, request, session)
+            await db.execute(delete(FileRecord).where(FileRecord.id == record.id))
+            for stmt, params in usage_statements([(record.user_id, record.file_type, record.file_size, -1)]):
+                await db.execute(stmt, params)
+            await db.commit()
+        await asyncio.to_thread(_remove_blob, record.storage_name)
+        log_activity(session["user_id"], "file_delete", f"Deleted file: {record.filename}")
+        return Response(204)
+
+    async def analyze_file(self, request):
+        session = self.current_user(request)
+        async with self.Session() as db:
+            record = await self._owned_record(db, request, session)
+        try:
+            result = await self.run_analysis(_analyze_stored, record.storage_name)
+        except FileNotFoundError:
+            raise HTTPError(404, "stored blob is missing")
+        log_activity(session["user_id"], "file_process", f"Processed file: {record.filename}")
+        return json_response({"id": record.id, "filename": record.filename, **result})
+
+    # -- admin --
+
+    async def admin_users(self, request):
+        self.current_user(request, admin=True)
+        async with self.Session() as db:
+            rows = (await db.execute(
+                select(User.id, User.username, User.email, User.is_admin, User.is_active, User.created_at, User.last_login)
+                .order_by(User.username)
+            )).all()
+        return json_response({"users": [dict(r._mapping) for r in rows]})
+
+    async def admin_logs(self, request):
+        self.current_user(request, admin=True)
+        before_id = _int_param(request, "before_id")
+        user_id = _int_param(request, "user_id")
+        limit = _limit(request)
+        query = select(ActivityLog.id, ActivityLog.user_id, ActivityLog.action, ActivityLog.timestamp, ActivityLog.details)
+        if before_id is not None:
+            query = query.where(ActivityLog.id < before_id)
+        if user_id is not None:
+            query = query.where(ActivityLog.user_id == user_id)
+        async with self.Session() as db:
+            rows = (await db.execute(query.order_by(ActivityLog.id.desc()).limit(limit))).all()
+        next_before = rows[-1].id if len(rows) == limit else None
+        return json_response({"logs": [dict(r._mapping) for r in rows], "next_before_id": next_before})
+
+    async def admin_threats(self, request):
+        self.current_user(request, admin=True)
+        status = request.query.get("status", "active")
+        async with self.Session() as db:
+            rows = (await db.execute(
+                select(ThreatDetection.id, ThreatDetection.file_id, ThreatDetection.threat_type,
+                       ThreatDetection.confidence, ThreatDetection.detected_at, ThreatDetection.status)
+                .where(ThreatDetection.status == status)
+                .order_by(ThreatDetection.detected_at.desc()).limit(_limit(request))
+            )).all()
+        return json_response({"threats": [dict(r._mapping) for r in rows]})
+
+    async def admin_activity_summary(self, request):
+        self.current_user(request, admin=True)
+        try:
+            start = datetime.fromisoformat(request.query["start"]) if "start" in request.query else None
+            end = datetime.fromisoformat(request.query["end"]) if "end" in request.query else None
+        except ValueError:
+            raise HTTPError(400, "start/end must be ISO dates")
+        granularity = request.query.get("granularity", "daily")
+        # the rollup query lives in app.retention; it is small and indexed, so a thread is enough
+        rows = await asyncio.to_thread(activity_summary, start, end, granularity, _int_param(request, "user_id"))
+        return json_response({"granularity": granularity, "rows": [
+            {"bucket": r.bucket, "user_id": r.user_id, "action": r.action, "count": r.count} for r in rows
+        ]})
+
+    async def admin_storage_usage(self, request):
+        self.current_user(request, admin=True)
+        # one row per user and per type from the counters kept by uploads and deletes
+        async with self.Session() as db:
+            users = (await db.execute(
+                select(StorageUsageUser.user_id, User.username, StorageUsageUser.file_count, StorageUsageUser.total_bytes)
+                .outerjoin(User, User.id == StorageUsageUser.user_id)
+                .where(StorageUsageUser.file_count > 0)
+                .order_by(StorageUsageUser.total_bytes.desc())
+            )).all()
+            types = (await db.execute(
+                select(StorageUsageType.file_type, StorageUsageType.file_count, StorageUsageType.total_bytes)
+                .where(StorageUsageType.file_count > 0)
+                .order_by(StorageUsageType.total_bytes.desc())
+            )).all()
+        return json_response({"users": [dict(r._mapping) for r in users], "types": [dict(r._mapping) for r in types]})
+
+    async def admin_metrics(self, request):
+        self.current_user(request, admin=True)
+        # counters and timers of this process in the Prometheus text format
+        return Response(200, metrics.render().encode("utf-8"), {"Content-Type": "text/plain; version=0.0.4"})
+
+
+async def serve(host: str, port: int, service: ApiService, ready=None):
+    server = HTTPServer(service.router)
+    port = await server.start(host, port)
+    logger.info(f"API listening on http://{host}:{port}")
+    if ready is not None:
+        ready(port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+        await service.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m server.api", description="Secure AI App local HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db", help="database URL (default: SECURE_AI_DATABASE_URL or ./System.db)")
+    parser.add_argument("--storage-dir", help="encrypted blob directory (default: storage/)")
+    parser.add_argument("--analysis-workers", type=int, default=None, help="analysis processes (default: CPU count)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.db:
+        configure_database(args.db)
+    if args.storage_dir:
+        file_manager.STORAGE_DIR = os.path.abspath(args.storage_dir)
+    init_db()
+    start_mail_sender()
+    service = ApiService(analysis_workers=args.analysis_workers)
+    try:
+        asyncio.run(serve(args.host, args.port, service))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
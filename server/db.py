@@ -0,0 +1,37 @@
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from database.db import SQLITE_PRAGMAS, get_engine
+
+
+def async_url(url: str) -> str:
+    """Maps a sync SQLite URL (sqlite:///...) onto the aiosqlite driver."""
+    if url.startswith("sqlite+aiosqlite"):
+        return url
+    if url.startswith("sqlite"):
+        return "sqlite+aiosqlite" + url[url.index(":"):]
+    return url
+
+
+def create_async_db_engine(url: str = None, pragmas: dict = None, **kwargs):
+    """Async counterpart of database.db.create_db_engine; defaults to the configured database."""
+    url = async_url(url or get_engine().url.render_as_string(hide_password=False))
+    engine = create_async_engine(url, **kwargs)
+    if url.startswith("sqlite"):
+        settings = dict(SQLITE_PRAGMAS, **(pragmas or {}))
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for name, value in settings.items():
+                    cursor.execute(f"PRAGMA {name}={value}")
+            finally:
+                cursor.close()
+
+    return engine
+
+
+def make_async_session_factory(engine):
+    return sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
@@ -0,0 +1,260 @@
+"""
+A small HTTP/1.1 server on asyncio streams: keep-alive, streamed request
+bodies (Content-Length or chunked) and streamed chunked responses. It only
+implements what the local API needs and is not meant to face the internet.
+"""
+import asyncio
+import json
+import logging
+import re
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+logger = logging.getLogger(__name__)
+
+MAX_LINE = 8192
+MAX_HEADERS = 100
+CHUNK_SIZE = 64 * 1024
+
+REASONS = {
+    200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 401: "Unauthorized",
+    403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required",
+    413: "Payload Too Large", 500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str = None):
+        super().__init__(message or REASONS.get(status, ""))
+        self.status = status
+        self.message = message or REASONS.get(status, "")
+
+
+def _content_length(headers) -> int:
+    value = headers.get("content-length", "").strip() or "0"
+    if not (value.isascii() and value.isdigit()):
+        raise HTTPError(400, "invalid Content-Length")
+    return int(value)
+
+
+async def _readline(reader) -> bytes:
+    try:
+        line = await reader.readline()
+    except ValueError:
+        # the stream's limit was hit before a newline
+        raise HTTPError(400, "line too long")
+    if len(line) > MAX_LINE:
+        raise HTTPError(400, "line too long")
+    return line
+
+
+class Request:
+    def __init__(self, method, target, version, headers, reader):
+        self.method = method
+        parts = urlsplit(target)
+        self.path = unquote(parts.path)
+        self.query = dict(parse_qsl(parts.query))
+        self.version = version
+        self.headers = headers
+        self.params = {}
+        self.state = {}
+        self._reader = reader
+        self._chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        self._remaining = _content_length(headers)
+        self._chunk_left = 0
+        self._done = not self._chunked and self._remaining == 0
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    async def stream(self, chunk_size: int = CHUNK_SIZE):
+        """Yields the request body in chunks as it arrives."""
+        while not self._done:
+            if self._chunked:
+                if self._chunk_left == 0:
+                    size_line = await _readline(self._reader)
+                    try:
+                        self._chunk_left = int(size_line.split(b";")[0].strip() or b"0", 16)
+                    except ValueError:
+                        raise HTTPError(400, "invalid chunk size")
+                    if self._chunk_left < 0:
+                        raise HTTPError(400, "invalid chunk size")
+                    if self._chunk_left == 0:
+                        # trailers end with an empty line
+                        while (await _readline(self._reader)) not in (b"\r\n", b"\n", b""):
+                            pass
+                        self._done = True
+                        return
+                data = await self._reader.read(min(chunk_size, self._chunk_left))
+                if not data:
+                    raise HTTPError(400, "truncated body")
+                self._chunk_left -= len(data)
+                if self._chunk_left == 0:
+                    await _readline(self._reader)
+                yield data
+            else:
+                data = await self._reader.read(min(chunk_size, self._remaining))
+                if not data:
+                    raise HTTPError(400, "truncated body")
+                self._remaining -= len(data)
+                self._done = self._remaining == 0
+                yield data
+
+    async def body(self, limit: int = 1024 * 1024) -> bytes:
+        parts, size = [], 0
+        async for chunk in self.stream():
+            size += len(chunk)
+            if size > limit:
+                raise HTTPError(413)
+            parts.append(chunk)
+        return b"".join(parts)
+
+    async def json(self, limit: int = 1024 * 1024):
+        try:
+            return json.loads(await self.body(limit) or b"{}")
+        except ValueError:
+            raise HTTPError(400, "invalid JSON body")
+
+    async def discard(self):
+        async for _ in self.stream():
+            pass
+
+
+class Response:
+    def __init__(self, status: int = 200, body: bytes = b"", headers: dict = None, stream=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+        self.stream = stream
+
+
+def json_response(obj, status: int = 200):
+    return Response(status, json.dumps(obj, default=str).encode("utf-8"), {"Content-Type": "application/json"})
+
+
+class Router:
+    def __init__(self):
+        self.routes = []
+
+    def add(self, method: str, pattern: str, handler):
+        regex = re.compile("^" + re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", pattern) + "$")
+        self.routes.append((method, regex, handler))
+
+    def route(self, method: str, pattern: str):
+        def decorator(handler):
+            self.add(method, pattern, handler)
+            return handler
+        return decorator
+
+    def resolve(self, method: str, path: str):
+        allowed = False
+        for route_method, regex, handler in self.routes:
+            match = regex.match(path)
+            if match:
+                if route_method == method:
+                    return handler, match.groupdict()
+                allowed = True
+        raise HTTPError(405 if allowed else 404)
+
+
+class HTTPServer:
+    def __init__(self, router: Router):
+        self.router = router
+        self.server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        self.server = await asyncio.start_server(self._handle, host, port, limit=MAX_LINE * 2)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _read_request(self, reader):
+        line = await _readline(reader)
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+        headers = {}
+        for _ in range(MAX_HEADERS + 1):
+            raw = await _readline(reader)
+            if raw in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = raw.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HTTPError(400, "too many headers")
+        return Request(method.upper(), target, version, headers, reader)
+
+    async def _write_response(self, writer, request, response: Response):
+        keep_alive = request is not None and request.keep_alive
+        headers = dict(response.headers)
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+        if response.stream is not None:
+            headers["Transfer-Encoding"] = "chunked"
+        else:
+            headers["Content-Length"] = str(len(response.body))
+        head = f"HTTP/1.1 {response.status} {REASONS.get(response.status, '')}\r\n"
+        head += "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+        writer.write(head.encode("latin-1"))
+        if response.stream is not None:
+            async for chunk in response.stream:
+                if chunk:
+                    writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                    # back-pressure: wait for the socket buffer to drain
+                    await writer.drain()
+            writer.write(b"0\r\n\r\n")
+        else:
+            writer.write(response.body)
+        await writer.drain()
+        return keep_alive
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request = None
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    handler, params = self.router.resolve(request.method, request.path)
+                    request.params = params
+                    response = await handler(request)
+                    await request.discard()
+                except HTTPError as e:
+                    response = json_response({"error": e.message}, e.status)
+                    if request is not None and not request._done:
+                        # unread body left on the wire: don't try to reuse the connection
+                        request.headers["connection"] = "close"
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                except Exception as e:
+                    logger.exception(f"Unhandled error for {request.method if request else '?'} {request.path if request else '?'}: {e}")
+                    response = json_response({"error": "internal error"}, 500)
+                    if request is not None:
+                        request.headers["connection"] = "close"
+                try:
+                    keep_alive = await self._write_response(writer, request, response)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                except Exception as e:
+                    # the status line is already out, so all that is left is to drop the connection
+                    logger.exception(f"Error writing response for {request.method if request else '?'} {request.path if request else '?'}: {e}")
+                    break
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
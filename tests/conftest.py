@@ -0,0 +1,17 @@
+import sys
+import pathlib
+# ensure project root is first on sys.path so `import app...` uses this project's src
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import pytest
+from database.db import DATABASE_URL, configure_database
+
+
+@pytest.fixture(autouse=True)
+def isolated_database(tmp_path):
+    # every test gets its own SQLite file instead of the project's System.db
+    from app.activity_log import flush_activity_log
+    engine = configure_database(f"sqlite:///{tmp_path / 'test.db'}")
+    yield engine
+    flush_activity_log(timeout=5)
+    configure_database(DATABASE_URL)
@@ -0,0 +1,83 @@
+import sys
+import pathlib
+# ensure project root is first on sys.path so `import app...` uses this project's src
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, ActivityLog
+from app.activity_log import ActivityLogWriter
+
+
+def make_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'log.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def count_logs(factory):
+    db = factory()
+    try:
+        return db.query(ActivityLog).count()
+    finally:
+        db.close()
+
+
+def test_writer_batches_by_size(tmp_path):
+    factory = make_factory(tmp_path)
+    writer = ActivityLogWriter(session_factory=factory, batch_size=100, flush_interval=60)
+    batches = []
+    write = writer._write
+    writer._write = lambda rows: (batches.append(len(rows)), write(rows))
+    for i in range(250):
+        writer.submit(1, "file_upload", f"upload {i}")
+    assert writer.flush(timeout=5)
+    assert count_logs(factory) == 250
+    # the first two batches fill up before the flush marker arrives
+    assert batches[:2] == [100, 100]
+    writer.close()
+
+
+def test_writer_flushes_on_interval_and_close(tmp_path):
+    factory = make_factory(tmp_path)
+    writer = ActivityLogWriter(session_factory=factory, batch_size=1000, flush_interval=0.05)
+    writer.submit(None, "failed_login", "Failed login attempt for user bob")
+    deadline = time.monotonic() + 5
+    while count_logs(factory) == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert count_logs(factory) == 1
+
+    writer.flush_interval = 60
+    for i in range(10):
+        writer.submit(2, "login", "User logged in")
+    writer.close()
+    assert count_logs(factory) == 11
+
+    # rows submitted after shutdown are written inline
+    writer.submit(2, "logout", "")
+    assert count_logs(factory) == 12
+
+
+def test_writer_retries_a_failed_batch(tmp_path, monkeypatch):
+    from app import activity_log
+    monkeypatch.setattr(activity_log, "RETRY_DELAY", 0.01)
+    factory = make_factory(tmp_path)
+    update_rollups = activity_log.update_rollups
+    failures = []
+
+    def flaky_rollups(db):
+        if not failures:
+            failures.append(True)
+            raise OperationalError("UPDATE activity_rollups", {}, Exception("database is locked"))
+        return update_rollups(db)
+    monkeypatch.setattr(activity_log, "update_rollups", flaky_rollups)
+
+    writer = ActivityLogWriter(session_factory=factory, batch_size=1000, flush_interval=60)
+    for i in range(5):
+        writer.submit(1, "login", f"attempt {i}")
+    assert writer.flush(timeout=5)
+    writer.close()
+    assert failures == [True]
+    assert count_logs(factory) == 5
@@ -0,0 +1,242 @@
+import sys
+import pathlib
+# ensure project root is first on sys.path so `import app...` uses this project's src
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import asyncio
+import http.client
+import json
+import socket
+import threading
+import pytest
+from app import file_manager
+from app.auth import register_user
+from app.models import init_db, SessionLocal, FileRecord
+from server import api as api_module
+from server.api import ApiService
+from server.httpd import HTTPServer, Router, Response
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_manager, "STORAGE_DIR", str(tmp_path / "storage"))
+    monkeypatch.setattr(file_manager, "FERNET_PATH", str(tmp_path / "fernet.key"))
+    init_db()
+    assert register_user("alice", "pw12345")[0]
+    assert register_user("root", "pw12345", is_admin=True)[0]
+    return ApiService(analysis_workers=1)
+
+
+@pytest.fixture
+def api(service):
+    loop = asyncio.new_event_loop()
+    server = HTTPServer(service.router)
+    port = loop.run_until_complete(server.start("127.0.0.1", 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield port
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(5)
+    asyncio.run_coroutine_threadsafe(service.close(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def call(conn, method, path, body=None, token=None, headers=None):
+    headers = dict(headers or {})
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    if isinstance(body, dict):
+        body = json.dumps(body).encode()
+        headers["Content-Type"] = "application/json"
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    data = response.read()
+    if response.getheader("Content-Type") == "application/json":
+        data = json.loads(data)
+    return response.status, data
+
+
+def login(conn, username):
+    status, body = call(conn, "POST", "/auth/login", {"username": username, "password": "pw12345"})
+    assert status == 200
+    return body["token"]
+
+
+def test_file_round_trip(api):
+    conn = http.client.HTTPConnection("127.0.0.1", api, timeout=30)
+    assert call(conn, "GET", "/files")[0] == 401
+    assert call(conn, "POST", "/auth/login", {"username": "alice", "password": "nope"})[0] == 401
+    token = login(conn, "alice")
+
+    payload = ("Great news today. The results were good and customers were happy. " * 3000).encode()
+    status, record = call(conn, "POST", "/files?filename=report.txt", payload, token)
+    assert status == 201 and record["file_size"] == len(payload) and record["file_type"] == "text/plain"
+
+    # chunked request bodies are accepted too, on the same keep-alive connection
+    conn.putrequest("POST", "/files?filename=chunked.txt")
+    conn.putheader("Authorization", f"Bearer {token}")
+    conn.putheader("Transfer-Encoding", "chunked")
+    conn.endheaders()
+    for part in (b"hello ", b"chunked ", b"world"):
+        conn.send(f"{len(part):x}\r\n".encode() + part + b"\r\n")
+    conn.send(b"0\r\n\r\n")
+    response = conn.getresponse()
+    assert response.status == 201
+    chunked_id = json.loads(response.read())["id"]
+
+    status, listing = call(conn, "GET", "/files?limit=1", token=token)
+    assert [f["filename"] for f in listing["files"]] == ["report.txt"]
+    status, listing = call(conn, "GET", f"/files?after_id={listing['next_after_id']}", token=token)
+    assert [f["filename"] for f in listing["files"]] == ["chunked.txt"]
+
+    assert call(conn, "GET", f"/files/{record['id']}", token=token) == (200, payload)
+    assert call(conn, "GET", f"/files/{chunked_id}", token=token) == (200, b"hello chunked world")
+
+    status, analysis = call(conn, "POST", f"/files/{record['id']}/analyze", token=token)
+    assert status == 200 and analysis["sentiment"] == "Positive"
+
+    assert call(conn, "DELETE", f"/files/{chunked_id}", token=token)[0] == 204
+    assert call(conn, "GET", f"/files/{chunked_id}", token=token)[0] == 404
+    assert len(list(pathlib.Path(file_manager.STORAGE_DIR).glob("*.enc"))) == 1
+
+
+def test_admin_endpoints_require_admin(api):
+    conn = http.client.HTTPConnection("127.0.0.1", api, timeout=30)
+    user_token = login(conn, "alice")
+    assert call(conn, "GET", "/admin/users", token=user_token)[0] == 403
+
+    admin_token = login(conn, "root")
+    status, body = call(conn, "GET", "/admin/users", token=admin_token)
+    assert status == 200 and [u["username"] for u in body["users"]] == ["alice", "root"]
+
+    from app.activity_log import flush_activity_log
+    flush_activity_log(timeout=5)
+    status, body = call(conn, "GET", "/admin/logs?limit=10", token=admin_token)
+    assert status == 200 and {"login"} <= {row["action"] for row in body["logs"]}
+    assert call(conn, "GET", "/admin/activity-summary", token=admin_token)[0] == 200
+    assert call(conn, "GET", "/admin/threats", token=admin_token)[0] == 200
+    assert call(conn, "GET", "/admin/storage-usage", token=admin_token) == (200, {"users": [], "types": []})
+    status, body = call(conn, "GET", "/admin/metrics", token=admin_token)
+    assert status == 200 and b"# TYPE secure_ai_db_statement_seconds histogram" in body
+
+    assert call(conn, "POST", "/auth/logout", token=admin_token)[0] == 204
+    assert call(conn, "GET", "/admin/users", token=admin_token)[0] == 401
+
+
+def raw_request(port, data: bytes) -> bytes:
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+        sock.sendall(data)
+        received = b""
+        while True:
+            part = sock.recv(65536)
+            if not part:
+                return received
+            received += part
+
+
+def test_malformed_requests_get_400(api):
+    conn = http.client.HTTPConnection("127.0.0.1", api, timeout=30)
+    token = login(conn, "alice")
+    auth = f"Authorization: Bearer {token}\r\n".encode()
+    bad = [
+        b"POST /files?filename=a.txt HTTP/1.1\r\n" + auth + b"Content-Length: ten\r\n\r\n",
+        b"POST /files?filename=a.txt HTTP/1.1\r\n" + auth + b"Content-Length: -5\r\n\r\n",
+        b"POST /files?filename=a.txt HTTP/1.1\r\n" + auth + b"Transfer-Encoding: chunked\r\n\r\nzz\r\nhello\r\n0\r\n\r\n",
+        b"GET /files HTTP/1.1\r\nX-Long: " + b"a" * 20000 + b"\r\n\r\n",
+    ]
+    for data in bad:
+        assert raw_request(api, data).startswith(b"HTTP/1.1 400 "), data[:60]
+    assert list(pathlib.Path(file_manager.STORAGE_DIR).glob("*.enc")) == []
+
+
+def test_failing_response_stream_closes_connection():
+    router = Router()
+
+    async def broken(request):
+        async def body():
+            yield b"partial"
+            raise RuntimeError("disk went away")
+        return Response(200, stream=body())
+    router.add("GET", "/broken", broken)
+
+    loop = asyncio.new_event_loop()
+    server = HTTPServer(router)
+    port = loop.run_until_complete(server.start("127.0.0.1", 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        # recv returns once the server closes the socket instead of hanging on keep-alive
+        data = raw_request(port, b"GET /broken HTTP/1.1\r\n\r\n")
+        assert data.startswith(b"HTTP/1.1 200 ") and b"partial" in data and not data.endswith(b"0\r\n\r\n")
+    finally:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
+
+
+def test_expired_tokens_are_evicted_on_login(service, api, monkeypatch):
+    conn = http.client.HTTPConnection("127.0.0.1", api, timeout=30)
+    monkeypatch.setattr(api_module, "TOKEN_TTL", -1)
+    stale = login(conn, "alice")
+    monkeypatch.setattr(api_module, "TOKEN_TTL", 3600)
+    fresh = login(conn, "alice")
+    assert stale not in service.tokens and fresh in service.tokens
+
+
+def test_download_is_verified_then_streamed_in_chunks(api, monkeypatch):
+    def whole_file(storage_name):
+        raise AssertionError("download must not decrypt the whole file at once")
+
+    monkeypatch.setattr(file_manager, "load_decrypted_file", whole_file)
+    conn = http.client.HTTPConnection("127.0.0.1", api, timeout=30)
+    token = login(conn, "alice")
+    payload = bytes(range(256)) * 4096  # 1 MiB
+    status, record = call(conn, "POST", "/files?filename=big.bin", payload, token)
+    assert status == 201
+
+    response = raw_request(api, f"GET /files/{record['id']} HTTP/1.1\r\nHost: x\r\n"
+                                f"Authorization: Bearer {token}\r\nConnection: close\r\n\r\n".encode())
+    head, _, rest = response.partition(b"\r\n\r\n")
+    assert b"Transfer-Encoding: chunked" in head
+    sizes, body = [], b""
+    while True:
+        line, _, rest = rest.partition(b"\r\n")
+        size = int(line, 16)
+        if not size:
+            break
+        sizes.append(size)
+        body, rest = body + rest[:size], rest[size + 2:]
+    assert body == payload
+    assert len(sizes) > 8 and max(sizes) <= api_module.DOWNLOAD_CHUNK
+
+    # a blob whose tag does not match is refused before any plaintext goes out
+    db = SessionLocal()
+    storage_name = db.get(FileRecord, record["id"]).storage_name
+    db.close()
+    path = pathlib.Path(file_manager.STORAGE_DIR) / storage_name
+    token_bytes = bytearray(path.read_bytes())
+    token_bytes[-10] = ord("A") if token_bytes[-10] != ord("A") else ord("B")
+    path.write_bytes(bytes(token_bytes))
+    assert call(conn, "GET", f"/files/{record['id']}", token=token)[0] == 500
+
+
+def test_streamed_tokens_are_standard_fernet(tmp_path, monkeypatch):
+    from cryptography.fernet import InvalidToken
+    monkeypatch.setattr(file_manager, "FERNET_PATH", str(tmp_path / "fernet.key"))
+    fernet = file_manager.get_or_create_fernet()
+    payload = bytes(range(256)) * 1000 + b"tail"
+    parts = []
+    assert file_manager.encrypt_stream((payload[i:i + 4099] for i in range(0, len(payload), 4099)), parts.append) == len(payload)
+    token = b"".join(parts)
+    assert fernet.decrypt(token) == payload
+
+    for source in (token, fernet.encrypt(payload)):
+        out = []
+        file_manager.decrypt_stream((source[i:i + 1000] for i in range(0, len(source), 1000)), out.append)
+        assert b"".join(out) == payload
+    tampered = bytearray(token)
+    tampered[len(token) // 2] ^= 1
+    with pytest.raises(InvalidToken):
+        file_manager.decrypt_stream([bytes(tampered)], lambda data: None)
@@ -6,7 +6,7 @@ sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
 import os
 import tempfile
 from app.auth import register_user, authenticate_user
-from app.models import init_db, SessionLocal, Base, engine
+from app.models import init_db, SessionLocal, Base
 
 def test_register_and_auth(tmp_path):
     # use a temp DB file by environment override
@@ -15,7 +15,7 @@ def test_register_and_auth(tmp_path):
     # patch DB path by environment variable approach: create a temporary engine
     # Simplest: run init_db() which will create the DB in project data; tests run isolated in CI typically.
     init_db()
-    ok, msg = register_user("tester", "pw123", is_admin=False)
+    ok, msg, email_queued = register_user("tester", "pw123", is_admin=False)
     assert ok
     user = authenticate_user("tester", "pw123")
     assert user is not None
@@ -0,0 +1,150 @@
+import sys
+import pathlib
+# ensure project root is first on sys.path so `import app...` uses this project's src
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import json
+import sqlite3
+import tarfile
+import pytest
+from app import file_manager
+from app.auth import register_user
+from app.backup import create_backup, restore_backup, load_manifest, BackupError
+from app.file_manager import add_user_file, delete_file_record
+from app.models import init_db
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_manager, "STORAGE_DIR", str(tmp_path / "storage"))
+    monkeypatch.setattr(file_manager, "DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(file_manager, "FERNET_PATH", str(tmp_path / "data" / "fernet.key"))
+    init_db()
+    register_user("ann", "pw12345")
+    register_user("bob", "pw12345")
+    return tmp_path
+
+
+def file_rows(db_path):
+    conn = sqlite3.connect(str(db_path))
+    try:
+        return conn.execute("SELECT filename, storage_name FROM file_records").fetchall()
+    finally:
+        conn.close()
+
+
+def restored_files(target):
+    return dict(file_rows(target / "System.db"))
+
+
+def test_full_and_incremental_round_trip(storage):
+    add_user_file(1, "keep.txt", b"kept " * 1000)
+    dropped = add_user_file(2, "dropped.txt", b"deleted before the second backup")
+    full = storage / "backups" / "full.tar"
+    summary = create_backup(str(full), workers=2)
+    assert (summary["blobs"], summary["inherited"], summary["missing"]) == (2, 0, 0)
+    assert summary["mb_per_s"] > 0
+
+    delete_file_record(dropped)
+    add_user_file(2, "new.txt", b"added later")
+    incr = storage / "backups" / "incr.tar"
+    summary = create_backup(str(incr), base=str(full), workers=2)
+    assert (summary["blobs"], summary["inherited"]) == (1, 1)
+    with tarfile.open(incr) as tar:
+        names = tar.getnames()
+    assert sum(n.startswith("blobs/") for n in names) == 1
+    assert names[-1] == "manifest.json" and "fernet.key" not in names
+    assert load_manifest(str(incr))["base"] == "full.tar"
+
+    target = storage / "restored"
+    summary = restore_backup(str(incr), str(target))
+    assert summary["archives"] == 2 and summary["blobs"] == 2
+    files = restored_files(target)
+    assert sorted(files) == ["keep.txt", "new.txt"]
+    assert sorted(p.name for p in (target / "storage").iterdir()) == sorted(files.values())
+    blob = (target / "storage" / files["keep.txt"]).read_bytes()
+    assert file_manager.get_or_create_fernet().decrypt(blob) == b"kept " * 1000
+    # the unchanged blob came from the full backup
+    assert load_manifest(str(incr))["blobs"][files["keep.txt"]]["archive"] == "full.tar"
+
+
+def test_user_backup_holds_only_that_user(storage):
+    add_user_file(1, "ann.txt", b"ann's")
+    add_user_file(2, "bob.txt", b"bob's")
+    archive = storage / "ann.tar"
+    create_backup(str(archive), username="ann", include_key=True)
+    manifest = json.loads((storage / "ann.tar.manifest.json").read_text())
+    assert manifest["scope"] == "user:ann" and len(manifest["blobs"]) == 1
+
+    target = storage / "restored"
+    restore_backup(str(archive), str(target), key_path="/nonexistent")
+    assert list(restored_files(target)) == ["ann.txt"]
+    assert (target / "data" / "fernet.key").read_bytes() == (storage / "data" / "fernet.key").read_bytes()
+    conn = sqlite3.connect(str(target / "System.db"))
+    try:
+        assert conn.execute("SELECT username FROM users").fetchall() == [("ann",)]
+        assert conn.execute("SELECT user_id, file_count FROM storage_usage_users").fetchall() == [(1, 1)]
+    finally:
+        conn.close()
+
+    # a system backup cannot build on a single user's
+    with pytest.raises(BackupError, match="scope"):
+        create_backup(str(storage / "incr.tar"), base=str(archive))
+
+
+def test_restore_rejects_a_tampered_blob(storage):
+    add_user_file(1, "a.txt", b"original")
+    archive = storage / "full.tar"
+    create_backup(str(archive))
+    raw = bytearray(archive.read_bytes())
+    at = raw.index(b"gAAAAA", raw.index(b"blobs/") + 512)
+    raw[at + 40] ^= 1
+    archive.write_bytes(bytes(raw))
+    with pytest.raises(BackupError, match="checksum mismatch for blob"):
+        restore_backup(str(archive), str(storage / "restored"))
+
+
+def test_blob_deleted_during_backup_is_listed_as_missing(storage, monkeypatch):
+    from app import backup
+    add_user_file(1, "kept.txt", b"still here")
+    gone = add_user_file(2, "gone.txt", b"deleted mid-backup")
+    gone_name = [name for filename, name in file_rows(backup._database_path()) if filename == "gone.txt"][0]
+    open_blob = backup._open_blob
+
+    def racing_open(name):
+        # the user deletes the file after the snapshot, before its blob is read
+        if name == gone_name:
+            (storage / "storage" / name).unlink()
+        return open_blob(name)
+    monkeypatch.setattr(backup, "_open_blob", racing_open)
+
+    archive = storage / "full.tar"
+    summary = create_backup(str(archive))
+    assert (summary["blobs"], summary["missing"]) == (1, 1)
+    assert load_manifest(str(archive))["missing"] == [{"storage_name": gone_name, "file_ids": [gone]}]
+
+    target = storage / "restored"
+    summary = restore_backup(str(archive), str(target))
+    assert summary["blobs"] == 1 and summary["missing_file_ids"] == [gone]
+    assert sorted(p.name for p in target.rglob("*.part")) == [] and not list(target.glob("*.enc"))
+
+
+def test_restore_falls_back_to_the_embedded_manifest(storage):
+    add_user_file(1, "a.txt", b"first")
+    full = storage / "backups" / "full.tar"
+    create_backup(str(full))
+    add_user_file(2, "b.txt", b"second")
+    incr = storage / "backups" / "incr.tar"
+    create_backup(str(incr), base=str(full))
+    for archive in (full, incr):
+        pathlib.Path(str(archive) + ".manifest.json").unlink()
+
+    summary = restore_backup(str(incr), str(storage / "restored"))
+    assert summary["archives"] == 2 and summary["blobs"] == 2
+    assert sorted(restored_files(storage / "restored")) == ["a.txt", "b.txt"]
+
+    with tarfile.open(storage / "bare.tar", "w") as tar:
+        tar.add(str(full), arcname="something-else")
+    for path in (storage / "bare.tar", storage / "nowhere.tar"):
+        with pytest.raises(BackupError, match="no manifest for"):
+            restore_backup(str(path), str(storage / "restored2"))
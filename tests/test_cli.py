@@ -0,0 +1,84 @@
+import sys
+import pathlib
+# ensure project root is first on sys.path so `import app...` uses this project's src
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import json
+import subprocess
+import pytest
+from app import file_manager
+from app.auth import register_user
+from app.models import init_db
+from app import cli
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_manager, "STORAGE_DIR", str(tmp_path / "storage"))
+    monkeypatch.setattr(file_manager, "FERNET_PATH", str(tmp_path / "fernet.key"))
+    monkeypatch.setenv("SECURE_AI_PASSWORD", "pw12345")
+    init_db()
+    assert register_user("batch", "pw12345")[0]
+    docs = tmp_path / "docs"
+    (docs / "sub").mkdir(parents=True)
+    (docs / "a.txt").write_text("This is a great report. It has good news. The weather was bad.")
+    (docs / "b.txt").write_text("Terrible results this quarter. Sales were poor and customers were angry.")
+    (docs / "sub" / "c.txt").write_text("Nested file with happy content.")
+    (docs / "skip.bin").write_bytes(b"\x00\x01")
+    return tmp_path
+
+
+def read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_ingest_analyze_export(workspace):
+    ingested = workspace / "ingested.jsonl"
+    assert cli.main(["--user", "batch", "--workers", "2", "--out", str(ingested),
+                     "ingest", str(workspace / "docs"), "--recursive", "--pattern", "*.txt"]) == 0
+    rows = read_jsonl(ingested)
+    assert sorted(r["filename"] for r in rows) == ["a.txt", "b.txt", "sub/c.txt"]
+    assert all(r["id"] for r in rows)
+
+    analyzed = workspace / "analyzed.jsonl"
+    assert cli.main(["--user", "batch", "--workers", "2", "--out", str(analyzed), "analyze"]) == 0
+    results = {r["filename"]: r for r in read_jsonl(analyzed)}
+    assert results["b.txt"]["sentiment"] == "Negative"
+    assert "report" in results["a.txt"]["keywords"]
+
+    exported = workspace / "exported.jsonl"
+    assert cli.main(["--user", "batch", "--out", str(exported), "export", "--ids", str(rows[0]["id"])]) == 0
+    assert [r["id"] for r in read_jsonl(exported)] == [rows[0]["id"]]
+
+
+def test_ingest_failed_batch_removes_its_blobs_and_continues(workspace, monkeypatch):
+    monkeypatch.setattr(cli, "DB_BATCH", 1)
+    real_add = file_manager.add_file_records
+    calls = []
+
+    def flaky_add(user_id, records):
+        calls.append(records)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return real_add(user_id, records)
+
+    monkeypatch.setattr(file_manager, "add_file_records", flaky_add)
+    ingested = workspace / "ingested.jsonl"
+    assert cli.main(["--user", "batch", "--workers", "2", "--out", str(ingested),
+                     "ingest", str(workspace / "docs"), "--pattern", "*.txt"]) == 1
+    rows = read_jsonl(ingested)
+    assert [("error" in r) for r in rows] == [True, False]
+    assert "storage_name" not in rows[0]
+    assert sorted(p.name for p in (workspace / "storage").iterdir()) == [rows[1]["storage_name"]]
+
+
+def test_bad_password_is_rejected(workspace, monkeypatch):
+    monkeypatch.setenv("SECURE_AI_PASSWORD", "wrong")
+    assert cli.main(["--user", "batch", "export"]) == 2
+
+
+def test_cli_never_imports_qt():
+    code = "import sys, app.cli; app.cli.build_parser(); assert not [m for m in sys.modules if m.startswith('PySide6')]"
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
@@ -0,0 +1,57 @@
+import sys
+import pathlib
+# ensure project root is first on sys.path so `import app...` uses this project's src
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import pytest
+from sqlalchemy import text
+from database.db import create_db_engine, session_scope, get_engine
+
+
+def test_sqlite_pragmas_applied(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'p.db'}")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    engine.dispose()
+
+
+def test_reader_not_blocked_by_open_write(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'rw.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)"))
+        conn.execute(text("INSERT INTO t (v) VALUES ('committed')"))
+    writer = engine.connect()
+    trans = writer.begin()
+    writer.execute(text("INSERT INTO t (v) VALUES ('pending')"))
+    try:
+        # the write transaction holds the lock; a reader still sees the last commit
+        with engine.connect() as reader:
+            assert reader.execute(text("SELECT v FROM t")).scalars().all() == ["committed"]
+    finally:
+        trans.rollback()
+        writer.close()
+        engine.dispose()
+
+
+def test_session_scope_rolls_back_on_error():
+    with session_scope() as db:
+        db.execute(text("CREATE TABLE kv (k TEXT PRIMARY KEY)"))
+    with pytest.raises(RuntimeError):
+        with session_scope() as db:
+            db.execute(text("INSERT INTO kv VALUES ('a')"))
+            raise RuntimeError("boom")
+    with get_engine().connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM kv")).scalar() == 0
+
+
+def test_session_scope_can_keep_objects_loaded():
+    from app.models import init_db, User
+    init_db()
+    with session_scope() as db:
+        db.add(User(username="ann"))
+    with session_scope(expire_on_commit=False) as db:
+        user = db.query(User).filter(User.username == "ann").one()
+    # usable after the session is closed
+    assert user.username == "ann"
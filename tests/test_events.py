@@ -0,0 +1,91 @@
+import sys
+import pathlib
+# ensure project root is first on sys.path so `import app...` uses this project's src
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import sqlite3
+import time
+from datetime import datetime
+from app.models import init_db, SessionLocal, ThreatDetection, Notification
+from app.events import EventBus, ChangeWatcher, bus
+from database.db import get_engine
+
+
+def test_bus_subscribe_and_unsubscribe():
+    local = EventBus()
+    seen = []
+    unsubscribe = local.subscribe("users", lambda topic, payload: seen.append((topic, payload)))
+    local.publish("users", source="local")
+    local.publish("files", source="local")
+    unsubscribe()
+    local.publish("users", source="local")
+    assert seen == [("users", {"source": "local"})]
+
+
+def test_orm_inserts_publish_after_commit_only():
+    init_db()
+    seen = []
+    unsubscribe = bus.subscribe("notifications", lambda topic, payload: seen.append(topic))
+    try:
+        db = SessionLocal()
+        db.add(Notification(user_id=1, message="hello", created_at=datetime.utcnow()))
+        db.flush()
+        assert seen == []
+        db.rollback()
+        db.add(Notification(user_id=1, message="hello again", created_at=datetime.utcnow()))
+        db.commit()
+        db.close()
+    finally:
+        unsubscribe()
+    assert seen == ["notifications"]
+
+
+def test_watcher_sees_commits_from_other_connections():
+    init_db()
+    local = EventBus()
+    seen = []
+    local.subscribe("threat_detections", lambda topic, payload: seen.append(payload["last_id"]))
+    watcher = ChangeWatcher(get_engine().url.database, interval=0.02, event_bus=local).start()
+    try:
+        assert watcher.check() == []
+        # a separate plain sqlite3 connection stands in for another process
+        other = sqlite3.connect(get_engine().url.database)
+        other.execute("INSERT INTO threat_detections (file_id, threat_type, confidence, status) VALUES (1, 'malware', 80, 'active')")
+        other.commit()
+        other.close()
+        deadline = time.monotonic() + 2
+        while not seen and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        watcher.stop()
+    assert seen == [1]
+
+
+def test_watcher_sees_updates_and_deletes_from_other_connections():
+    init_db()
+    other = sqlite3.connect(get_engine().url.database)
+    other.execute("INSERT INTO users (id, username, is_admin) VALUES (1, 'ann', 0), (2, 'bob', 0)")
+    other.execute("INSERT INTO threat_detections (file_id, threat_type, confidence, status) VALUES (1, 'malware', 80, 'active')")
+    other.commit()
+    watcher = ChangeWatcher(get_engine().url.database, event_bus=EventBus()).start()
+    try:
+        other.execute("UPDATE threat_detections SET status = 'resolved'")
+        other.commit()
+        assert watcher.check() == ["threat_detections"]
+        other.execute("UPDATE users SET is_admin = 1 WHERE id = 1")
+        other.commit()
+        assert watcher.check() == ["users"]
+        other.execute("DELETE FROM users WHERE id = 2")
+        other.commit()
+        assert watcher.check() == ["users"]
+        # columns the dashboard does not show are not logged to row_changes
+        other.execute("UPDATE users SET last_login = '2024-01-01 00:00:00'")
+        other.commit()
+        assert watcher.check() == []
+        # append-only tables are only compared by MAX(id)
+        other.execute("INSERT INTO activity_logs (user_id, action) VALUES (1, 'login')")
+        other.commit()
+        assert watcher.check() == ["activity_logs"]
+    finally:
+        other.close()
+        watcher.stop()
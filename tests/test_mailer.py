@@ -0,0 +1,176 @@
+import sys
+import pathlib
+# ensure project root is first on sys.path so `import app...` uses this project's src
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import socket
+import subprocess
+import socketserver
+import threading
+from datetime import datetime, timedelta
+import pytest
+from app.auth import register_user
+from app.mailer import MailSender
+from app.models import init_db, SessionLocal, OutboxEmail
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough of RFC 5321 for smtplib: records each delivered message."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 localhost ESMTP test")
+        envelope = {}
+        while True:
+            line = self.rfile.readline().decode().rstrip("\r\n")
+            if not line:
+                return
+            verb = line.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250 8BITMIME")
+            elif verb in ("HELO", "NOOP", "RSET"):
+                self.reply("250 OK")
+            elif verb == "MAIL":
+                envelope = {"to": []}
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                envelope["to"].append(line.split(":", 1)[1].strip("<> "))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 go ahead")
+                body = []
+                while True:
+                    data = self.rfile.readline().decode()
+                    if data.rstrip("\r\n") == ".":
+                        break
+                    body.append(data)
+                self.server.messages.append((envelope["to"], "".join(body)))
+                self.reply("250 queued")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), FakeSMTPHandler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.messages = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def settings(port):
+    return {"host": "127.0.0.1", "port": port, "user": None, "password": None,
+            "sender": "app@localhost", "starttls": False}
+
+
+def outbox():
+    db = SessionLocal()
+    try:
+        return db.query(OutboxEmail).order_by(OutboxEmail.id).all()
+    finally:
+        db.close()
+
+
+def test_register_queues_and_sender_reuses_connection(smtp_server):
+    init_db()
+    assert register_user("ann", "pw12345", "ann@example.com") == (True, "created", True)
+    assert register_user("bob", "pw12345", "bob@example.com") == (True, "created", True)
+    assert register_user("cy", "pw12345") == (True, "created", None)
+    assert [e.status for e in outbox()] == ["pending", "pending"]
+
+    sender = MailSender(settings=settings(smtp_server.server_address[1]))
+    try:
+        assert sender.send_due() == 2
+    finally:
+        sender.close()
+    assert [e.status for e in outbox()] == ["sent", "sent"]
+    assert [to for to, _ in smtp_server.messages] == [["ann@example.com"], ["bob@example.com"]]
+    assert "Hello ann" in smtp_server.messages[0][1]
+    assert smtp_server.connections == 1
+
+
+def test_unreachable_server_backs_off_then_gives_up():
+    init_db()
+    register_user("dee", "pw12345", "dee@example.com")
+    register_user("eve", "pw12345", "eve@example.com")
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        closed_port = s.getsockname()[1]
+
+    sender = MailSender(settings=settings(closed_port), max_attempts=2)
+    # the batch stops at the first connection failure
+    assert sender.send_due() == 1
+    first, second = outbox()
+    assert (first.status, first.attempts, second.attempts) == ("pending", 1, 0)
+    assert first.next_attempt_at > datetime.utcnow() and first.last_error
+
+    later = datetime.utcnow() + timedelta(days=1)
+    sender.send_due(now=later)
+    sender.send_due(now=later)
+    sender.send_due(now=later)
+    assert [(e.status, e.attempts) for e in outbox()] == [("failed", 2), ("failed", 2)]
+
+
+def test_each_outcome_is_committed_before_the_next_send(smtp_server):
+    init_db()
+    register_user("fay", "pw12345", "fay@example.com")
+    register_user("gus", "pw12345", "gus@example.com")
+    seen = []
+
+    class RecordingSender(MailSender):
+        def _send(self, recipient, subject, body):
+            # another session sees what was already committed while this message is in flight
+            seen.append([e.status for e in outbox()])
+            super()._send(recipient, subject, body)
+
+    sender = RecordingSender(settings=settings(smtp_server.server_address[1]))
+    try:
+        assert sender.drain() == 2
+    finally:
+        sender.close()
+    assert seen == [["sending", "pending"], ["sent", "sending"]]
+    assert [e.status for e in outbox()] == ["sent", "sent"]
+
+
+def test_rows_are_claimed_once_and_stale_claims_are_released(smtp_server):
+    init_db()
+    for name in ("hal", "ida", "jon", "kim"):
+        register_user(name, "pw12345", f"{name}@example.com")
+    db = SessionLocal()
+    # hal's row is held by a sender that is still working, ida's by one that died
+    db.query(OutboxEmail).filter(OutboxEmail.recipient == "hal@example.com").update(
+        {"status": "sending", "lease_until": datetime.utcnow() + timedelta(minutes=5)})
+    db.query(OutboxEmail).filter(OutboxEmail.recipient == "ida@example.com").update(
+        {"status": "sending", "lease_until": datetime.utcnow() - timedelta(minutes=1)})
+    db.commit()
+    db.close()
+
+    senders = [MailSender(settings=settings(smtp_server.server_address[1])) for _ in range(2)]
+    try:
+        threads = [threading.Thread(target=sender.send_due) for sender in senders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+    finally:
+        for sender in senders:
+            sender.close()
+    assert sorted(to[0] for to, _ in smtp_server.messages) == ["ida@example.com", "jon@example.com", "kim@example.com"]
+    assert [(e.status, e.attempts) for e in outbox()] == [("sending", 0), ("sent", 1), ("sent", 1), ("sent", 1)]
+
+
+def test_smtplib_is_imported_lazily():
+    code = "import sys, app.auth; assert 'smtplib' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], cwd=pathlib.Path(__file__).resolve().parents[1], check=True)
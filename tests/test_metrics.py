@@ -0,0 +1,132 @@
+import sys
+import pathlib
+# ensure project root is first on sys.path so `import app...` uses this project's src
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import importlib.util
+import urllib.error
+import urllib.request
+import pytest
+from app import file_manager, metrics
+from app.ai_processor import analyze_document
+from app.auth import register_user, authenticate_user
+from app.file_manager import add_user_file, load_decrypted_file
+from app.file_sharing import share_file, stop_sharing
+from app.models import init_db, SessionLocal, FileRecord
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_manager, "STORAGE_DIR", str(tmp_path / "storage"))
+    monkeypatch.setattr(file_manager, "FERNET_PATH", str(tmp_path / "fernet.key"))
+    init_db()
+    metrics.reset()
+    return tmp_path
+
+
+def load_bench_suite():
+    path = pathlib.Path(__file__).resolve().parents[1] / "benchmarks" / "bench_suite.py"
+    spec = importlib.util.spec_from_file_location("bench_suite", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_render_prometheus_text():
+    metrics.reset()
+    metrics.inc("auth_logins_total", result="success")
+    metrics.inc("auth_logins_total", 2, result='bad "quote"')
+    metrics.observe("analysis_seconds", 0.003)
+    metrics.observe("analysis_seconds", 20)
+    text = metrics.render()
+    assert "# TYPE secure_ai_auth_logins_total counter" in text
+    assert 'secure_ai_auth_logins_total{result="success"} 1' in text
+    assert 'secure_ai_auth_logins_total{result="bad \\"quote\\""} 2' in text
+    assert "# TYPE secure_ai_analysis_seconds histogram" in text
+    assert 'secure_ai_analysis_seconds_bucket{le="0.0025"} 0' in text
+    assert 'secure_ai_analysis_seconds_bucket{le="0.005"} 1' in text
+    assert 'secure_ai_analysis_seconds_bucket{le="10"} 1' in text
+    assert 'secure_ai_analysis_seconds_bucket{le="+Inf"} 2' in text
+    assert "secure_ai_analysis_seconds_count 2" in text
+    assert metrics.timer_stats("analysis_seconds") == (2, pytest.approx(20.003))
+
+
+def test_hot_paths_are_instrumented(storage):
+    register_user("ann", "pw12345")
+    assert authenticate_user("ann", "pw12345") and authenticate_user("ann", "wrong") is None
+    file_id = add_user_file(1, "a.txt", b"Good news. Bad news." * 100)
+    db = SessionLocal()
+    try:
+        storage_name = db.get(FileRecord, file_id).storage_name
+    finally:
+        db.close()
+    analyze_document(load_decrypted_file(storage_name).decode())
+
+    assert metrics.counter_value("auth_logins_total", result="success") == 1
+    assert metrics.counter_value("auth_logins_total", result="failure") == 1
+    assert metrics.timer_stats("auth_login_seconds")[0] == 2
+    assert metrics.timer_stats("auth_register_seconds")[0] == 1
+    assert metrics.counter_value("file_encrypt_bytes_total") == 2000
+    assert metrics.counter_value("file_decrypt_bytes_total") == 2000
+    assert metrics.timer_stats("file_encrypt_seconds")[0] == metrics.timer_stats("file_decrypt_seconds")[0] == 1
+    assert metrics.counter_value("analysis_chars_total") == 2000
+    assert metrics.counter_value("db_commits_total") >= 3
+    assert metrics.timer_stats("db_statement_seconds")[0] > 0
+
+
+def test_statement_timing_follows_configure_database(storage, tmp_path):
+    from sqlalchemy import text
+    from database.db import create_db_engine
+    # conftest has already swapped in a fresh engine via configure_database
+    metrics.reset()
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+    finally:
+        db.close()
+    assert metrics.timer_stats("db_statement_seconds")[0] == 1
+
+    # engines outside SessionLocal are not timed
+    other = create_db_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    try:
+        with other.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    finally:
+        other.dispose()
+    assert metrics.timer_stats("db_statement_seconds")[0] == 1
+
+
+def test_share_returns_url_and_stops(storage):
+    file_id = add_user_file(1, "shared.txt", b"shared bytes")
+    msg, error = share_file(file_id, 1, host="127.0.0.1")
+    assert error is None
+    url = msg.rsplit(" ", 1)[-1]
+    with urllib.request.urlopen(url, timeout=5) as response:
+        assert response.read() == b"shared bytes"
+    stop_sharing(url)
+    with pytest.raises(urllib.error.URLError):
+        urllib.request.urlopen(url, timeout=5)
+    assert share_file(file_id, 2) == (None, "File not found")
+
+
+def test_bench_suite_runs_isolated_and_flags_regressions(storage):
+    suite = load_bench_suite()
+    run = suite.run_suite(users=2, iterations=1, size=4096, log_events=200)
+    assert run["errors"] == {}
+    results = run["results"]
+    assert results["encrypt_mb_s"] > 0 and results["workflows_per_s"] > 0
+    assert "secure_ai_file_encrypt_seconds_count 2" in run["metrics"]
+    # the suite's users and files never reach the test's own database
+    db = SessionLocal()
+    try:
+        assert db.query(FileRecord).count() == 0
+    finally:
+        db.close()
+
+    baseline = {"tolerance": 0.5, "metrics": {
+        "encrypt_mb_s": {"value": results["encrypt_mb_s"] * 3},
+        "login_ms_p95": {"value": results["login_ms_p95"] * 2, "tolerance": 0.1},
+        "delete_ms_p95": {"value": results["delete_ms_p95"] / 3},
+    }}
+    regressions = suite.compare(results, baseline)
+    assert [r.split(":")[0] for r in regressions] == ["encrypt_mb_s", "delete_ms_p95"]
@@ -0,0 +1,89 @@
+import sys
+import pathlib
+# ensure project root is first on sys.path so `import app...` uses this project's src
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import json
+from app import provisioning
+from app.auth import register_user, authenticate_user
+from app.models import init_db, SessionLocal, OutboxEmail, User
+
+
+def test_csv_import_reports_each_row(tmp_path, monkeypatch):
+    # exercise the process pool even for a handful of rows
+    monkeypatch.setattr(provisioning, "POOL_THRESHOLD", 2)
+    init_db()
+    assert register_user("taken", "pw12345", "taken@example.com")[0]
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "Username,Email,Password,is_admin\n"
+        "amy,amy@example.com,pw-amy,no\n"
+        "ben,,pw-ben,yes\n"
+        "taken,new@example.com,pw,\n"
+        "amy,other@example.com,pw,\n"
+        "cat,taken@example.com,pw,\n"
+        "dan,dan@example.com,,\n"
+        ",x@example.com,pw,\n"
+        "eve,eve@example.com,pw-eve,\n"
+    )
+    report = provisioning.import_users_file(str(path), workers=2)
+    assert [(r["line"], r["username"], r["error"]) for r in report] == [
+        (2, "amy", None),
+        (3, "ben", None),
+        (4, "taken", "user_exists"),
+        (5, "amy", "duplicate_username_in_file"),
+        (6, "cat", "email_exists"),
+        (7, "dan", "missing_password"),
+        (8, "", "missing_username"),
+        (9, "eve", None),
+    ]
+    assert [r["status"] for r in report].count("created") == 3
+
+    assert authenticate_user("amy", "pw-amy") is not None
+    assert authenticate_user("ben", "pw-ben").is_admin
+    db = SessionLocal()
+    try:
+        assert db.query(User).count() == 4
+        # one verification email for taken plus amy and eve; ben has no address
+        assert sorted(e.recipient for e in db.query(OutboxEmail)) == \
+            ["amy@example.com", "eve@example.com", "taken@example.com"]
+    finally:
+        db.close()
+
+
+def test_jsonl_import_and_bad_lines(tmp_path):
+    init_db()
+    path = tmp_path / "users.jsonl"
+    path.write_text(
+        json.dumps({"username": "fay", "password": "pw-fay", "is_admin": True}) + "\n"
+        "\n"
+        "{not json\n"
+        "[1, 2]\n"
+    )
+    report = provisioning.import_users_file(str(path), send_verification=False)
+    assert [(r["line"], r["status"]) for r in report] == [(1, "created"), (3, "error"), (4, "error")]
+    assert report[1]["error"].startswith("invalid_json")
+    assert authenticate_user("fay", "pw-fay").is_admin
+
+
+def test_users_created_while_hashing_are_reported_not_lost(tmp_path, monkeypatch):
+    init_db()
+    hash_password = provisioning._hash_password
+
+    def racing_hash(password):
+        # another process registers one of the names between the checks and the insert
+        if not authenticate_user("gil", "pw-other"):
+            register_user("gil", "pw-other", "gil@elsewhere.example.com")
+        return hash_password(password)
+    monkeypatch.setattr(provisioning, "_hash_password", racing_hash)
+    path = tmp_path / "users.jsonl"
+    path.write_text("".join(json.dumps(row) + "\n" for row in (
+        {"username": "gil", "password": "pw-gil"},
+        {"username": "hal", "password": "pw-hal", "email": "hal@example.com"},
+    )))
+    report = provisioning.import_users_file(str(path))
+    assert [(r["username"], r["status"], r["error"]) for r in report] == [
+        ("gil", "error", "user_exists"),
+        ("hal", "created", None),
+    ]
+    assert authenticate_user("gil", "pw-other") and authenticate_user("hal", "pw-hal")
@@ -0,0 +1,103 @@
+import sys
+import pathlib
+# ensure project root is first on sys.path so `import app...` uses this project's src
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import file_manager
+from app.models import Base, ActivityLog, ActivityRollupHourly, ActivityRollupDaily
+from app.activity_log import ActivityLogWriter
+from app.retention import archive_old_logs, list_archive_segments, read_archive_segment, update_rollups
+
+
+def make_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'log.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def rollup_counts(factory, model):
+    db = factory()
+    try:
+        return {(r.bucket, r.user_id, r.action): r.count for r in db.query(model).all()}
+    finally:
+        db.close()
+
+
+def test_rollups_follow_writer(tmp_path):
+    factory = make_factory(tmp_path)
+    writer = ActivityLogWriter(session_factory=factory, batch_size=3)
+    t = datetime(2024, 5, 1, 10, 15)
+    for i in range(5):
+        writer.submit(1, "login", timestamp=t + timedelta(minutes=i))
+    writer.submit(None, "failed_login", timestamp=t + timedelta(hours=1))
+    writer.close()
+
+    hourly = rollup_counts(factory, ActivityRollupHourly)
+    assert hourly == {
+        (datetime(2024, 5, 1, 10), 1, "login"): 5,
+        (datetime(2024, 5, 1, 11), 0, "failed_login"): 1,
+    }
+    daily = rollup_counts(factory, ActivityRollupDaily)
+    assert daily == {
+        (datetime(2024, 5, 1), 1, "login"): 5,
+        (datetime(2024, 5, 1), 0, "failed_login"): 1,
+    }
+
+
+def test_rollups_backfill_existing_rows_once(tmp_path):
+    factory = make_factory(tmp_path)
+    db = factory()
+    db.add_all([ActivityLog(user_id=2, action="file_upload", timestamp=datetime(2024, 1, 2, 3)) for _ in range(4)])
+    db.commit()
+    assert update_rollups(db) == 4
+    assert update_rollups(db) == 0
+    db.commit()
+    db.close()
+    assert rollup_counts(factory, ActivityRollupDaily) == {(datetime(2024, 1, 2), 2, "file_upload"): 4}
+
+
+def test_archive_moves_old_rows_into_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_manager, "FERNET_PATH", str(tmp_path / "fernet.key"))
+    factory = make_factory(tmp_path)
+    now = datetime(2024, 6, 1)
+    db = factory()
+    db.add_all([ActivityLog(user_id=1, action="login", timestamp=now - timedelta(days=100, hours=h), details=f"old {h}") for h in range(30)])
+    db.add_all([ActivityLog(user_id=1, action="login", timestamp=now - timedelta(days=1), details="recent")])
+    db.commit()
+    db.close()
+
+    archive_dir = tmp_path / "archive"
+    assert archive_old_logs(90, str(archive_dir), session_factory=factory, batch_size=7, now=now) == 30
+
+    db = factory()
+    assert [r.details for r in db.query(ActivityLog).all()] == ["recent"]
+    db.close()
+    archived = [row for path in list_archive_segments(str(archive_dir)) for row in read_archive_segment(path)]
+    assert sorted(r["details"] for r in archived) == sorted(f"old {h}" for h in range(30))
+    # rollups still cover the archived history
+    assert sum(rollup_counts(factory, ActivityRollupDaily).values()) == 31
+
+
+def test_rows_logged_after_archiving_everything_are_rolled_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_manager, "FERNET_PATH", str(tmp_path / "fernet.key"))
+    factory = make_factory(tmp_path)
+    now = datetime(2024, 6, 1)
+    writer = ActivityLogWriter(session_factory=factory)
+    for i in range(5):
+        writer.submit(1, "login", timestamp=now - timedelta(days=100, minutes=i))
+    writer.flush(timeout=5)
+    assert archive_old_logs(90, str(tmp_path / "archive"), session_factory=factory, now=now) == 5
+
+    # the table is empty now; new rows must not reuse ids at or below the rollup watermark
+    for i in range(3):
+        writer.submit(1, "login", timestamp=now)
+    writer.close()
+    db = factory()
+    try:
+        assert [r.id for r in db.query(ActivityLog).order_by(ActivityLog.id)] == [6, 7, 8]
+    finally:
+        db.close()
+    assert sum(rollup_counts(factory, ActivityRollupDaily).values()) == 8
@@ -0,0 +1,98 @@
+import sys
+import pathlib
+# ensure project root is first on sys.path so `import app...` uses this project's src
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from datetime import datetime
+import pytest
+from sqlalchemy import select, text, tuple_
+from app.models import init_db, User, FileRecord, ActivityLog, ThreatDetection, Notification, ActivityRollupDaily, \
+    FILE_UPLOADED_KEY, FILE_NAME_KEY
+from database.db import get_engine
+from database.migrations import MIGRATIONS, current_version, upgrade
+
+HOT_QUERIES = {
+    "files by owner, newest first": select(FileRecord)
+        .where(FileRecord.user_id == 1)
+        .order_by(FileRecord.uploaded_at.desc(), FileRecord.id.desc())
+        .limit(50),
+    "next page of files by owner": select(FileRecord.id, FileRecord.filename)
+        .where(FileRecord.user_id == 1,
+               tuple_(FILE_UPLOADED_KEY, FileRecord.id) < tuple_(datetime(2024, 1, 1), 500))
+        .order_by(FILE_UPLOADED_KEY.desc(), FileRecord.id.desc())
+        .limit(200),
+    "next page of files by name": select(FileRecord.id, FileRecord.filename)
+        .where(FileRecord.user_id == 1, tuple_(FILE_NAME_KEY, FileRecord.id) > tuple_("report.txt", 500))
+        .order_by(FILE_NAME_KEY, FileRecord.id)
+        .limit(200),
+    "latest activity logs": select(ActivityLog).order_by(ActivityLog.timestamp.desc()).limit(20),
+    "user activity in a time range": select(ActivityLog)
+        .where(ActivityLog.user_id == 1, ActivityLog.timestamp >= datetime(2024, 1, 1))
+        .order_by(ActivityLog.timestamp.desc()),
+    "active threats, newest first": select(ThreatDetection)
+        .where(ThreatDetection.status == "active")
+        .order_by(ThreatDetection.detected_at.desc())
+        .limit(10),
+    "unread notifications": select(Notification)
+        .where(Notification.user_id == 1, Notification.is_read == False)  # noqa: E712
+        .order_by(Notification.created_at.desc()),
+    "login by username": select(User).where(User.username == "admin"),
+    "daily rollups in a range": select(ActivityRollupDaily).where(ActivityRollupDaily.bucket >= datetime(2024, 1, 1)),
+}
+
+
+def query_plan(conn, stmt):
+    sql = str(stmt.compile(conn, compile_kwargs={"literal_binds": True}))
+    return [row[3] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_queries_use_an_index(name):
+    init_db()
+    with get_engine().connect() as conn:
+        plan = query_plan(conn, HOT_QUERIES[name])
+    assert any("USING" in step and "INDEX" in step for step in plan), plan
+    assert not any(step.startswith("SCAN") and "INDEX" not in step for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+LEGACY_SCHEMA = """
+CREATE TABLE users (id INTEGER NOT NULL, username VARCHAR, email VARCHAR, hashed_password VARCHAR,
+    is_active BOOLEAN, is_admin BOOLEAN, created_at DATETIME, last_login DATETIME, PRIMARY KEY (id));
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE TABLE file_records (id INTEGER NOT NULL, filename VARCHAR, storage_name VARCHAR, user_id INTEGER,
+    uploaded_at DATETIME, file_size INTEGER, file_type VARCHAR, PRIMARY KEY (id), UNIQUE (storage_name));
+CREATE TABLE activity_logs (id INTEGER NOT NULL, user_id INTEGER, action VARCHAR, timestamp DATETIME,
+    details TEXT, PRIMARY KEY (id));
+INSERT INTO users (id, username) VALUES (1, 'admin');
+INSERT INTO activity_logs (user_id, action, timestamp) VALUES (1, 'login', '2024-01-01 00:00:00');
+INSERT INTO file_records (filename, storage_name, user_id) VALUES ('old.txt', 'old.enc', 1);
+"""
+
+
+def test_upgrade_existing_database_in_place():
+    engine = get_engine()
+    raw = engine.raw_connection()
+    try:
+        raw.executescript(LEGACY_SCHEMA)
+    finally:
+        raw.close()
+    assert current_version(engine) == 0
+
+    init_db()
+    assert current_version(engine) == MIGRATIONS[-1][0]
+    with engine.connect() as conn:
+        indexes = {row[1] for row in conn.execute(text("PRAGMA index_list(activity_logs)"))}
+        assert "ix_activity_logs_timestamp" in indexes
+        assert conn.execute(text("SELECT count(*) FROM activity_logs")).scalar() == 1
+        # a missing upload time stays missing
+        assert conn.execute(text("SELECT uploaded_at FROM file_records")).all() == [(None,)]
+        # rebuilt with AUTOINCREMENT, keeping the rows and continuing after their ids
+        assert "AUTOINCREMENT" in conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE name = 'activity_logs'")).scalar()
+        assert conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'activity_logs'")).scalar() == 1
+        tables = {row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type='table'"))}
+        assert {"threat_detections", "notifications", "activity_rollups_daily"} <= tables
+
+    # running again is a no-op
+    assert upgrade(engine) == MIGRATIONS[-1][0]
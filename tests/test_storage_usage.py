@@ -0,0 +1,109 @@
+import sys
+import pathlib
+# ensure project root is first on sys.path so `import app...` uses this project's src
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+import hashlib
+import pytest
+from app import file_manager
+from app.auth import register_user
+from app.file_manager import sniff_mime, add_user_file, delete_file_record, read_file
+from app.models import init_db, SessionLocal, FileRecord, StorageUsageUser, StorageUsageType
+from app.storage_usage import backfill_file_metadata, usage_report, rebuild_usage
+from database.db import get_engine
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_manager, "STORAGE_DIR", str(tmp_path / "storage"))
+    monkeypatch.setattr(file_manager, "FERNET_PATH", str(tmp_path / "fernet.key"))
+    init_db()
+    register_user("ann", "pw12345")
+    register_user("bob", "pw12345")
+    return tmp_path
+
+
+def counters():
+    db = SessionLocal()
+    try:
+        users = {r.user_id: (r.file_count, r.total_bytes) for r in db.query(StorageUsageUser) if r.file_count}
+        types = {r.file_type: (r.file_count, r.total_bytes) for r in db.query(StorageUsageType) if r.file_count}
+        return users, types
+    finally:
+        db.close()
+
+
+def rebuilt():
+    before = counters()
+    with get_engine().begin() as conn:
+        rebuild_usage(conn)
+    after = counters()
+    return before, after
+
+
+@pytest.mark.parametrize("head, name, expected", [
+    (b"%PDF-1.7\n...", "x.bin", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n\x00\x00", "photo", "image/png"),
+    (b"PK\x03\x04\x14\x00", "report.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    (b"PK\x03\x04\x14\x00", "archive", "application/zip"),
+    (b"hello, world", "notes", "text/plain"),
+    (b"a,b\n1,2\n", "data.csv", "text/csv"),
+    ("café ".encode() * 200, "long.txt", "text/plain"),
+    (b"\x00\x01\x02\x03", "blob.txt", "application/octet-stream"),
+])
+def test_sniff_mime(head, name, expected):
+    assert sniff_mime(head[:file_manager.SNIFF_BYTES], name) == expected
+
+
+def test_upload_and_delete_keep_counters_in_step(storage):
+    src = storage / "notes.txt"
+    src.write_bytes(b"some text " * 1000)
+    data, meta = read_file(str(src))
+    assert meta == {"file_size": 10000, "file_type": "text/plain", "content_hash": hashlib.sha256(data).hexdigest()}
+
+    first = add_user_file(1, "notes.txt", data, meta)
+    add_user_file(1, "image.png", b"\x89PNG\r\n\x1a\n" + b"\x00" * 92)
+    add_user_file(2, "other.txt", b"hi")
+    assert counters() == (
+        {1: (2, 10100), 2: (1, 2)},
+        {"text/plain": (2, 10002), "image/png": (1, 100)},
+    )
+
+    assert delete_file_record(first, user_id=2) is None  # not bob's file
+    assert delete_file_record(first, user_id=1) == "notes.txt"
+    assert counters() == ({1: (1, 100), 2: (1, 2)}, {"text/plain": (1, 2), "image/png": (1, 100)})
+    before, after = rebuilt()
+    assert before == after
+    assert [u["username"] for u in usage_report()["users"]] == ["ann", "bob"]
+
+
+def test_backfill_measures_legacy_records(storage):
+    add_user_file(1, "new.txt", b"already measured")
+    legacy = [("old.txt", b"legacy text"), ("old.pdf", b"%PDF-1.4 legacy"), ("gone.txt", b"blob removed")]
+    db = SessionLocal()
+    try:
+        for name, payload in legacy:
+            db.add(FileRecord(filename=name, user_id=2, storage_name=file_manager.save_encrypted_file("2", name, payload)))
+        db.commit()
+        gone = db.query(FileRecord).filter(FileRecord.filename == "gone.txt").one()
+        (pathlib.Path(file_manager.STORAGE_DIR) / gone.storage_name).unlink()
+    finally:
+        db.close()
+    assert 2 not in counters()[0]
+
+    assert backfill_file_metadata(batch_size=2, workers=2) == {"updated": 2, "missing": 1, "failed": 0}
+    users, types = counters()
+    assert users[2] == (2, len(b"legacy text") + len(b"%PDF-1.4 legacy"))
+    assert types["application/pdf"] == (1, 15)
+    db = SessionLocal()
+    try:
+        old = db.query(FileRecord).filter(FileRecord.filename == "old.txt").one()
+        assert (old.file_size, old.file_type, old.content_hash) == \
+            (11, "text/plain", hashlib.sha256(b"legacy text").hexdigest())
+    finally:
+        db.close()
+    before, after = rebuilt()
+    assert before == after
+
+    # nothing left to do except the record whose blob is missing
+    assert backfill_file_metadata() == {"updated": 0, "missing": 1, "failed": 0}
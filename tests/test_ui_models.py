@@ -0,0 +1,154 @@
+import sys
+import os
+import pathlib
+# ensure project root is first on sys.path so `import app...` uses this project's src
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from datetime import datetime, timedelta
+import pytest
+
+pytest.importorskip("PySide6")
+from PySide6.QtCore import QCoreApplication
+from app.models import init_db, SessionLocal, FileRecord, ActivityLog, User, ThreatDetection, RowChange
+from app.ui_models import FileListModel, FileIdRole, RecordIdRole, ActivityFeedModel, UserListModel, ThreatListModel
+
+
+@pytest.fixture
+def files():
+    app = QCoreApplication.instance() or QCoreApplication([])
+    init_db()
+    db = SessionLocal()
+    start = datetime(2024, 1, 1)
+    db.add_all([
+        FileRecord(filename=f"doc-{i:04d}.txt", storage_name=f"{i}.enc", user_id=1, uploaded_at=start + timedelta(minutes=i // 2))
+        for i in range(1050)
+    ])
+    db.add_all([FileRecord(filename="other.txt", storage_name=f"x{i}.enc", user_id=2, uploaded_at=start) for i in range(5)])
+    db.commit()
+    db.close()
+    yield app
+
+
+def load_all(model):
+    model.refresh()
+    while model.canFetchMore():
+        model.fetchMore()
+    return [model.index(i).data(FileIdRole) for i in range(model.rowCount())]
+
+
+def test_pages_load_on_demand(files):
+    model = FileListModel(1, page_size=100)
+    model.refresh()
+    assert model.rowCount() == 100
+    assert model.canFetchMore()
+    model.fetchMore()
+    assert model.rowCount() == 200
+
+
+def test_keyset_pages_cover_every_row_once_in_order(files):
+    model = FileListModel(1, page_size=100)
+    ids = load_all(model)
+    assert len(ids) == len(set(ids)) == 1050
+    # several rows share an upload time; ties are broken by id
+    assert ids == sorted(ids, reverse=True)
+
+    model.set_sort("name")
+    names = [model.index(i).data() for i in range(model.rowCount())]
+    assert names == sorted(names)
+
+
+def test_rows_with_null_sort_columns_are_paged(files):
+    db = SessionLocal()
+    db.add_all([FileRecord(filename=None, storage_name=f"n{i}.enc", user_id=1) for i in range(3)])
+    db.commit()
+    # the column default fills uploaded_at; clear it as legacy rows would have it
+    db.query(FileRecord).filter(FileRecord.filename.is_(None)).update({FileRecord.uploaded_at: None})
+    db.commit()
+    db.close()
+    model = FileListModel(1, page_size=100)
+    for sort in ("newest", "oldest", "name"):
+        model.set_sort(sort)
+        ids = load_all(model)
+        assert len(ids) == len(set(ids)) == 1053, sort
+    model.set_sort("name")
+    assert model.index(0).data() == "(unnamed)"
+
+
+def test_filter_and_remove(files):
+    model = FileListModel(1, page_size=100)
+    model.set_filter("doc-000")
+    ids = load_all(model)
+    assert len(ids) == 10
+    model.remove_file(ids[0])
+    assert model.rowCount() == 9
+    assert model.file_id(0) == ids[1]
+
+
+def test_activity_feed_only_fetches_new_rows():
+    app = QCoreApplication.instance() or QCoreApplication([])
+    init_db()
+    db = SessionLocal()
+    db.add(User(id=1, username="alice"))
+    db.add_all([ActivityLog(user_id=1, action="login", timestamp=datetime(2024, 1, 1, 0, i)) for i in range(5)])
+    db.commit()
+    model = ActivityFeedModel(max_rows=6)
+    assert model.poll() == 5
+    assert model.poll() == 0
+    db.add_all([ActivityLog(user_id=None, action="failed_login", timestamp=datetime(2024, 1, 1, 1, i)) for i in range(3)])
+    db.commit()
+    db.close()
+    assert model.poll() == 3
+    assert model.rowCount() == 6
+    assert "anonymous  failed_login" in model.index(0).data()
+    assert "alice  login" in model.index(5).data()
+
+
+def test_user_and_threat_panes_update_incrementally():
+    app = QCoreApplication.instance() or QCoreApplication([])
+    init_db()
+    db = SessionLocal()
+    db.add_all([User(username="mallory"), User(username="bob", is_admin=True)])
+    db.add_all([ThreatDetection(file_id=1, threat_type="malware", confidence=90.0, status="active") for _ in range(2)])
+    db.commit()
+    users, threats = UserListModel(), ThreatListModel()
+    users.poll(); threats.poll()
+    db.add(User(username="carol"))
+    db.query(ThreatDetection).filter(ThreatDetection.id == 1).update({"status": "resolved"})
+    db.commit()
+    db.close()
+    users.poll(); threats.poll()
+    assert [users.index(i).data().strip() for i in range(users.rowCount())] == ["bob (admin)", "carol", "mallory"]
+    assert threats.rowCount() == 1
+
+    db = SessionLocal()
+    db.query(User).filter(User.username == "mallory").delete()
+    db.query(User).filter(User.username == "carol").update({"is_admin": True})
+    db.query(User).filter(User.username == "bob").update({"username": "zed", "is_admin": False})
+    db.commit()
+    db.close()
+    users.poll()
+    assert [users.index(i).data().strip() for i in range(users.rowCount())] == ["carol (admin)", "zed"]
+
+
+def test_user_pane_rereads_only_logged_changes_and_threats_can_reopen():
+    app = QCoreApplication.instance() or QCoreApplication([])
+    init_db()
+    db = SessionLocal()
+    db.add_all([User(username=f"user-{i}") for i in range(5)])
+    db.add_all([ThreatDetection(file_id=1, threat_type="malware", confidence=90.0, status=s) for s in ("resolved", "active")])
+    db.commit()
+    users, threats = UserListModel(), ThreatListModel()
+    users.poll(); threats.poll()
+    assert threats.rowCount() == 1
+
+    # last_login is not shown, so it is not logged and nothing is re-read
+    db.query(User).update({"last_login": datetime(2024, 1, 1)})
+    db.query(User).filter(User.username == "user-3").update({"is_admin": True})
+    db.query(ThreatDetection).filter(ThreatDetection.id == 1).update({"status": "active"})
+    db.commit()
+    assert [r.row_id for r in db.query(RowChange).filter(RowChange.table_name == "users")] == [4]
+    db.close()
+    users.poll(); threats.poll()
+    assert "user-3 (admin)" in [users.index(i).data() for i in range(users.rowCount())]
+    assert [threats.index(i).data(RecordIdRole) for i in range(threats.rowCount())] == [2, 1]